@@ -0,0 +1,72 @@
+"""
+Bulk itinerary generation CLI
+Reads ItineraryRequest objects as JSONL and writes result records as JSONL
+in order of completion (each record carries the input line index).
+
+Usage:
+    python -m app.cli.batch_generate catalog.jsonl -o results.jsonl --resume
+
+With --resume, indexes that already have an "ok" record in the output file
+are skipped and new records are appended.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Set
+
+from app.core.config import settings
+from app.services.batch_service import BatchRunner
+from app.services.itinerary_service import ItineraryService
+
+
+def completed_indexes(output_path: Path) -> Set[int]:
+    """Indexes already generated successfully by an earlier run"""
+    done = set()
+    if not output_path.exists():
+        return done
+    with open(output_path, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn final line from an interrupted run
+            if record.get("status") == "ok":
+                done.add(record["index"])
+    return done
+
+
+async def run(args: argparse.Namespace) -> int:
+    output_path = Path(args.output)
+    skip = completed_indexes(output_path) if args.resume else set()
+    if skip:
+        print(f"[BATCH] Resuming - {len(skip)} items already complete", file=sys.stderr)
+
+    runner = BatchRunner(ItineraryService(), args.concurrency, args.max_items)
+    failed = 0
+    with open(args.input, encoding="utf-8") as src, open(output_path, "a" if args.resume else "w", encoding="utf-8") as out:
+        async for record in runner.run(src, skip_indexes=skip):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if record["status"] != "ok":
+                failed += 1
+                print(f"[BATCH] Item {record['index']} failed: {record['error']}", file=sys.stderr)
+    return failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate itineraries from a JSONL file of requests")
+    parser.add_argument("input", help="JSONL file of ItineraryRequest objects")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file for result records")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY)
+    parser.add_argument("--max-items", type=int, default=settings.BATCH_MAX_ITEMS)
+    parser.add_argument("--resume", action="store_true", help="Skip items already completed in the output file")
+    args = parser.parse_args()
+
+    failed = asyncio.run(run(args))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Cache warming CLI
+Generates the top-N most requested itineraries during quiet hours.
+
+Usage:
+    python -m app.cli.warm_cache --log logs/requests.jsonl --top 50 --resume
+
+Set ITINERARY_STORE_PATH so warmed itineraries land in the journal the
+server loads; without it results only live for the duration of this run.
+"""
+import argparse
+import asyncio
+import json
+
+from app.core.config import settings
+from app.services.cache_warmer import CacheWarmer, load_top_requests_from_log
+from app.services.itinerary_service import ItineraryService
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Warm the itinerary store with popular routes")
+    parser.add_argument("--log", default=settings.REQUEST_LOG_PATH, help="JSONL request log to rank (default: REQUEST_LOG_PATH)")
+    parser.add_argument("--top", type=int, default=settings.CACHE_WARMING_TOP_N, help="Number of distinct requests to warm")
+    parser.add_argument("--concurrency", type=int, default=settings.CACHE_WARMING_CONCURRENCY)
+    parser.add_argument("--rate", type=int, default=settings.CACHE_WARMING_RATE_PER_MINUTE, help="Max generations started per minute")
+    parser.add_argument("--state", default=settings.CACHE_WARMING_STATE_PATH, help="Checkpoint file for resuming")
+    parser.add_argument("--resume", action="store_true", help="Skip keys completed by a previous interrupted run")
+    args = parser.parse_args()
+
+    if not args.log:
+        parser.error("--log is required when REQUEST_LOG_PATH is not set")
+    if not settings.ITINERARY_STORE_PATH:
+        print("[WARM] WARNING: ITINERARY_STORE_PATH not set - warmed itineraries will not be persisted")
+
+    requests = load_top_requests_from_log(args.log, args.top)
+    warmer = CacheWarmer(ItineraryService(), args.concurrency, args.rate, args.state)
+    report = asyncio.run(warmer.warm(requests, resume=args.resume))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,11 @@
 Application configuration management
 Uses Pydantic Settings for environment variable validation
 V3.0 Lightweight deployment - Render compatible
+Settings are built on first attribute access, not at import (cold start)
 """
+from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List, Optional
+from typing import Any, List, Optional
 
 
 class Settings(BaseSettings):
@@ -24,6 +26,119 @@ class Settings(BaseSettings):
     # AI Service (required)
     GEMINI_API_KEY: str
 
+    # Output-token budgeting
+    TOKEN_BUDGET_HEADROOM: float = 1.25
+    THINKING_TOKEN_RESERVE: int = 4096  # floor; thinking counts against max_output_tokens and grows the reserve
+    TOKEN_CALIBRATION_PATH: Optional[str] = None  # JSONL of recorded response sizes
+    MAX_CONTINUATIONS: int = 2  # follow-up calls for sections lost to truncation
+
+    # Model tier ladder (JSON list in env). Fields: name, model_name, max_complexity,
+    # temperature, timeout_seconds, latency_budget_seconds. Complexity ~ trip days.
+    MODEL_TIERS: List[dict] = [
+        {"name": "flash", "model_name": "gemini-2.5-flash"},
+        {"name": "flash-lite", "model_name": "gemini-2.5-flash-lite"},
+    ]
+    MODEL_TIER_ERROR_THRESHOLD: float = 0.5
+
+    # Generation scheduler: every model call takes a slot. Classes (JSON list in env):
+    # name, rank (lower is served first), max_concurrency (per-class cap). The classes
+    # other than paid share at most GENERATION_CONCURRENCY - SCHEDULER_PAID_RESERVE slots.
+    GENERATION_CONCURRENCY: int = 8  # model calls in flight per process
+    SCHEDULER_CLASSES: List[dict] = [
+        {"name": "paid", "rank": 0, "max_concurrency": 8},
+        {"name": "interactive", "rank": 1, "max_concurrency": 6},
+        {"name": "batch", "rank": 2, "max_concurrency": 3},
+        {"name": "warming", "rank": 3, "max_concurrency": 2},
+    ]
+    SCHEDULER_AGING_SECONDS: float = 10.0  # waiting this long promotes a request one rank
+    SCHEDULER_PAID_RESERVE: int = 2  # slots only paid work may take
+
+    # Itinerary reuse (in-process store)
+    ITINERARY_CACHE_SIZE: int = 500
+    ITINERARY_ALIAS_CACHE_SIZE: int = 10000  # reuse hits (small: id, status, adapted fields)
+    SIMILAR_REUSE_ENABLED: bool = True
+    SIMILAR_REUSE_MAX_ACTIVITY_STEPS: int = 1
+    ITINERARY_STORE_PATH: Optional[str] = None  # JSONL journal shared with CLI jobs
+    REQUEST_LOG_PATH: Optional[str] = None  # JSONL request log (cache warming input)
+    REQUEST_LOG_FLUSH_LINES: int = 50  # request log lines buffered per write
+    DEMAND_TRACK_MAX: int = 2000  # distinct requests counted per process (least requested decay out)
+
+    # Refinement sessions (POST /api/itinerary/{id}/refine)
+    REFINE_SESSION_CACHE_SIZE: int = 200
+    REFINE_HISTORY_LIMIT: int = 10  # versions kept per itinerary
+    REFINE_SUMMARY_MAX_CHARS: int = 4000  # itinerary JSON included in refine prompts
+
+    # Landmark science knowledge base (science_points near the route, prompt references)
+    LANDMARK_KB_PATH: Optional[str] = None  # defaults to the bundled app/data/landmarks.tsv
+    LANDMARK_RADIUS_KM: float = 25.0  # landmarks this close to the route are attached
+    LANDMARK_PROMPT_LIMIT: int = 8  # landmarks named in a prompt
+
+    # Local waypoint ordering (model output check, prompt skeletons)
+    ROUTE_MAX_DAILY_DRIVING_HOURS: float = 6.0
+    ROUTE_AVG_SPEED_KMH: float = 80.0
+    ROUTE_ROAD_FACTOR: float = 1.3  # road km per straight-line km
+    ROUTE_REORDER_MIN_SAVING: float = 0.05  # warn about backtracking when reordering saves this share
+
+    # Schedule feasibility check (after generation and refinement)
+    SCHEDULE_DAYLIGHT_MARGIN_MINUTES: int = 30  # afternoon blocks may end this long after sunset
+
+    # Cross-worker shared cache (SQLite WAL); set by gunicorn.conf.py for multi-worker runs
+    SHARED_CACHE_PATH: Optional[str] = None
+    SHARED_CACHE_MAX_ENTRIES: int = 5000
+    METRICS_PUBLISH_SECONDS: float = 5.0
+
+    # Cache warming (off-peak generation of top routes)
+    CACHE_WARMING_ENABLED: bool = False
+    CACHE_WARMING_HOUR_UTC: int = 9  # ~2am US Pacific
+    CACHE_WARMING_TOP_N: int = 50
+    CACHE_WARMING_CONCURRENCY: int = 2
+    CACHE_WARMING_RATE_PER_MINUTE: int = 10
+    CACHE_WARMING_STATE_PATH: str = "output/cache_warming_state.json"
+
+    # Two-phase generation (POST /api/itinerary/preview)
+    PREVIEW_MAX_OUTPUT_TOKENS: int = 2048
+    PREVIEW_KEEPALIVE_SECONDS: int = 60  # full generation is cancelled if /detail is not polled this long
+
+    # Asynchronous generation jobs (/api/jobs)
+    JOB_WORKERS: int = 4  # generations running at once per process
+    JOB_RETENTION_SECONDS: int = 3600  # finished jobs (and their results) kept this long
+    JOB_MAX_QUEUED: int = 1000
+    JOB_PUBLISH_INTERVAL_SECONDS: float = 0.5  # batch job snapshots to the shared tier at most this often
+
+    # Bulk generation (batch endpoint and CLI)
+    BATCH_CONCURRENCY: int = 4
+    BATCH_MAX_ITEMS: int = 1000
+
+    # Day images (/api/images): provider is loremflickr, unsplash or local
+    IMAGE_PROVIDER: str = "loremflickr"
+    UNSPLASH_ACCESS_KEY: Optional[str] = None
+    IMAGE_LOCAL_DIR: str = "assets/images"
+    IMAGE_CACHE_DIR: str = "output/images"
+    IMAGE_CACHE_MAX_MB: int = 512
+    IMAGE_FETCH_CONCURRENCY: int = 8
+    IMAGE_PREFETCH: bool = True  # resolve an itinerary's images right after generation
+
+    # Optional integrations (endpoints answer 503 until configured)
+    STRIPE_SECRET_KEY: Optional[str] = None
+    STRIPE_WEBHOOK_SECRET: Optional[str] = None
+    STRIPE_API_BASE: str = "https://api.stripe.com"  # e.g. http://localhost:12111 for stripe-mock
+    STRIPE_API_VERSION: Optional[str] = None
+    CHECKOUT_SESSION_TTL_SECONDS: int = 82800  # reuse window; Stripe sessions expire after 24h
+    WEBHOOK_QUEUE_PATH: str = "output/webhook_queue.sqlite3"
+    WEBHOOK_TOLERANCE_SECONDS: int = 300
+    WEBHOOK_BATCH_SIZE: int = 100
+    WEBHOOK_POLL_SECONDS: float = 1.0
+    WEBHOOK_RETRY_BASE_SECONDS: float = 5.0  # itinerary not found yet: backoff doubles per attempt
+    WEBHOOK_RETRY_MAX_SECONDS: float = 3600.0
+    WEBHOOK_MAX_ATTEMPTS: int = 12  # then dead-lettered (kept in the queue, never pruned)
+    PDF_OUTPUT_DIR: str = "output/pdf"
+
+    # Startup warmup and readiness probes (/api/health/ready)
+    WARMUP_ENABLED: bool = True
+    WARMUP_THREADS: int = 8  # default executor threads started before traffic
+    READINESS_PROBE_TTL_SECONDS: float = 30.0
+    READINESS_REMOTE_PROBES: bool = True  # probe the Gemini API itself, not just configuration
+
     # Server
     PORT: int = 8000
 
@@ -41,4 +156,17 @@ class Settings(BaseSettings):
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",") if origin.strip()]
 
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    """Build (once) and return the application settings"""
+    return Settings()
+
+
+class _LazySettings:
+    """Module-level `settings` proxy; reading .env is deferred until first use"""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_settings(), name)
+
+
+settings = _LazySettings()
@@ -0,0 +1,159 @@
+"""
+Lightweight in-process metrics
+Counters, gauges and summaries (count/sum/min/max + recent-window percentiles),
+exported as JSON at /api/health/metrics. Labels are folded into the metric
+name, e.g. model_latency_seconds{tier=flash}.
+Under gunicorn each worker publishes its snapshot to the shared cache and the
+endpoint merges them, so numbers cover every worker.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+
+def _metric_key(name: str, labels: Dict[str, Any]) -> str:
+    if not labels:
+        return name
+    label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+class _Summary:
+    """Running aggregate plus a bounded window for percentiles"""
+
+    __slots__ = ("count", "total", "min", "max", "window")
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.window = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.window.append(value)
+
+    def snapshot(self) -> Dict[str, float]:
+        ordered = sorted(self.window)
+
+        def pct(p: float) -> float:
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] if ordered else 0.0
+
+        return {
+            "count": self.count,
+            "sum": round(self.total, 4),
+            "avg": round(self.total / self.count, 4) if self.count else 0.0,
+            "min": round(self.min, 4) if self.count else 0.0,
+            "max": round(self.max, 4) if self.count else 0.0,
+            "p50": round(pct(0.50), 4),
+            "p95": round(pct(0.95), 4),
+        }
+
+
+class Metrics:
+    """Thread-safe metric registry (model calls run in worker threads)"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, _Summary] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _metric_key(name, labels)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = _Summary(self.window)
+            summary.observe(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": {k: v.snapshot() for k, v in self._summaries.items()},
+            }
+
+
+metrics = Metrics()
+
+
+def merge_snapshots(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combine per-worker snapshots: counters and summary counts/sums add up,
+    gauges are averaged, percentiles are count-weighted (approximate)
+    """
+    counters: Dict[str, float] = {}
+    gauges: Dict[str, List[float]] = {}
+    summaries: Dict[str, List[Dict[str, float]]] = {}
+    for snap in snapshots:
+        for key, value in snap.get("counters", {}).items():
+            counters[key] = counters.get(key, 0) + value
+        for key, value in snap.get("gauges", {}).items():
+            gauges.setdefault(key, []).append(value)
+        for key, value in snap.get("summaries", {}).items():
+            summaries.setdefault(key, []).append(value)
+
+    merged_summaries = {}
+    for key, parts in summaries.items():
+        parts = [p for p in parts if p["count"]]
+        count = sum(p["count"] for p in parts)
+        total = sum(p["sum"] for p in parts)
+        merged_summaries[key] = {
+            "count": count,
+            "sum": round(total, 4),
+            "avg": round(total / count, 4) if count else 0.0,
+            "min": min((p["min"] for p in parts), default=0.0),
+            "max": max((p["max"] for p in parts), default=0.0),
+            "p50": round(sum(p["p50"] * p["count"] for p in parts) / count, 4) if count else 0.0,
+            "p95": round(sum(p["p95"] * p["count"] for p in parts) / count, 4) if count else 0.0,
+        }
+    return {
+        "workers": len(snapshots),
+        "counters": counters,
+        "gauges": {key: round(sum(values) / len(values), 4) for key, values in gauges.items()},
+        "summaries": merged_summaries,
+    }
+
+
+def publish(shared: Any, ttl: float) -> None:
+    """Write this worker's snapshot to the shared cache (expires if the worker dies)"""
+    snapshot = metrics.snapshot()
+    snapshot["pid"] = os.getpid()
+    snapshot["published_at"] = time.time()
+    shared.set("metrics", str(os.getpid()), snapshot, ttl=ttl)
+
+
+def cluster_snapshot(shared: Any, ttl: float) -> Dict[str, Any]:
+    """Merged metrics of every live worker, including a fresh snapshot of this one"""
+    publish(shared, ttl)
+    return merge_snapshots(shared.items("metrics"))
+
+
+async def run_publisher(shared: Any, interval: float) -> None:
+    """Publish periodically until cancelled; entries outlive a few missed intervals"""
+    while True:
+        try:
+            await asyncio.to_thread(publish, shared, interval * 3)
+        except Exception as e:
+            print(f"[METRICS] Publish failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,23 @@
+"""
+Stage progress reporting
+Long-running services call report("model_call") as they move between stages;
+the listener bound to the current context (e.g. a generation job) receives it.
+Without a listener report() is a no-op, so services stay unaware of jobs.
+"""
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Dict, Optional
+
+Listener = Callable[[str, Dict[str, Any]], None]
+
+_listener: ContextVar[Optional[Listener]] = ContextVar("progress_listener", default=None)
+
+
+def report(stage: str, **detail: Any) -> None:
+    listener = _listener.get()
+    if listener is not None:
+        listener(stage, detail)
+
+
+def listen(listener: Optional[Listener]) -> Token:
+    """Bind a listener for the current task (and tasks it creates)"""
+    return _listener.set(listener)
@@ -0,0 +1,190 @@
+"""
+Cross-process cache tier (SQLite in WAL mode)
+Shared by every gunicorn worker on the host so a result produced by one worker
+is a hit on all of them:
+- Namespaced key/value entries (JSON values or raw bytes), optional TTL
+- Bounded per namespace (oldest entries pruned)
+- One connection per thread and process (never shared across fork)
+- WAL lets readers proceed while one worker writes
+Enabled by SHARED_CACHE_PATH (the gunicorn launcher sets a default).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    is_json INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_age ON entries (namespace, updated_at);
+"""
+
+
+def open_wal(path: str) -> sqlite3.Connection:
+    """Autocommit connection in WAL mode (readers never block the single writer)"""
+    conn = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SharedCache:
+    """SQLite-backed key/value cache usable from any worker process"""
+
+    def __init__(self, path: str, max_entries: int = 5000, prune_every: int = 100):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # Connections must not cross a fork (gunicorn preload) or threads
+            conn = open_wal(str(self.path))
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        found = self.get_stamped(namespace, key)
+        return found[0] if found is not None else None
+
+    def get_stamped(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        """(value, updated_at) - the stamp identifies the write, see stamp()"""
+        row = self._conn().execute(
+            "SELECT value, is_json, expires_at, updated_at FROM entries WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, is_json, expires_at, updated_at = row
+        if expires_at is not None and expires_at < time.time():
+            self.delete(namespace, key)
+            return None
+        return (json.loads(value) if is_json else bytes(value)), updated_at
+
+    def stamp(self, namespace: str, key: str) -> Optional[float]:
+        """updated_at of an entry without reading its value (cheap freshness check)"""
+        row = self._conn().execute(
+            "SELECT updated_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> float:
+        """Store a JSON-serializable value or raw bytes; returns the write's stamp"""
+        is_json = not isinstance(value, (bytes, bytearray))
+        payload = json.dumps(value, ensure_ascii=False, default=str) if is_json else bytes(value)
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO entries (namespace, key, value, is_json, updated_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (namespace, key, payload, int(is_json), now, now + ttl if ttl else None)
+        )
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune(namespace)
+        return now
+
+    def get_many(self, namespace: str, keys: List[str]) -> Dict[str, Any]:
+        """Live values for the keys that exist, in one query per 500 keys"""
+        found: Dict[str, Any] = {}
+        now = time.time()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._conn().execute(
+                f"SELECT key, value, is_json, expires_at FROM entries WHERE namespace = ? "
+                f"AND key IN ({','.join('?' * len(chunk))})",
+                (namespace, *chunk)
+            ).fetchall()
+            for key, value, is_json, expires_at in rows:
+                if expires_at is None or expires_at >= now:
+                    found[key] = json.loads(value) if is_json else bytes(value)
+        return found
+
+    def set_many(self, namespace: str, values: Dict[str, Any], ttl: Optional[float] = None) -> float:
+        """set() for several keys in one transaction; returns the shared stamp"""
+        now = time.time()
+        rows = []
+        for key, value in values.items():
+            is_json = not isinstance(value, (bytes, bytearray))
+            payload = json.dumps(value, ensure_ascii=False, default=str) if is_json else bytes(value)
+            rows.append((namespace, key, payload, int(is_json), now, now + ttl if ttl else None))
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, is_json, updated_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._writes += len(rows)
+        if self._writes >= self.prune_every:
+            self._writes = 0
+            self.prune(namespace)
+        return now
+
+    def delete(self, namespace: str, key: str) -> None:
+        self._conn().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def items(self, namespace: str) -> List[Any]:
+        """All live values in a namespace (small namespaces only, e.g. per-worker metrics)"""
+        rows = self._conn().execute(
+            "SELECT value, is_json FROM entries WHERE namespace = ? AND (expires_at IS NULL OR expires_at >= ?)",
+            (namespace, time.time())
+        ).fetchall()
+        return [json.loads(value) if is_json else bytes(value) for value, is_json in rows]
+
+    def prune(self, namespace: str) -> int:
+        """Drop expired entries and the oldest beyond max_entries"""
+        conn = self._conn()
+        expired = conn.execute(
+            "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+        ).rowcount
+        overflow = conn.execute(
+            "DELETE FROM entries WHERE namespace = ? AND key NOT IN ("
+            "SELECT key FROM entries WHERE namespace = ? ORDER BY updated_at DESC LIMIT ?)",
+            (namespace, namespace, self.max_entries)
+        ).rowcount
+        return expired + overflow
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT namespace, COUNT(*) FROM entries GROUP BY namespace").fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_shared: Optional[SharedCache] = None
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """Process-wide shared cache, or None when SHARED_CACHE_PATH is not configured"""
+    global _shared
+    if _shared is None and settings.SHARED_CACHE_PATH:
+        _shared = SharedCache(settings.SHARED_CACHE_PATH, max_entries=settings.SHARED_CACHE_MAX_ENTRIES)
+    return _shared
@@ -0,0 +1,171 @@
+"""
+Compact binary wire formats for itineraries
+Accept-negotiated alternatives to JSON for mobile clients:
+- application/msgpack, application/cbor: the same document, binary encoded
+- application/vnd.roadtrip.v{N}+msgpack / +cbor: additionally interns known keys
+  ("daily_budget_per_person" -> 18) using a versioned key dictionary
+The dictionary for a version never changes once shipped (clients cache it from
+/api/itinerary/wire-keys/{version}); add keys by adding a new version that
+appends to the previous one. tests/test_wire_format.py fails while the response
+model has keys the current version lacks (missing_keys()).
+msgpack and cbor2 are optional - formats whose library is missing are not offered.
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+# Most frequent keys first: small indexes encode in a single byte
+KEY_DICTIONARIES: Dict[int, Tuple[str, ...]] = {
+    1: (
+        "lat", "lon", "coordinates", "start_time", "duration_minutes", "activity",
+        "day_number", "location", "image_keyword", "image_url", "morning", "afternoon",
+        "evening", "photo_tip", "logistics", "dining_tip", "daily_driving_time", "vehicle_safety",
+        "daily_budget_per_person", "accommodation_search_query", "viator_activity_query", "name", "type",
+        "sequence", "day", "night", "category", "advice", "itinerary_id", "created_at",
+        "trip_summary", "season_info", "start_date", "itinerary_markdown", "itinerary_daily",
+        "route_coordinates", "is_round_trip", "markers", "vehicle_recommendation", "drivetrain",
+        "clearance", "safety_gear", "notes", "interest_highlights", "total_distance_km",
+        "estimated_driving_hours", "fuel_stops", "accommodation_points", "safety_warnings", "budget",
+        "number_of_persons", "fuel_cost", "toll_fees", "accommodation", "meals", "activities",
+        "subtotal", "buffer_fund", "total", "science_points", "scientific_explanation",
+        "observation_tips", "difficulty_class", "elevation_gain_m", "estimated_duration_hours",
+        "terrain_description", "gear_checklist", "risk_warnings", "packing_list", "payment_status",
+        "detail_level", "schedule_warnings", "block", "code", "message", "version",
+    ),
+}
+CURRENT_VERSION = max(KEY_DICTIONARIES)
+
+_KEY_INDEX = {version: {key: i for i, key in enumerate(keys)} for version, keys in KEY_DICTIONARIES.items()}
+
+
+def derive_keys() -> Set[str]:
+    """Every key ItineraryResponse (and the model schema inside it) can contain"""
+    from pydantic import BaseModel
+
+    from app.models.itinerary import ItineraryResponse
+    from app.services.ai_service import AIService
+
+    keys: Set[str] = set()
+
+    def walk_model(model: Any) -> None:
+        for name, field in model.model_fields.items():
+            keys.add(name)
+            annotation = field.annotation
+            for candidate in (annotation, *getattr(annotation, "__args__", ())):
+                if isinstance(candidate, type) and issubclass(candidate, BaseModel):
+                    walk_model(candidate)
+
+    def walk_schema(schema: dict) -> None:
+        for name, sub in (schema.get("properties") or {}).items():
+            keys.add(name)
+            walk_schema(sub)
+        if "items" in schema:
+            walk_schema(schema["items"])
+
+    walk_model(ItineraryResponse)
+    walk_schema(AIService.__new__(AIService)._build_schema([]))
+    keys.discard("days")  # renamed to itinerary_daily before leaving the service
+    keys.discard("budget_table")  # replaced by budget
+    return keys | {"image_url"}
+
+
+def missing_keys(version: int = CURRENT_VERSION) -> Set[str]:
+    """Keys the response model has gained since this dictionary version was frozen"""
+    return derive_keys() - set(KEY_DICTIONARIES[version])
+
+
+def intern_keys(value: Any, index: Dict[str, int]) -> Any:
+    """Replace known dict keys with their integer index (unknown keys stay strings)"""
+    if isinstance(value, dict):
+        return {index.get(k, k): intern_keys(v, index) for k, v in value.items()}
+    if isinstance(value, list):
+        return [intern_keys(v, index) for v in value]
+    return value
+
+
+def expand_keys(value: Any, keys: Tuple[str, ...]) -> Any:
+    if isinstance(value, dict):
+        return {(keys[k] if isinstance(k, int) else k): expand_keys(v, keys) for k, v in value.items()}
+    if isinstance(value, list):
+        return [expand_keys(v, keys) for v in value]
+    return value
+
+
+@lru_cache(maxsize=None)
+def _codec(name: str):
+    """(dumps, loads) for msgpack / cbor, or None when the library is missing"""
+    try:
+        if name == "msgpack":
+            import msgpack
+            return (lambda v: msgpack.packb(v, use_bin_type=True),
+                    lambda b: msgpack.unpackb(b, raw=False, strict_map_key=False))
+        import cbor2
+        return cbor2.dumps, cbor2.loads
+    except ImportError:
+        return None
+
+
+class WireFormat:
+    """A negotiable media type"""
+
+    __slots__ = ("media_type", "codec", "key_version")
+
+    def __init__(self, media_type: str, codec: str, key_version: Optional[int] = None):
+        self.media_type = media_type
+        self.codec = codec
+        self.key_version = key_version
+
+    @property
+    def available(self) -> bool:
+        return _codec(self.codec) is not None
+
+    def encode(self, data: Any) -> bytes:
+        if self.key_version is not None:
+            data = intern_keys(data, _KEY_INDEX[self.key_version])
+        return _codec(self.codec)[0](data)
+
+    def decode(self, payload: bytes) -> Any:
+        data = _codec(self.codec)[1](payload)
+        if self.key_version is not None:
+            data = expand_keys(data, KEY_DICTIONARIES[self.key_version])
+        return data
+
+
+FORMATS: List[WireFormat] = [
+    WireFormat("application/msgpack", "msgpack"),
+    WireFormat("application/x-msgpack", "msgpack"),
+    WireFormat("application/cbor", "cbor"),
+] + [
+    WireFormat(f"application/vnd.roadtrip.v{version}+{codec}", codec, version)
+    for version in KEY_DICTIONARIES
+    for codec in ("msgpack", "cbor")
+]
+_BY_MEDIA_TYPE = {fmt.media_type: fmt for fmt in FORMATS}
+
+
+def negotiate(accept: Optional[str]) -> Optional[WireFormat]:
+    """Best binary format the client accepts, or None for JSON"""
+    if not accept:
+        return None
+    best: Optional[WireFormat] = None
+    best_rank = (0.0, 0)
+    json_rank = (0.0, 0)
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        # Highest q wins; among equal q the earlier entry wins, per usual Accept semantics
+        rank = (q, -position)
+        if media_type in ("application/json", "*/*", "application/*"):
+            if q > json_rank[0]:
+                json_rank = rank
+            continue
+        fmt = _BY_MEDIA_TYPE.get(media_type)
+        if fmt is not None and q > best_rank[0] and fmt.available:
+            best, best_rank = fmt, rank
+    return best if best is not None and best_rank > json_rank else None
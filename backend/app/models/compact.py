@@ -0,0 +1,308 @@
+"""
+Compact in-memory itinerary representation
+Cached itineraries used to be trees of small dicts. These __slots__ classes
+hold the same data with far less overhead and round-trip to the same JSON:
+- Coordinates live in a flat array('d') (16 bytes per point, not ~400)
+- Days, time blocks, markers and fuel stops are slotted objects
+- Repeated short strings (types, start times, keywords) are interned
+- Unknown fields are kept in a per-object `extra` dict, so nothing is lost
+Fields are coerced on the way in (e.g. "120" -> 120), which doubles as validation.
+"""
+import copy
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def _int(value: Any, default: int = 0) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _float(value: Any, default: float = 0.0) -> float:
+    try:
+        return float(str(value).replace("$", "").replace(",", "")) if isinstance(value, str) else float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _number(value: Any) -> float:
+    """Keep ints and floats as given (same JSON out), coerce anything else"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return _float(value)
+
+
+def _str(value: Any, intern: bool = False) -> str:
+    text = "" if value is None else str(value)
+    return sys.intern(text) if intern and len(text) <= 40 else text
+
+
+def _extra(data: dict, known: Iterable[str]) -> Optional[dict]:
+    known = set(known)
+    extra = {k: v for k, v in data.items() if k not in known}
+    return extra or None
+
+
+class Coordinates:
+    """lat/lon pairs packed into one array('d')"""
+
+    __slots__ = ("_values",)
+
+    def __init__(self, points: Iterable[Tuple[float, float]] = ()):
+        self._values = array("d")
+        for lat, lon in points:
+            self._values.append(lat)
+            self._values.append(lon)
+
+    @classmethod
+    def from_list(cls, items: Optional[List[dict]]) -> "Coordinates":
+        coords = cls()
+        for item in items or []:
+            if isinstance(item, dict) and "lat" in item:
+                coords._values.append(_float(item.get("lat")))
+                coords._values.append(_float(item.get("lon", item.get("lng"))))
+        return coords
+
+    def __len__(self) -> int:
+        return len(self._values) // 2
+
+    def __iter__(self):
+        values = self._values
+        for i in range(0, len(values), 2):
+            yield values[i], values[i + 1]
+
+    def to_list(self) -> List[dict]:
+        return [{"lat": lat, "lon": lon} for lat, lon in self]
+
+
+def _point(value: Any) -> Optional[Tuple[float, float]]:
+    if isinstance(value, dict) and "lat" in value:
+        return _float(value.get("lat")), _float(value.get("lon", value.get("lng")))
+    return None
+
+
+def _point_dict(point: Optional[Tuple[float, float]]) -> Optional[dict]:
+    return {"lat": point[0], "lon": point[1]} if point is not None else None
+
+
+class TimeBlock:
+    """Morning / afternoon / evening block; tip_key is photo_tip, logistics or dining_tip"""
+
+    __slots__ = ("start_time", "duration_minutes", "activity", "tip_key", "tip", "extra")
+
+    TIP_KEYS = {"morning": "photo_tip", "afternoon": "logistics", "evening": "dining_tip"}
+
+    def __init__(self, start_time: str, duration_minutes: int, activity: str, tip_key: str, tip: Optional[str], extra=None):
+        self.start_time = start_time
+        self.duration_minutes = duration_minutes
+        self.activity = activity
+        self.tip_key = tip_key
+        self.tip = tip
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, slot: str, data: dict) -> "TimeBlock":
+        tip_key = cls.TIP_KEYS.get(slot, "tip")
+        return cls(
+            _str(data.get("start_time"), intern=True),
+            _int(data.get("duration_minutes")),
+            _str(data.get("activity")),
+            sys.intern(tip_key),
+            _str(data[tip_key]) if tip_key in data else None,
+            _extra(data, ("start_time", "duration_minutes", "activity", tip_key)),
+        )
+
+    def to_dict(self) -> dict:
+        out = {"start_time": self.start_time, "duration_minutes": self.duration_minutes, "activity": self.activity}
+        if self.tip is not None:
+            out[self.tip_key] = self.tip
+        if self.extra:
+            out.update(copy.deepcopy(self.extra))
+        return out
+
+
+class Day:
+    """One entry of itinerary_daily"""
+
+    __slots__ = (
+        "day_number", "location", "image_keyword", "image_url", "blocks", "daily_driving_time",
+        "vehicle_safety", "daily_budget_per_person", "accommodation_search_query",
+        "viator_activity_query", "extra",
+    )
+
+    SLOTS = ("morning", "afternoon", "evening")
+    TEXT_FIELDS = ("daily_driving_time", "vehicle_safety", "accommodation_search_query", "viator_activity_query")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Day":
+        day = cls.__new__(cls)
+        day.day_number = _int(data.get("day_number"))
+        day.location = _str(data.get("location"), intern=True)
+        day.image_keyword = _str(data.get("image_keyword"), intern=True)
+        day.image_url = data.get("image_url")
+        day.blocks = tuple(
+            TimeBlock.from_dict(slot, data[slot]) if isinstance(data.get(slot), dict) else None
+            for slot in cls.SLOTS
+        )
+        for name in cls.TEXT_FIELDS:
+            setattr(day, name, _str(data[name]) if name in data else None)
+        day.daily_budget_per_person = _number(data["daily_budget_per_person"]) if "daily_budget_per_person" in data else None
+        day.extra = _extra(data, ("day_number", "location", "image_keyword", "image_url", "daily_budget_per_person")
+                           + cls.SLOTS + cls.TEXT_FIELDS)
+        return day
+
+    def to_dict(self) -> dict:
+        out: Dict[str, Any] = {"day_number": self.day_number, "location": self.location, "image_keyword": self.image_keyword}
+        for slot, block in zip(self.SLOTS, self.blocks):
+            if block is not None:
+                out[slot] = block.to_dict()
+        for name in self.TEXT_FIELDS[:2]:
+            if getattr(self, name) is not None:
+                out[name] = getattr(self, name)
+        if self.daily_budget_per_person is not None:
+            out["daily_budget_per_person"] = self.daily_budget_per_person
+        for name in self.TEXT_FIELDS[2:]:
+            if getattr(self, name) is not None:
+                out[name] = getattr(self, name)
+        if self.image_url is not None:
+            out["image_url"] = self.image_url
+        if self.extra:
+            out.update(copy.deepcopy(self.extra))
+        return out
+
+
+class Marker:
+    __slots__ = ("sequence", "name", "type", "point", "extra")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Marker":
+        marker = cls.__new__(cls)
+        marker.sequence = _int(data.get("sequence"))
+        marker.name = _str(data.get("name"))
+        marker.type = _str(data.get("type"), intern=True)
+        marker.point = _point(data.get("coordinates"))
+        marker.extra = _extra(data, ("sequence", "name", "type", "coordinates"))
+        return marker
+
+    def to_dict(self) -> dict:
+        out = {"sequence": self.sequence, "name": self.name, "type": self.type}
+        if self.point is not None:
+            out["coordinates"] = _point_dict(self.point)
+        if self.extra:
+            out.update(copy.deepcopy(self.extra))
+        return out
+
+
+class FuelStop:
+    __slots__ = ("day", "location", "point", "extra")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FuelStop":
+        stop = cls.__new__(cls)
+        stop.day = _int(data.get("day"))
+        stop.location = _str(data.get("location"))
+        stop.point = _point(data.get("coordinates"))
+        stop.extra = _extra(data, ("day", "location", "coordinates"))
+        return stop
+
+    def to_dict(self) -> dict:
+        out = {"day": self.day, "location": self.location}
+        if self.point is not None:
+            out["coordinates"] = _point_dict(self.point)
+        if self.extra:
+            out.update(copy.deepcopy(self.extra))
+        return out
+
+
+class VehicleRecommendation:
+    __slots__ = ("drivetrain", "clearance", "safety_gear", "notes", "extra")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "VehicleRecommendation":
+        rec = cls.__new__(cls)
+        rec.drivetrain = _str(data.get("drivetrain"), intern=True)
+        rec.clearance = _str(data.get("clearance"), intern=True)
+        rec.safety_gear = tuple(_str(g, intern=True) for g in data.get("safety_gear") or [])
+        rec.notes = _str(data.get("notes"))
+        rec.extra = _extra(data, ("drivetrain", "clearance", "safety_gear", "notes"))
+        return rec
+
+    def to_dict(self) -> dict:
+        out = {"drivetrain": self.drivetrain, "clearance": self.clearance, "safety_gear": list(self.safety_gear), "notes": self.notes}
+        if self.extra:
+            out.update(copy.deepcopy(self.extra))
+        return out
+
+
+# top-level field -> (from JSON, to JSON) for the compacted parts
+_COMPACT_FIELDS = {
+    "itinerary_daily": (lambda v: tuple(Day.from_dict(d) for d in v if isinstance(d, dict)),
+                        lambda v: [d.to_dict() for d in v]),
+    "markers": (lambda v: tuple(Marker.from_dict(m) for m in v if isinstance(m, dict)),
+                lambda v: [m.to_dict() for m in v]),
+    "route_coordinates": (Coordinates.from_list, Coordinates.to_list),
+    "vehicle_recommendation": (VehicleRecommendation.from_dict, VehicleRecommendation.to_dict),
+}
+
+
+class CompactItinerary:
+    """Slotted form of an ItineraryResponse dict; to_dict() gives the same JSON back"""
+
+    __slots__ = ("itinerary_id", "_order", "_compact", "_fuel_stops", "_rest")
+
+    def __init__(self, data: dict):
+        self.itinerary_id = data["itinerary_id"]
+        self._order = tuple(sys.intern(k) for k in data)
+        self._compact: Dict[str, Any] = {}
+        self._fuel_stops: Optional[Tuple[FuelStop, ...]] = None
+        self._rest: Dict[str, Any] = {}
+        for key, value in data.items():
+            self._set(key, value)
+
+    def _set(self, key: str, value: Any) -> None:
+        codec = _COMPACT_FIELDS.get(key)
+        if codec is not None and isinstance(value, (list, dict)):
+            self._compact[key] = codec[0](value)
+            self._rest.pop(key, None)
+        elif key == "logistics" and isinstance(value, dict) and isinstance(value.get("fuel_stops"), list):
+            self._fuel_stops = tuple(FuelStop.from_dict(s) for s in value["fuel_stops"] if isinstance(s, dict))
+            self._rest[key] = {k: v for k, v in value.items() if k != "fuel_stops"}
+        else:
+            self._compact.pop(key, None)
+            if key == "logistics":
+                self._fuel_stops = None
+            self._rest[key] = value
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._compact:
+            return _COMPACT_FIELDS[key][1](self._compact[key])
+        value = self._rest[key]
+        if key == "logistics" and self._fuel_stops is not None:
+            value = dict(value)
+            # Keep fuel_stops in its schema position (after estimated_driving_hours)
+            ordered = {}
+            for k, v in value.items():
+                ordered[k] = v
+                if k == "estimated_driving_hours":
+                    ordered["fuel_stops"] = [s.to_dict() for s in self._fuel_stops]
+            ordered.setdefault("fuel_stops", [s.to_dict() for s in self._fuel_stops])
+            return ordered
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self._compact or key in self._rest else default
+
+    def update(self, fields: Dict[str, Any]) -> None:
+        for key, value in fields.items():
+            if key not in self._order:
+                self._order = self._order + (sys.intern(key),)
+            self._set(key, value)
+        if "itinerary_id" in fields:
+            self.itinerary_id = fields["itinerary_id"]
+
+    def to_dict(self) -> dict:
+        """Fresh JSON-ready dict (callers may mutate it freely)"""
+        return {key: copy.deepcopy(self[key]) if key in self._rest else self[key] for key in self._order}
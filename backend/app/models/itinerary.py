@@ -83,6 +83,12 @@ class ItineraryRefinementRequest(BaseModel):
     refinement_request: str = Field(..., description="Modification request in English")
 
 
+class SessionRefinementRequest(BaseModel):
+    """Refine a stored itinerary by id (POST /api/itinerary/{itinerary_id}/refine)"""
+    refinement_request: str = Field(..., description="Modification request in English")
+    version: int = Field(..., ge=1, description="Version the client is refining (from X-Itinerary-Version)")
+
+
 class LogisticsInfo(BaseModel):
     """Logistics information"""
     total_distance_km: float = 0
@@ -94,6 +100,7 @@ class LogisticsInfo(BaseModel):
 
 class BudgetBreakdown(BaseModel):
     """Budget with mandatory 10% buffer fund"""
+    number_of_persons: Optional[int] = None
     fuel_cost: float = 0
     toll_fees: float = 0
     accommodation: float = 0
@@ -124,6 +131,14 @@ class SciencePoint(BaseModel):
     observation_tips: str = ""
 
 
+class ScheduleWarning(BaseModel):
+    """Schedule conflict the local checkers could not repair"""
+    day: Optional[int] = None  # None for trip-wide issues (route_backtracking)
+    block: Optional[str] = None  # morning | afternoon | evening; None for whole-day issues
+    code: str  # e.g. after_dark, past_midnight, driving_over_limit, day_overbooked, route_backtracking
+    message: str
+
+
 class ItineraryResponse(BaseModel):
     """Response model for generated itinerary"""
 
@@ -133,6 +148,7 @@ class ItineraryResponse(BaseModel):
     # Trip overview
     trip_summary: str
     season_info: str
+    start_date: Optional[date] = None
 
     # Core content
     itinerary_markdown: str = ""
@@ -160,5 +176,10 @@ class ItineraryResponse(BaseModel):
     # Safety & tips
     risk_warnings: List[str] = Field(default_factory=list)
     packing_list: List[str] = Field(default_factory=list)
+    schedule_warnings: List[ScheduleWarning] = Field(default_factory=list)
 
     payment_status: str = "pending"
+    # "preview" until two-phase generation attaches the full detail ("full"); failed,
+    # abandoned or refined if it never will
+    detail_level: str = "full"
+    version: int = 1  # refinement version (X-Itinerary-Version); each refine by id adds one
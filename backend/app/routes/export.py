@@ -1,34 +1,45 @@
 """
-Export endpoints for PDF generation
-Converts Markdown itinerary to publication-quality PDF
+Export endpoints
+Streamed GPX / KML / iCalendar files
+The PDF roadbook (ExportService) is not routed: it still has no itinerary
+source and weasyprint/markdown are not in requirements.txt
 """
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Body, HTTPException
+from fastapi.responses import StreamingResponse
 
-from app.core.database import get_db
-from app.services.export_service import ExportService
+from app.services.itinerary_store import get_itinerary_store
+from app.services.route_exporters import EXPORT_FORMATS, buffered
 
 router = APIRouter()
 
 
-@router.get("/pdf/{itinerary_id}")
-async def export_to_pdf(
-    itinerary_id: str,
-    db: AsyncSession = Depends(get_db)
-):
+def _stream_export(fmt: str, itinerary: dict) -> StreamingResponse:
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail=f"Unknown format; use one of {sorted(EXPORT_FORMATS)}")
+    writer, media_type, extension = EXPORT_FORMATS[fmt]
+    filename = f"roadtrip_{itinerary.get('itinerary_id', 'itinerary')}.{extension}"
+    return StreamingResponse(
+        buffered(writer(itinerary)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/{fmt}/{itinerary_id}")
+async def export_stored(fmt: str, itinerary_id: str):
     """
-    Export itinerary to PDF using WeasyPrint
-    Returns publication-quality PDF roadbook
+    Stream a stored itinerary as GPX (nav apps), KML (Google Earth/Maps)
+    or ICS (calendar events for each morning/afternoon/evening block)
     """
-    try:
-        service = ExportService(db)
-        pdf_path = await service.generate_pdf(itinerary_id)
-
-        return FileResponse(
-            pdf_path,
-            media_type="application/pdf",
-            filename=f"roadtrip_{itinerary_id}.pdf"
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail=f"Unknown format; use one of {sorted(EXPORT_FORMATS)}")
+    itinerary = get_itinerary_store().get(itinerary_id)
+    if itinerary is None:
+        raise HTTPException(status_code=404, detail="Itinerary not found")
+    return _stream_export(fmt, itinerary)
+
+
+@router.post("/{fmt}")
+async def export_posted(fmt: str, itinerary: dict = Body(...)):
+    """Same as GET, for an itinerary held by the client (e.g. after a refinement)"""
+    return _stream_export(fmt, itinerary)
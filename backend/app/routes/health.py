@@ -3,6 +3,14 @@ Health check endpoints
 For monitoring application status
 """
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core.config import settings
+from app.core.metrics import cluster_snapshot, metrics
+from app.core.shared_cache import get_shared_cache
+from app.services.model_router import get_model_router
+from app.services.scheduler import get_scheduler
+from app.services.warmup import readiness
 
 router = APIRouter()
 
@@ -15,3 +23,26 @@ async def health_check():
         "service": "AI Roadtrip Genie",
         "version": "3.0.0"
     }
+
+
+@router.get("/ready")
+async def readiness_check():
+    """Readiness for load balancers: 503 until warmup has finished and dependency probes pass"""
+    report = await readiness.status()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@router.get("/metrics")
+async def metrics_snapshot(scope: str = "cluster"):
+    """
+    Metrics (token budget accuracy, latencies, counters) and model tier health
+    scope=cluster merges every worker via the shared cache; scope=worker is this process only
+    """
+    shared = get_shared_cache()
+    if scope == "cluster" and shared is not None:
+        snapshot = cluster_snapshot(shared, settings.METRICS_PUBLISH_SECONDS * 3)
+    else:
+        snapshot = metrics.snapshot()
+    snapshot["model_tiers"] = get_model_router().snapshot()
+    snapshot["scheduler"] = get_scheduler().snapshot()  # this worker's slots
+    return snapshot
@@ -0,0 +1,31 @@
+"""
+Day image endpoints
+Stable, cacheable URLs for itinerary images (resolved and resized server-side)
+"""
+import re
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from app.services.image_service import VARIANTS, ImageProviderError, get_image_service
+
+router = APIRouter()
+
+_SLUG = re.compile(r"^[a-z0-9_][a-z0-9_-]{0,79}$")
+
+
+@router.get("/{slug}/{variant}.webp")
+async def get_image(slug: str, variant: str):
+    """WebP variant (thumb/card/hero) for an image keyword slug"""
+    if not _SLUG.match(slug):
+        raise HTTPException(status_code=404, detail="Unknown image")
+    if variant not in VARIANTS:
+        raise HTTPException(status_code=404, detail=f"Unknown variant; use one of {sorted(VARIANTS)}")
+    try:
+        path = await get_image_service().get(slug, variant)
+    except ImageProviderError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Image fetch failed: {e}")
+    # URLs are per keyword, so browsers and CDNs can keep them
+    return FileResponse(path, media_type="image/webp", headers={"Cache-Control": "public, max-age=2592000"})
@@ -2,40 +2,111 @@
 Itinerary generation endpoints
 Core business logic for AI-powered roadtrip planning
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+import json
 import uuid
 from datetime import datetime
+from typing import Any, Dict, Optional
 
-from app.models.itinerary import ItineraryRequest, ItineraryResponse, ItineraryRefinementRequest
+from app.core.wire_format import KEY_DICTIONARIES, negotiate
+from app.models.itinerary import (
+    ItineraryRequest,
+    ItineraryResponse,
+    ItineraryRefinementRequest,
+    SessionRefinementRequest
+)
 from app.services.itinerary_service import ItineraryService
-from app.services.ai_service import AIService
+from app.services.preview_service import PreviewService
+from app.services.refinement_sessions import SessionError, get_refinement_sessions
+from app.services.batch_service import BatchRunner, iter_ndjson_lines
 
 router = APIRouter()
 
 
+def _negotiated(
+    http_request: Request, response: Response, payload: Any, headers: Optional[Dict[str, str]] = None
+) -> Any:
+    """Encode as MessagePack/CBOR when the Accept header prefers it, else leave JSON to FastAPI"""
+    headers = {**(headers or {}), "Vary": "Accept"}
+    response.headers.update(headers)
+    fmt = negotiate(http_request.headers.get("accept"))
+    if fmt is None:
+        return payload
+    data = payload.model_dump(mode="json") if hasattr(payload, "model_dump") else jsonable_encoder(payload)
+    if fmt.key_version is not None:
+        headers["X-Wire-Keys"] = str(fmt.key_version)
+    return Response(fmt.encode(data), media_type=fmt.media_type, headers=headers)
+
+
 @router.post("/generate", response_model=ItineraryResponse)
-async def generate_itinerary(request: ItineraryRequest):
+async def generate_itinerary(request: ItineraryRequest, http_request: Request, response: Response):
     """
     Generate AI-powered roadtrip itinerary
     Includes: hardcore logistics, outdoor activities, scientific insights
+    Accept: application/msgpack, application/cbor or application/vnd.roadtrip.v1+msgpack for binary
     """
     try:
         service = ItineraryService()
         itinerary = await service.generate(request)
-        return itinerary
+        return _negotiated(http_request, response, itinerary, {"X-Itinerary-Version": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/preview", response_model=ItineraryResponse)
+async def generate_preview(request: ItineraryRequest, http_request: Request, response: Response):
+    """
+    Two-phase generation: summary, route, vehicle advice and budget now
+    (detail_level "preview"); the full itinerary is generated in the background
+    under the same itinerary_id - poll GET /{itinerary_id}/detail for it
+    """
+    try:
+        preview = await PreviewService().preview(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    headers = {"X-Itinerary-Version": "1"}
+    if preview.detail_level == "preview":
+        headers["X-Detail-Url"] = f"/api/itinerary/{preview.itinerary_id}/detail"
+    return _negotiated(http_request, response, preview, headers)
+
+
+@router.get("/{itinerary_id}/detail", response_model=ItineraryResponse)
+async def get_detail(itinerary_id: str, http_request: Request, response: Response):
+    """
+    Full itinerary behind a preview: 200 once attached, 202 while generating,
+    409 if it failed, was abandoned, or the preview was refined in the meantime
+    (the refinement is kept). Polling keeps the background generation alive.
+    """
+    status, itinerary = PreviewService().detail(itinerary_id)
+    if status == "unknown":
+        raise HTTPException(status_code=404, detail=f"Itinerary {itinerary_id} not found")
+    if itinerary is None:
+        body = {"itinerary_id": itinerary_id, "status": status}
+        return JSONResponse(body, status_code=202 if status == "generating" else 409)
+    return _negotiated(http_request, response, itinerary, {"X-Itinerary-Version": str(itinerary.get("version", 1))})
+
+
+@router.delete("/{itinerary_id}/detail")
+async def abandon_detail(itinerary_id: str):
+    """Stop generating the full itinerary behind a preview (the preview stays available)"""
+    status = PreviewService().abandon(itinerary_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Itinerary {itinerary_id} not found")
+    return {"itinerary_id": itinerary_id, "status": status}
 
 
 @router.post("/refine", response_model=ItineraryResponse)
-async def refine_itinerary(request: ItineraryRefinementRequest):
+async def refine_itinerary(request: ItineraryRefinementRequest, http_request: Request, response: Response):
     """
     Refine existing itinerary based on user feedback
     Maintains: 10% buffer fund, scientific depth, expert-level guidance
+    Stateless variant: prefer POST /{itinerary_id}/refine, which does not upload the itinerary
     """
     try:
-        ai_service = AIService()
-        refined_data = await ai_service.refine_itinerary(
+        service = ItineraryService()
+        refined_data = await service.refine(
             current_itinerary=request.current_itinerary,
             refinement_request=request.refinement_request
         )
@@ -47,6 +118,76 @@ async def refine_itinerary(request: ItineraryRefinementRequest):
         if "payment_status" not in refined_data:
             refined_data["payment_status"] = "unpaid"
 
-        return refined_data
+        return _negotiated(http_request, response, refined_data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{itinerary_id}/refine", response_model=ItineraryResponse)
+async def refine_session(
+    itinerary_id: str, request: SessionRefinementRequest, http_request: Request, response: Response
+):
+    """
+    Refine a stored itinerary by id
+    Send the version from X-Itinerary-Version; 409 means someone refined it since
+    (the body's current_version says which version to fetch and retry from)
+    """
+    try:
+        refined = await ItineraryService().refine_version(itinerary_id, request.refinement_request, request.version)
+    except SessionError as e:
+        detail: Any = str(e)
+        if e.current_version is not None:
+            detail = {"message": str(e), "current_version": e.current_version}
+        raise HTTPException(status_code=e.status_code, detail=detail)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return _negotiated(http_request, response, refined.itinerary.to_dict(), {"X-Itinerary-Version": str(refined.version)})
+
+
+@router.get("/{itinerary_id}/versions")
+async def list_versions(itinerary_id: str):
+    """Refinement history of an itinerary (oldest kept version first)"""
+    session = get_refinement_sessions().get(itinerary_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Itinerary {itinerary_id} not found")
+    return {
+        "itinerary_id": itinerary_id,
+        "version": session.latest.version,
+        "history": [entry.info() for entry in session.versions]
+    }
+
+
+@router.get("/{itinerary_id}/versions/{version}", response_model=ItineraryResponse)
+async def get_version(itinerary_id: str, version: int, http_request: Request, response: Response):
+    """One kept version of an itinerary"""
+    session = get_refinement_sessions().get(itinerary_id)
+    entry = session.find(version) if session is not None else None
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Version {version} of {itinerary_id} not found")
+    return _negotiated(http_request, response, entry.itinerary.to_dict(), {"X-Itinerary-Version": str(entry.version)})
+
+
+@router.post("/batch")
+async def generate_batch(request: Request):
+    """
+    Bulk generation from a JSONL body of ItineraryRequest objects
+    Streams one JSONL result record per input line in order of completion;
+    failed items are reported inline without failing the batch.
+    Resubmitting completed items is cheap: identical requests hit the itinerary store.
+    """
+    runner = BatchRunner(ItineraryService())
+
+    async def stream():
+        async for record in runner.run(iter_ndjson_lines(request.stream())):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/wire-keys/{version}")
+async def wire_keys(version: int):
+    """Key dictionary for application/vnd.roadtrip.v{version}+msgpack|cbor (immutable per version)"""
+    keys = KEY_DICTIONARIES.get(version)
+    if keys is None:
+        raise HTTPException(status_code=404, detail=f"Unknown key dictionary version {version}")
+    return {"version": version, "keys": list(keys)}
@@ -0,0 +1,82 @@
+"""
+Generation job endpoints
+Submit once, then poll or subscribe; the result survives client disconnects
+"""
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+
+from app.models.itinerary import ItineraryRequest
+from app.services.job_manager import JobError, get_job_manager
+
+router = APIRouter()
+
+
+@router.post("", status_code=202)
+async def submit_job(request: ItineraryRequest):
+    """Queue a generation; returns the job id and where to follow it"""
+    try:
+        job = get_job_manager().submit(request)
+    except JobError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {
+        **job.snapshot(),
+        "status_url": f"/api/jobs/{job.job_id}",
+        "result_url": f"/api/jobs/{job.job_id}/result",
+        "events_url": f"/api/jobs/{job.job_id}/events",
+    }
+
+
+@router.get("/{job_id}")
+async def job_status(job_id: str):
+    """Status, current stage and recent stage events"""
+    snapshot = get_job_manager().get(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return snapshot
+
+
+@router.get("/{job_id}/result")
+async def job_result(job_id: str):
+    """The itinerary once succeeded; 202 with the status while pending, 409 if failed or cancelled"""
+    manager = get_job_manager()
+    snapshot = manager.get(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if snapshot["status"] in ("queued", "running"):
+        return JSONResponse(snapshot, status_code=202)
+    itinerary = manager.result(job_id)
+    if itinerary is None:
+        raise HTTPException(status_code=409, detail=snapshot)
+    return itinerary
+
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancel a queued or running job (no-op once finished)
+    A running job is marked cancelled at once, but a model call already in flight
+    is not interrupted: it completes (and is billed) or hits its SDK timeout
+    """
+    snapshot = get_job_manager().cancel(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return snapshot
+
+
+@router.websocket("/{job_id}/events")
+async def job_events(websocket: WebSocket, job_id: str):
+    """Pushes the current snapshot, then one message per stage until the job ends"""
+    await websocket.accept()
+    manager = get_job_manager()
+    if manager.get(job_id) is None:
+        await websocket.close(code=4404, reason="Job not found")
+        return
+    events = manager.events(job_id)
+    try:
+        async for event in events:
+            await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass  # the job keeps running; the client can reconnect or poll
+    finally:
+        await events.aclose()
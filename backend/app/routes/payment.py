@@ -3,11 +3,10 @@ Payment endpoints using Stripe
 Handles $12.99 per itinerary transactions
 """
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
 from app.models.payment import PaymentRequest, PaymentResponse
-from app.services.payment_service import PaymentService
+from app.services.payment_service import PaymentError, PaymentService
 
 router = APIRouter()
 
@@ -15,7 +14,7 @@ router = APIRouter()
 @router.post("/create-checkout-session", response_model=PaymentResponse)
 async def create_checkout_session(
     request: PaymentRequest,
-    db: AsyncSession = Depends(get_db)
+    db=Depends(get_db)
 ):
     """
     Create Stripe Checkout session for itinerary purchase
@@ -25,6 +24,8 @@ async def create_checkout_session(
         service = PaymentService(db)
         session = await service.create_checkout_session(request)
         return session
+    except PaymentError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -32,19 +33,19 @@ async def create_checkout_session(
 @router.post("/webhook")
 async def stripe_webhook(
     request: Request,
-    db: AsyncSession = Depends(get_db)
+    db=Depends(get_db)
 ):
     """
     Handle Stripe webhook events
-    Processes payment confirmation and failures
+    Verified and queued immediately; payment status is applied in the background
     """
     try:
         payload = await request.body()
         sig_header = request.headers.get("stripe-signature")
 
         service = PaymentService(db)
-        await service.handle_webhook(payload, sig_header)
-
-        return {"status": "success"}
+        return await service.handle_webhook(payload, sig_header)
+    except PaymentError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -2,24 +2,124 @@
 AI Service - V2.0 Final Professional Version
 Gemini 2.5 Flash with morning/afternoon/evening structure, scaled budgeting, universal expertise
 """
-import google.generativeai as genai
-from typing import Dict, Any, List
+from typing import Dict, Any, Callable, List, Optional
 import json
 import asyncio
 import re
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.progress import report
 from app.models.itinerary import ItineraryRequest
+from app.services.budget_engine import BudgetEngine
+from app.services.landmark_kb import attach_science_points, get_landmark_kb
+from app.services.model_router import ModelRouter, ModelTier, estimate_complexity, get_model_router
+from app.services.route_optimizer import get_route_optimizer
+from app.services.schedule_checker import get_schedule_checker
+from app.services.scheduler import get_scheduler
+from app.services.schema_validator import CompiledValidator
+from app.services.token_budget import token_budget
+from app.services.truncation import (
+    continuation_schema,
+    find_missing,
+    merge_continuation,
+    parse_partial_json,
+    prune_incomplete,
+    summarize_days
+)
+
+
+_genai = None
+
+
+def get_genai():
+    """Import and configure google.generativeai on first use (keeps it out of cold start)"""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        _genai = genai
+    return _genai
+
+
+# Not useful to the model when refining (ids, rendered copies, derived lists)
+_SUMMARY_SKIP = ("itinerary_id", "created_at", "payment_status", "itinerary_markdown", "route_coordinates",
+                 "science_points", "activities")
+_DAY_TIPS = {"morning": "photo_tip", "afternoon": "logistics", "evening": "dining_tip"}
+
+
+def compact_summary(itinerary: dict, max_chars: int = 4000) -> str:
+    """
+    Minified itinerary JSON for refinement prompts
+    Drops fields the model does not need; if still too long, drops the per-block
+    tips before truncating
+    """
+    data = {k: v for k, v in itinerary.items() if k not in _SUMMARY_SKIP}
+    days = [{k: v for k, v in day.items() if k != "image_url"} for day in data.get("itinerary_daily") or []]
+    if days:
+        data["itinerary_daily"] = days
+    text = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+    if len(text) > max_chars and days:
+        for day in days:
+            for slot, tip in _DAY_TIPS.items():
+                if isinstance(day.get(slot), dict):
+                    day[slot] = {k: v for k, v in day[slot].items() if k != tip}
+        text = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+    return text[:max_chars]
 
 
 class AIService:
     """AI-powered itinerary generation using Gemini with enforced schema"""
 
-    def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-
-    def _build_schema(self, user_interests: List[str]) -> dict:
-        """V2.0 Schema with morning/afternoon/evening partitioning for stability"""
-
+    # Compiled once per process from _build_schema (descriptions do not affect validation)
+    _validator: Optional[CompiledValidator] = None
+    # Response schemas keyed by activity word limit (the only varying part); treat as read-only
+    _schemas: Dict[int, dict] = {}
+
+    # Preview phase: what users decide on (summary, route, vehicle, budget) plus a one-line day outline
+    PREVIEW_SECTIONS = (
+        "trip_summary", "season_info", "vehicle_recommendation", "days", "budget_table",
+        "markers", "route_coordinates", "is_round_trip", "risk_warnings"
+    )
+    PREVIEW_DAY_FIELDS = ("day_number", "location", "image_keyword", "daily_driving_time", "daily_budget_per_person")
+    _preview_schema: Optional[dict] = None
+    _preview_validator: Optional[CompiledValidator] = None
+
+    def __init__(self, backend: Optional[Callable[..., Any]] = None, router: Optional[ModelRouter] = None):
+        self.budget_engine = BudgetEngine()
+        # backend(tier, prompt, model_kwargs) -> response; fakes can be injected for tests
+        self.backend = backend or self._gemini_backend
+        self.router = router or get_model_router()
+
+    def _build_schema(self, user_interests: List[str], activity_words: int = 120) -> dict:
+        """V2.0 Schema with morning/afternoon/evening partitioning for stability (built once per word limit)"""
+        schema = AIService._schemas.get(activity_words)
+        if schema is None:
+            schema = AIService._schemas[activity_words] = self._make_schema(activity_words)
+        return schema
+
+    def _build_preview_schema(self) -> dict:
+        """Subset of _build_schema for the preview phase (days reduced to an outline)"""
+        if AIService._preview_schema is None:
+            full = self._build_schema([])
+            properties = {name: full["properties"][name] for name in self.PREVIEW_SECTIONS}
+            day = full["properties"]["days"]["items"]
+            properties["days"] = {
+                "type": "array",
+                "description": "One entry per day: overnight location, driving time and daily spend",
+                "items": {
+                    "type": "object",
+                    "properties": {name: day["properties"][name] for name in self.PREVIEW_DAY_FIELDS},
+                    "required": [name for name in day["required"] if name in self.PREVIEW_DAY_FIELDS]
+                }
+            }
+            AIService._preview_schema = {
+                "type": "object",
+                "properties": properties,
+                "required": [name for name in full["required"] if name in properties]
+            }
+        return AIService._preview_schema
+
+    def _make_schema(self, activity_words: int) -> dict:
         return {
             "type": "object",
             "properties": {
@@ -56,7 +156,7 @@ class AIService:
                                 "properties": {
                                     "start_time": {"type": "string", "description": "24h format e.g. 06:30"},
                                     "duration_minutes": {"type": "integer"},
-                                    "activity": {"type": "string", "description": "What to do (max 120 words)"},
+                                    "activity": {"type": "string", "description": f"What to do (max {activity_words} words)"},
                                     "photo_tip": {"type": "string", "description": "f-stop, ISO, shutter for this light (max 60 chars)"}
                                 },
                                 "required": ["start_time", "duration_minutes", "activity", "photo_tip"]
@@ -66,7 +166,7 @@ class AIService:
                                 "properties": {
                                     "start_time": {"type": "string", "description": "24h format e.g. 13:00"},
                                     "duration_minutes": {"type": "integer"},
-                                    "activity": {"type": "string", "description": "What to do (max 120 words)"},
+                                    "activity": {"type": "string", "description": f"What to do (max {activity_words} words)"},
                                     "logistics": {"type": "string", "description": "Driving, fuel, road conditions (max 80 chars)"}
                                 },
                                 "required": ["start_time", "duration_minutes", "activity", "logistics"]
@@ -76,7 +176,7 @@ class AIService:
                                 "properties": {
                                     "start_time": {"type": "string", "description": "24h format e.g. 18:00"},
                                     "duration_minutes": {"type": "integer"},
-                                    "activity": {"type": "string", "description": "What to do (max 120 words)"},
+                                    "activity": {"type": "string", "description": f"What to do (max {activity_words} words)"},
                                     "dining_tip": {"type": "string", "description": "Restaurant or food recommendation (max 60 chars)"}
                                 },
                                 "required": ["start_time", "duration_minutes", "activity", "dining_tip"]
@@ -159,6 +259,7 @@ class AIService:
                 "markers": {
                     "type": "array",
                     "description": "Key map markers (max 6)",
+                    "maxItems": 6,
                     "items": {
                         "type": "object",
                         "properties": {
@@ -177,6 +278,7 @@ class AIService:
                 "route_coordinates": {
                     "type": "array",
                     "description": "Route polyline (max 12 points). If round trip, last point = first point.",
+                    "maxItems": 12,
                     "items": {
                         "type": "object",
                         "properties": {"lat": {"type": "number"}, "lon": {"type": "number"}},
@@ -184,8 +286,8 @@ class AIService:
                     }
                 },
                 "is_round_trip": {"type": "boolean"},
-                "risk_warnings": {"type": "array", "items": {"type": "string"}, "description": "Max 3 warnings"},
-                "packing_list": {"type": "array", "items": {"type": "string"}, "description": "Max 5 items"}
+                "risk_warnings": {"type": "array", "items": {"type": "string"}, "description": "Max 3 warnings", "maxItems": 3},
+                "packing_list": {"type": "array", "items": {"type": "string"}, "description": "Max 5 items", "maxItems": 5}
             },
             "required": [
                 "trip_summary", "season_info", "vehicle_recommendation", "days",
@@ -194,23 +296,42 @@ class AIService:
             ]
         }
 
-    def _get_model(self, user_interests: List[str]):
-        """Create model with V2.0 schema"""
-        response_schema = self._build_schema(user_interests)
-
-        return genai.GenerativeModel(
-            model_name="gemini-2.5-flash",
+    def _get_model(
+        self,
+        user_interests: List[str],
+        max_output_tokens: int = 8192,
+        activity_words: int = 120,
+        response_schema: Optional[dict] = None,
+        tier: Optional[ModelTier] = None
+    ):
+        """Create model with V2.0 schema (or a given subset) and a per-request output budget"""
+        if response_schema is None:
+            response_schema = self._build_schema(user_interests, activity_words)
+        tier = tier or self.router.tiers[0]
+
+        return get_genai().GenerativeModel(
+            model_name=tier.model_name,
             generation_config={
-                "temperature": 0.7,
+                "temperature": tier.temperature,
                 "top_p": 0.95,
                 "top_k": 40,
-                "max_output_tokens": 8192,
+                "max_output_tokens": max_output_tokens,
                 "response_mime_type": "application/json",
                 "response_schema": response_schema
             },
             system_instruction=self._get_system_prompt()
         )
 
+    def warm(self) -> None:
+        """Pay one-time costs up front: SDK import, schemas, validator, a model object per tier"""
+        for words in (120, 90, 60):
+            self._build_schema([], words)
+        if AIService._validator is None:
+            AIService._validator = CompiledValidator(self._build_schema([]))
+        if settings.GEMINI_API_KEY:
+            for tier in self.router.tiers:
+                self._get_model([], tier=tier)
+
     def _repair_json_string(self, json_str: str) -> str:
         """Advanced JSON repair for AI-generated formatting issues"""
         json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)
@@ -256,39 +377,97 @@ class AIService:
 
         return text
 
-    async def generate_itinerary(self, request: ItineraryRequest) -> Dict[str, Any]:
-        """Generate itinerary using Gemini API with structured JSON output"""
-        prompt = self._build_prompt(request)
+    async def generate_preview(self, request: ItineraryRequest) -> Dict[str, Any]:
+        """
+        Phase one of two-phase generation: summary, route, vehicle, budget and a
+        day outline only (the preview schema), for a fraction of the output tokens
+        """
         user_interests = [str(i) for i in request.interests] if request.interests else []
-        model = self._get_model(user_interests)
+        report("preview_call", days=request.trip_duration)
+        try:
+            response = await self._call_model(
+                self._build_preview_prompt(request),
+                estimate_complexity(1, len(user_interests), request.is_round_trip),
+                user_interests=user_interests,
+                max_output_tokens=settings.PREVIEW_MAX_OUTPUT_TOKENS,
+                response_schema=self._build_preview_schema()
+            )
+            data = self._parse_response(response.text)
+        except Exception as e:
+            print(f"[ERROR] Gemini API (preview): {e}")
+            raise ValueError(f"Failed to generate preview: {e}")
+
+        if AIService._preview_validator is None:
+            AIService._preview_validator = CompiledValidator(self._build_preview_schema())
+        data, violations = AIService._preview_validator.validate(data)
+        if violations:
+            metrics.inc("schema_violations_total", len(violations))
+
+        data["itinerary_daily"] = data.pop("days", [])
+        data["budget"] = self.budget_engine.compute(
+            data["itinerary_daily"], data.pop("budget_table", None), request.number_of_persons
+        )
+        get_route_optimizer().check(data)
+        attach_science_points(data)
+        return data
+
+    def _build_preview_prompt(self, request: ItineraryRequest) -> str:
+        """Trip details plus the preview-only instructions (no per-block detail)"""
+        # Keep TRIP DETAILS; the first line carries the full itinerary's size budget
+        details = self._build_prompt(request).split("REQUIREMENTS:")[0].split("\n", 1)[1]
+        return "Generate a road trip PREVIEW (not the full itinerary)." + details + f"""PREVIEW ONLY - full daily detail is generated separately:
+- days: one entry per day ({request.trip_duration} entries) with day_number, overnight location,
+  image_keyword, daily_driving_time and daily_budget_per_person. NO morning/afternoon/evening.
+- budget_table for {getattr(request, 'number_of_persons', 2)} persons; buffer_fund = subtotal * 0.1
+- vehicle_recommendation, markers (max 6, lat/lon), route_coordinates (max 12 points)
+{"- ROUND TRIP: last route coordinate MUST equal the first." if request.is_round_trip else ""}
+
+Generate the preview JSON:"""
+
+    async def generate_itinerary(self, request: ItineraryRequest, preview: Optional[dict] = None) -> Dict[str, Any]:
+        """
+        Generate itinerary using Gemini API with structured JSON output
+        preview: phase-one result to stay consistent with (same route, stops and budget)
+        """
+        prompt = self._build_prompt(request, route=(preview or {}).get("route_coordinates"))
+        if preview is not None:
+            prompt += (
+                "\n\nThe traveller has already seen this PREVIEW. Keep its route, overnight locations "
+                "per day, vehicle advice and budget; add the full daily detail:\n"
+                + compact_summary(preview, settings.REFINE_SUMMARY_MAX_CHARS)
+            )
+            skeleton = get_route_optimizer().skeleton(preview, request.trip_duration)
+            if skeleton:
+                prompt += f"\n\n{skeleton}\nVisit the markers in this order and place overnights to match the legs."
+
+        user_interests = [str(i) for i in request.interests] if request.interests else []
+        shape = (request.trip_duration, len(user_interests), request.is_round_trip)
+        complexity = estimate_complexity(*shape, request.include_offroad)
 
         try:
-            response = await asyncio.to_thread(model.generate_content, prompt)
+            report("model_call", days=request.trip_duration)
+            response = await self._call_model(
+                prompt,
+                complexity,
+                user_interests=user_interests,
+                max_output_tokens=token_budget.max_output_tokens(*shape),
+                activity_words=token_budget.activity_word_limit(request.trip_duration)
+            )
             response_text = response.text
+            self._record_tokens(shape, response)
 
             print(f"\n{'='*60}")
             print(f"[GEMINI V2.0] Response length: {len(response_text)} chars")
             print(f"[GEMINI V2.0] First 500 chars: {response_text[:500]}")
             print(f"{'='*60}\n")
 
-            cleaned = self._defensive_json_cleanup(response_text)
-
-            try:
-                data = json.loads(cleaned)
-            except json.JSONDecodeError as e:
-                print(f"[JSON ERROR] Initial parse failed at pos {e.pos}: {e.msg}")
-                repaired = self._repair_json_string(cleaned)
-                try:
-                    data = json.loads(repaired)
-                    print("[JSON REPAIR] Success after repair")
-                except json.JSONDecodeError as e2:
-                    start = repaired.find('{')
-                    end = repaired.rfind('}') + 1
-                    if start >= 0 and end > start:
-                        data = json.loads(repaired[start:end])
-                        print("[JSON REPAIR] Success via boundary extraction")
-                    else:
-                        raise ValueError(f"All JSON repair failed: {e2}")
+            if self._is_truncated(response) or not response_text.rstrip().rstrip('`').rstrip().endswith('}'):
+                report("continuation")
+                data = await self._complete_truncated(request, response_text, user_interests)
+            else:
+                data = self._parse_response(response_text)
+            report("validating")
+            data = self._validate(data)
 
             # Ensure interest_highlights is never empty (prevents 400 schema errors)
             if not data.get("interest_highlights"):
@@ -301,46 +480,24 @@ class AIService:
             if "days" in data:
                 data["itinerary_daily"] = data.pop("days")
 
+            # Local repairs before rendering: fix day schedules, then flag a backtracking stop order
+            get_schedule_checker().check(data, request.start_date)
+            get_route_optimizer().check(data)
+
             # Generate markdown from daily data (V2.0 morning/afternoon/evening format)
             if "itinerary_daily" in data:
-                md_parts = []
-                for day in data["itinerary_daily"]:
-                    n = day.get("day_number", 1)
-                    loc = day.get("location", "")
-                    morning = day.get("morning", {})
-                    afternoon = day.get("afternoon", {})
-                    evening = day.get("evening", {})
-                    driving = day.get("daily_driving_time", "")
-                    budget = day.get("daily_budget_per_person", 0)
-
-                    md_parts.append(
-                        f"## Day {n}: {loc}\n\n"
-                        f"**Morning ({morning.get('start_time', '07:00')})**: {morning.get('activity', '')}\n"
-                        f"*Photo Tip: {morning.get('photo_tip', '')}*\n\n"
-                        f"**Afternoon ({afternoon.get('start_time', '13:00')})**: {afternoon.get('activity', '')}\n"
-                        f"*Logistics: {afternoon.get('logistics', '')}*\n\n"
-                        f"**Evening ({evening.get('start_time', '18:00')})**: {evening.get('activity', '')}\n"
-                        f"*Dining: {evening.get('dining_tip', '')}*\n\n"
-                        f"**Driving**: {driving} | **Budget/person**: ${budget:.0f}\n\n"
-                    )
-                data["itinerary_markdown"] = "\n".join(md_parts)
-
-            # Map budget_table -> budget with 10% buffer enforcement
+                data["itinerary_markdown"] = self.render_markdown(data["itinerary_daily"])
+
+            # Map budget_table -> budget, recomputed locally (10% buffer included)
             if "budget_table" in data:
-                data["budget"] = data.pop("budget_table")
-                budget = data["budget"]
-                expected = round(budget.get("subtotal", 0) * 0.1, 2)
-                actual = budget.get("buffer_fund", 0)
-                if abs(expected - actual) > 0.01:
-                    budget["buffer_fund"] = expected
-                    budget["total"] = budget["subtotal"] + expected
-
-            # Extract science points from markers
-            if "markers" in data:
-                data["science_points"] = [
-                    m for m in data["markers"]
-                    if m.get("type") in ["scenic_spot", "viewpoint"]
-                ]
+                data["budget"] = self.budget_engine.compute(
+                    data.get("itinerary_daily"),
+                    data.pop("budget_table"),
+                    request.number_of_persons
+                )
+
+            # Science points: knowledge-base landmarks near the route, then scenic markers
+            attach_science_points(data)
 
             return data
 
@@ -348,38 +505,232 @@ class AIService:
             print(f"[ERROR] Gemini API: {e}")
             raise ValueError(f"Failed to generate itinerary: {e}")
 
-    async def refine_itinerary(self, current_itinerary: dict, refinement_request: str) -> Dict[str, Any]:
-        """Refine an existing itinerary based on user feedback"""
+    def _validate(self, data: Any) -> Dict[str, Any]:
+        """Single-pass schema validation: coerce types, fill defaults, clamp counts"""
+        if AIService._validator is None:
+            AIService._validator = CompiledValidator(self._build_schema([]))
+        data, violations = AIService._validator.validate(data)
+        if violations:
+            metrics.inc("schema_violations_total", len(violations))
+            print(f"[SCHEMA] {len(violations)} fixes applied, e.g. {violations[:3]}")
+        return data
+
+    def _parse_response(self, response_text: str) -> Dict[str, Any]:
+        """Parse a complete response, with progressive repair fallbacks"""
+        cleaned = self._defensive_json_cleanup(response_text)
+
+        try:
+            data = json.loads(cleaned)
+        except json.JSONDecodeError as e:
+            print(f"[JSON ERROR] Initial parse failed at pos {e.pos}: {e.msg}")
+            repaired = self._repair_json_string(cleaned)
+            try:
+                data = json.loads(repaired)
+                print("[JSON REPAIR] Success after repair")
+            except json.JSONDecodeError as e2:
+                start = repaired.find('{')
+                end = repaired.rfind('}') + 1
+                if start >= 0 and end > start:
+                    data = json.loads(repaired[start:end])
+                    print("[JSON REPAIR] Success via boundary extraction")
+                else:
+                    raise ValueError(f"All JSON repair failed: {e2}")
+        return data
+
+    async def _complete_truncated(
+        self,
+        request: ItineraryRequest,
+        response_text: str,
+        user_interests: List[str]
+    ) -> Dict[str, Any]:
+        """
+        Keep every complete section of a truncated response and generate only
+        what is missing (remaining days and/or sections), merging the results
+        """
+        schema = self._build_schema(user_interests, token_budget.activity_word_limit(request.trip_duration))
+        try:
+            data = parse_partial_json(response_text)
+        except ValueError:
+            print("[TRUNCATION] Nothing salvageable - falling back to force-completion")
+            return self._parse_response(response_text)
+
+        for attempt in range(1, settings.MAX_CONTINUATIONS + 1):
+            sections, missing_days = find_missing(data, schema, request.trip_duration)
+            if not sections:
+                break
+            print(f"[TRUNCATION] Continuation {attempt}: sections={sections} days={missing_days}")
+            metrics.inc("continuation_requests_total")
+
+            remaining_days = len(missing_days) if "days" in sections else 0
+            prompt = self._build_continuation_prompt(request, data, sections, missing_days)
+            try:
+                response = await self._call_model(
+                    prompt,
+                    estimate_complexity(max(remaining_days, 1), len(user_interests), request.is_round_trip),
+                    user_interests=user_interests,
+                    max_output_tokens=token_budget.max_output_tokens(max(remaining_days, 1), len(user_interests), request.is_round_trip),
+                    activity_words=token_budget.activity_word_limit(request.trip_duration),
+                    response_schema=continuation_schema(schema, sections, missing_days)
+                )
+                extra = parse_partial_json(response.text)
+            except Exception as e:
+                # The partial itinerary is still usable - keep it rather than fail the generation
+                print(f"[TRUNCATION] Continuation {attempt} failed ({type(e).__name__}: {e}) - keeping partial result")
+                break
+            prune_incomplete(extra, schema)
+            data = merge_continuation(data, extra, missing_days)
+
+        sections, missing_days = find_missing(data, schema, request.trip_duration)
+        if sections:
+            print(f"[TRUNCATION] Still missing after continuations: {sections} days={missing_days}")
+            metrics.inc("continuation_incomplete_total")
+
+        return data
+
+    def _build_continuation_prompt(
+        self,
+        request: ItineraryRequest,
+        partial: dict,
+        sections: List[str],
+        missing_days: List[int]
+    ) -> str:
+        """Prompt for only the missing parts of a truncated itinerary"""
+        parts = [self._build_prompt(request), "", "CONTINUATION - the itinerary above was cut off."]
+        if partial.get("days"):
+            parts.append("Days already generated (do NOT repeat them):")
+            parts.append(summarize_days(partial["days"]))
+        if "days" in sections and missing_days:
+            parts.append(f"Generate ONLY days {', '.join(map(str, missing_days))} (use these exact day_number values), continuing the route from the last generated day.")
+        other = [s for s in sections if s != "days"]
+        if other:
+            parts.append(f"Also generate these sections for the WHOLE trip: {', '.join(other)}.")
+        parts.append("Return ONLY the requested fields as JSON:")
+        return "\n".join(parts)
+
+    async def _call_model(self, prompt: str, complexity: float, **model_kwargs: Any):
+        """Route one generation through the tier ladder (fallback on slow/erroring tiers)"""
+        async def call(tier: ModelTier):
+            return await asyncio.to_thread(self.backend, tier, prompt, model_kwargs)
+
+        # Waits for a slot at the caller's priority (paid / interactive / batch / warming)
+        async with get_scheduler().slot():
+            return await self.router.run(complexity, call)
+
+    def _gemini_backend(self, tier: ModelTier, prompt: str, model_kwargs: Dict[str, Any]):
+        """Default backend: Gemini via google-generativeai"""
+        model = self._get_model(tier=tier, **model_kwargs)
+        # The SDK enforces the timeout, so a call the router gave up on does not keep running
+        response = model.generate_content(prompt, request_options={"timeout": tier.timeout_seconds})
+        response.text  # raises for blocked/empty candidates, so the router falls back
+        return response
+
+    def _output_tokens(self, response) -> int:
+        """Visible output tokens reported by the API (0 if unavailable)"""
+        usage = getattr(response, "usage_metadata", None)
+        return int(getattr(usage, "candidates_token_count", 0) or 0)
+
+    def _thinking_tokens(self, response) -> int:
+        """Thinking tokens spent (reported, or total minus prompt and visible output)"""
+        usage = getattr(response, "usage_metadata", None)
+        reported = int(getattr(usage, "thoughts_token_count", 0) or 0)
+        if reported or usage is None:
+            return reported
+        total = int(getattr(usage, "total_token_count", 0) or 0)
+        return max(0, total - int(getattr(usage, "prompt_token_count", 0) or 0) - self._output_tokens(response))
+
+    def _record_tokens(self, shape: tuple, response) -> None:
+        token_budget.record(
+            *shape, self._output_tokens(response),
+            truncated=self._is_truncated(response), thinking_tokens=self._thinking_tokens(response)
+        )
+
+    def _is_truncated(self, response) -> bool:
+        """Whether generation stopped on max_output_tokens"""
+        try:
+            reason = response.candidates[0].finish_reason
+        except (AttributeError, IndexError):
+            return False
+        return getattr(reason, "name", str(reason)) == "MAX_TOKENS"
+
+    def render_markdown(self, days: List[dict]) -> str:
+        """Render itinerary_daily (morning/afternoon/evening format) as Markdown"""
+        md_parts = []
+        for day in days:
+            n = day.get("day_number", 1)
+            loc = day.get("location", "")
+            morning = day.get("morning", {})
+            afternoon = day.get("afternoon", {})
+            evening = day.get("evening", {})
+            driving = day.get("daily_driving_time", "")
+            budget = day.get("daily_budget_per_person", 0)
+
+            md_parts.append(
+                f"## Day {n}: {loc}\n\n"
+                f"**Morning ({morning.get('start_time', '07:00')})**: {morning.get('activity', '')}\n"
+                f"*Photo Tip: {morning.get('photo_tip', '')}*\n\n"
+                f"**Afternoon ({afternoon.get('start_time', '13:00')})**: {afternoon.get('activity', '')}\n"
+                f"*Logistics: {afternoon.get('logistics', '')}*\n\n"
+                f"**Evening ({evening.get('start_time', '18:00')})**: {evening.get('activity', '')}\n"
+                f"*Dining: {evening.get('dining_tip', '')}*\n\n"
+                f"**Driving**: {driving} | **Budget/person**: ${budget:.0f}\n\n"
+            )
+        return "\n".join(md_parts)
+
+    async def refine_itinerary(
+        self, current_itinerary: dict, refinement_request: str, summary: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Refine an existing itinerary based on user feedback (summary: cached compact_summary)"""
+        user_interests = [h.get("category", "general") for h in (current_itinerary.get("interest_highlights") or [])]
+        shape = (
+            max(len(current_itinerary.get("itinerary_daily") or []), 1),
+            len(user_interests),
+            bool(current_itinerary.get("is_round_trip"))
+        )
+        activity_words = token_budget.activity_word_limit(shape[0])
+        extra_rules = self._landmark_note(get_landmark_kb().along_route(
+            current_itinerary.get("route_coordinates") or [], settings.LANDMARK_RADIUS_KM, settings.LANDMARK_PROMPT_LIMIT
+        ), 7)
+        skeleton = get_route_optimizer().skeleton(current_itinerary, shape[0])
+        if skeleton:
+            extra_rules += (
+                f"{8 if extra_rules else 7}. Keep existing stops in the ROUTE SKELETON order below unless "
+                f"the request changes them.\n\n{skeleton}\n"
+            )
         prompt = f"""You are an expert road trip planner. The user wants to modify their itinerary.
 
 **User's Request**: {refinement_request}
 
 **Current Itinerary (JSON)**:
 ```json
-{json.dumps(current_itinerary, ensure_ascii=False, indent=2)[:3000]}
+{summary or compact_summary(current_itinerary, settings.REFINE_SUMMARY_MAX_CHARS)}
 ```
 
 **Rules**:
 1. Keep 10% buffer_fund = subtotal * 0.1
 2. Keep interest_highlights as non-empty array
-3. Each field max 120 words
-4. Total JSON under 8000 chars
+3. Each activity max {activity_words} words
+4. Total JSON under {token_budget.char_budget(*shape)} chars
 5. Photography tips: use universal params (f-stop, ISO, shutter) - NO camera brands
 6. Maintain morning/afternoon/evening structure
-
+{extra_rules}
 Generate the modified complete itinerary JSON:"""
 
         try:
-            user_interests = [h.get("category", "general") for h in (current_itinerary.get("interest_highlights") or [])]
-            model = self._get_model(user_interests)
-
-            response = await asyncio.to_thread(model.generate_content, prompt)
+            response = await self._call_model(
+                prompt,
+                estimate_complexity(*shape),
+                user_interests=user_interests,
+                max_output_tokens=token_budget.max_output_tokens(*shape),
+                activity_words=activity_words
+            )
+            self._record_tokens(shape, response)
             cleaned = self._defensive_json_cleanup(response.text)
 
             try:
                 data = json.loads(cleaned)
             except json.JSONDecodeError:
                 data = json.loads(self._repair_json_string(cleaned))
+            data = self._validate(data)
 
             # Ensure interest_highlights is never empty
             if not data.get("interest_highlights"):
@@ -392,13 +743,10 @@ Generate the modified complete itinerary JSON:"""
                 data["itinerary_daily"] = data.pop("days")
 
             if "budget_table" in data:
-                data["budget"] = data.pop("budget_table")
-                budget = data["budget"]
-                budget["buffer_fund"] = round(budget.get("subtotal", 0) * 0.1, 2)
-                budget["total"] = budget["subtotal"] + budget["buffer_fund"]
+                data["budget"] = self.budget_engine.compute(data.get("itinerary_daily"), data.pop("budget_table"))
 
-            if "markers" in data:
-                data["science_points"] = [m for m in data["markers"] if m.get("type") in ["scenic_spot", "viewpoint"]]
+            # Schedule and route checks run in ItineraryService.refine, on the merged itinerary
+            attach_science_points(data)
 
             return data
         except Exception as e:
@@ -410,8 +758,8 @@ Generate the modified complete itinerary JSON:"""
 
 CRITICAL RULES:
 1. ALL output in English
-2. Each text field MAX 120 words to prevent JSON truncation
-3. Total JSON MUST NOT exceed 8000 characters
+2. Each text field MUST respect the word limit given in the request to prevent JSON truncation
+3. Total JSON MUST NOT exceed the character budget given in the request
 4. budget_table.buffer_fund = subtotal * 0.1 (MANDATORY 10% risk reserve)
 5. If round trip, route_coordinates MUST loop back to start (last point = first point)
 6. Photography: use UNIVERSAL parameters (f/X, 1/Xs shutter, ISO XXX, focal length mm). NEVER mention camera brands (Sony, Fuji, Canon, Nikon)
@@ -446,15 +794,38 @@ OUTPUT STRUCTURE:
 - risk_warnings: Max 3
 - packing_list: Max 5 items"""
 
-    def _build_prompt(self, request: ItineraryRequest) -> str:
-        """Build V2.0 user prompt with scaled budgeting"""
+    def _landmark_note(self, landmarks: List[dict], number: int) -> str:
+        """Prompt rule naming landmarks whose science notes come from the knowledge base"""
+        if not landmarks:
+            return ""
+        names = "; ".join(entry["name"] for entry in landmarks)
+        return (
+            f"{number}. KNOWN LANDMARKS: {names}. Their science notes are attached from a reference library - "
+            "if the route visits them, refer to them by name only; do NOT explain their geology, astronomy "
+            "or ecology in activities or interest_highlights.\n"
+        )
+
+    def _prompt_landmarks(self, request: ItineraryRequest, route: Optional[List[dict]] = None) -> List[dict]:
+        """Landmarks named in the start/end locations, then those along a known route"""
+        kb, limit = get_landmark_kb(), settings.LANDMARK_PROMPT_LIMIT
+        found = {e["id"]: e for e in kb.matching(f"{request.start_location} / {request.end_location}", limit)}
+        if route and len(found) < limit:
+            for entry in kb.along_route(route, settings.LANDMARK_RADIUS_KM, limit):
+                found.setdefault(entry["id"], entry)
+        return list(found.values())[:limit]
+
+    def _build_prompt(self, request: ItineraryRequest, route: Optional[List[dict]] = None) -> str:
+        """Build V2.0 user prompt with scaled budgeting (route: a known polyline, e.g. the preview's)"""
         interests = ", ".join(request.interests) if request.interests else "general sightseeing"
         level_map = {"easy": "Easy", "moderate": "Moderate", "challenging": "Challenging", "expert": "Expert"}
         level = level_map.get(request.activity_level, "Moderate")
         round_trip = "Yes (loop route back to start, include return fuel/tolls)" if request.is_round_trip else "No (one-way)"
         persons = getattr(request, 'number_of_persons', 2)
+        interest_count = len(request.interests) if request.interests else 0
+        char_budget = token_budget.char_budget(request.trip_duration, interest_count, request.is_round_trip)
+        words = token_budget.activity_word_limit(request.trip_duration)
 
-        return f"""Generate a professional road trip itinerary. Total JSON under 8000 chars.
+        return f"""Generate a professional road trip itinerary. Total JSON under {char_budget} chars.
 
 TRIP DETAILS:
 - From: {request.start_location}
@@ -470,9 +841,9 @@ TRIP DETAILS:
 REQUIREMENTS:
 
 1. DAILY STRUCTURE (each day):
-   - morning: {{start_time, duration_minutes, activity (max 120 words), photo_tip (f-stop/ISO/shutter for morning light)}}
-   - afternoon: {{start_time, duration_minutes, activity (max 120 words), logistics (driving/fuel info)}}
-   - evening: {{start_time, duration_minutes, activity (max 120 words), dining_tip (restaurant recommendation)}}
+   - morning: {{start_time, duration_minutes, activity (max {words} words), photo_tip (f-stop/ISO/shutter for morning light)}}
+   - afternoon: {{start_time, duration_minutes, activity (max {words} words), logistics (driving/fuel info)}}
+   - evening: {{start_time, duration_minutes, activity (max {words} words), dining_tip (restaurant recommendation)}}
    - daily_driving_time, vehicle_safety, daily_budget_per_person
    - accommodation_search_query, viator_activity_query
    - image_keyword: single keyword for Unsplash (e.g. "yosemite", "yellowstone", "grand canyon")
@@ -496,5 +867,5 @@ REQUIREMENTS:
 {"7. ROUND TRIP: Last coordinate MUST equal first coordinate. Budget includes return fuel/tolls." if request.is_round_trip else ""}
 
 8. ALL fields must be non-empty to avoid schema errors.
-
+{self._landmark_note(self._prompt_landmarks(request, route), 9)}
 Generate the complete JSON itinerary:"""
@@ -0,0 +1,119 @@
+"""
+Bulk itinerary generation
+Consumes a JSONL stream of ItineraryRequest objects and yields JSONL-ready
+result records in order of completion:
+- Bounded concurrency across distinct requests
+- Identical request keys are generated once and shared
+- Per-item errors are reported as records, never fail the batch
+Each input line is either a bare ItineraryRequest or {"id": ..., "request": {...}};
+the optional id is echoed back so clients can match and resume.
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Set, Union
+
+from app.core.config import settings
+from app.models.itinerary import ItineraryRequest
+from app.services.itinerary_store import request_key
+from app.services.scheduler import priority
+
+
+async def _aiter_lines(lines: Union[Iterable[str], AsyncIterator[str]]) -> AsyncIterator[str]:
+    if hasattr(lines, "__aiter__"):
+        async for line in lines:
+            yield line
+    else:
+        for line in lines:
+            yield line
+
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream (e.g. Request.stream()) into text lines"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            yield line.decode("utf-8")
+    if buffer.strip():
+        yield buffer.decode("utf-8")
+
+
+class BatchRunner:
+    """Runs many generation requests through ItineraryService"""
+
+    def __init__(self, service, concurrency: Optional[int] = None, max_items: Optional[int] = None):
+        self.service = service
+        self.concurrency = concurrency or settings.BATCH_CONCURRENCY
+        self.max_items = max_items or settings.BATCH_MAX_ITEMS
+
+    async def run(
+        self,
+        lines: Union[Iterable[str], AsyncIterator[str]],
+        skip_indexes: Optional[Set[int]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield one result record per non-empty input line, as each completes"""
+        skip_indexes = skip_indexes or set()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        generations: Dict[str, asyncio.Task] = {}
+        results: asyncio.Queue = asyncio.Queue()
+        handlers: Set[asyncio.Task] = set()
+        outstanding = 0
+
+        async def generate(request: ItineraryRequest) -> dict:
+            async with semaphore:
+                # Partner batches should not skew the demand ranking used for warming
+                with priority("batch"):
+                    response = await self.service.generate(request, track_demand=False)
+                return response.model_dump(mode="json")
+
+        async def handle(index: int, item_id: Any, key: str) -> None:
+            try:
+                itinerary = await asyncio.shield(generations[key])
+                record = {"index": index, "id": item_id, "status": "ok", "request_key": key, "itinerary": itinerary}
+            except Exception as e:
+                record = {"index": index, "id": item_id, "status": "error", "request_key": key, "error": str(e)}
+            await results.put(record)
+
+        index = -1
+        async for raw in _aiter_lines(lines):
+            if not raw.strip():
+                continue
+            index += 1
+            if index in skip_indexes:
+                continue
+            if index >= self.max_items:
+                await results.put({"index": index, "id": None, "status": "error", "error": f"Batch limit of {self.max_items} items exceeded"})
+                outstanding += 1
+                break
+
+            item_id = None
+            try:
+                payload = json.loads(raw)
+                if isinstance(payload, dict) and "request" in payload:
+                    item_id = payload.get("id")
+                    payload = payload["request"]
+                request = ItineraryRequest(**payload)
+            except (ValueError, TypeError) as e:
+                await results.put({"index": index, "id": item_id, "status": "error", "error": f"Invalid request: {e}"})
+                outstanding += 1
+                continue
+
+            key = request_key(request)
+            if key not in generations:
+                generations[key] = asyncio.create_task(generate(request))
+            task = asyncio.create_task(handle(index, item_id, key))
+            handlers.add(task)
+            task.add_done_callback(handlers.discard)
+            outstanding += 1
+
+            # Drain finished records while the input is still streaming in
+            while not results.empty():
+                outstanding -= 1
+                yield results.get_nowait()
+
+        while outstanding > 0:
+            outstanding -= 1
+            yield await results.get()
+
+        print(f"[BATCH] Completed {index + 1} items ({len(generations)} distinct requests)")
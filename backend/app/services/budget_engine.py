@@ -0,0 +1,116 @@
+"""
+Budget engine - deterministic BudgetBreakdown computation
+Recomputes every budget line from per-day and fixed-cost inputs so the
+model's arithmetic is never trusted as-is:
+- Fixed costs (fuel_cost, toll_fees) do not scale with persons
+- Variable costs (accommodation, meals, activities) = sum(daily_budget_per_person) * persons
+- subtotal / buffer_fund / total derived from the components
+"""
+from typing import Dict, Any, List, Optional
+
+from app.core.config import settings
+
+
+FIXED_FIELDS = ("fuel_cost", "toll_fees")
+VARIABLE_FIELDS = ("accommodation", "meals", "activities")
+
+# Split used when the model gave daily budgets but no usable component split
+DEFAULT_VARIABLE_SPLIT = {"accommodation": 0.5, "meals": 0.3, "activities": 0.2}
+
+
+def _as_float(value: Any) -> float:
+    """Coerce model-supplied numbers (possibly strings like '$120') to float"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        cleaned = value.replace("$", "").replace(",", "").strip()
+        try:
+            return float(cleaned)
+        except ValueError:
+            return 0.0
+    return 0.0
+
+
+class BudgetEngine:
+    """Pure, side-effect free budget calculator shared by generate/refine/what-if paths"""
+
+    def __init__(self, buffer_percentage: Optional[float] = None):
+        pct = settings.BUFFER_FUND_PERCENTAGE if buffer_percentage is None else buffer_percentage
+        self.buffer_rate = pct / 100.0
+
+    def compute(
+        self,
+        days: Optional[List[dict]],
+        budget: Optional[dict],
+        number_of_persons: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Recompute the full BudgetBreakdown
+        - days: itinerary_daily entries (daily_budget_per_person is read)
+        - budget: model budget_table, used for fixed costs and the variable split
+        - number_of_persons: overrides budget['number_of_persons'] when given
+        """
+        budget = budget or {}
+        persons = number_of_persons or int(_as_float(budget.get("number_of_persons"))) or 2
+
+        fixed = {field: max(_as_float(budget.get(field)), 0.0) for field in FIXED_FIELDS}
+        variable = self._variable_costs(days or [], budget, persons)
+
+        subtotal = round(sum(fixed.values()) + sum(variable.values()), 2)
+        buffer_fund = round(subtotal * self.buffer_rate, 2)
+
+        result = {"number_of_persons": persons}
+        result.update({k: round(v, 2) for k, v in fixed.items()})
+        result.update(variable)
+        result["subtotal"] = subtotal
+        result["buffer_fund"] = buffer_fund
+        result["total"] = round(subtotal + buffer_fund, 2)
+        return result
+
+    def rescale(
+        self,
+        days: Optional[List[dict]],
+        budget: Optional[dict],
+        to_persons: int
+    ) -> Dict[str, Any]:
+        """What-if: same trip for a different party size (per-person daily budgets unchanged)"""
+        budget = dict(budget or {})
+        from_persons = int(_as_float(budget.get("number_of_persons"))) or 2
+
+        # Without daily budgets the variable lines are the only per-person signal
+        if not self._daily_total(days or []) and from_persons != to_persons:
+            factor = to_persons / from_persons
+            for field in VARIABLE_FIELDS:
+                budget[field] = _as_float(budget.get(field)) * factor
+
+        budget["number_of_persons"] = to_persons
+        return self.compute(days, budget, to_persons)
+
+    def _daily_total(self, days: List[dict]) -> float:
+        """Sum of daily_budget_per_person across all days"""
+        return sum(max(_as_float(day.get("daily_budget_per_person")), 0.0) for day in days)
+
+    def _variable_costs(self, days: List[dict], budget: dict, persons: int) -> Dict[str, float]:
+        """Variable lines reconciled against daily_budget_per_person x persons"""
+        components = {field: max(_as_float(budget.get(field)), 0.0) for field in VARIABLE_FIELDS}
+        component_sum = sum(components.values())
+
+        daily_total = self._daily_total(days)
+        if not daily_total:
+            # Nothing to reconcile against - trust the components
+            return {k: round(v, 2) for k, v in components.items()}
+
+        target = daily_total * persons
+        if component_sum > 0:
+            split = {k: v / component_sum for k, v in components.items()}
+        else:
+            split = DEFAULT_VARIABLE_SPLIT
+
+        scaled = {k: round(target * split[k], 2) for k in VARIABLE_FIELDS}
+
+        # Push rounding drift into the largest line so the parts sum exactly
+        drift = round(target - sum(scaled.values()), 2)
+        if drift:
+            largest = max(scaled, key=scaled.get)
+            scaled[largest] = round(scaled[largest] + drift, 2)
+        return scaled
@@ -0,0 +1,152 @@
+"""
+Cache warming - off-peak generation of the most requested routes
+Runs top-N request keys through the normal ItineraryService path with bounded
+concurrency and a rate budget, so peak-hour users hit a warm store.
+- Idempotent: keys already in the store are skipped
+- Resumable: completed keys are checkpointed to a small JSON state file; the
+  store stays the authority, so a checkpointed key that is no longer stored
+  (evicted, or another store path) is warmed again
+"""
+import asyncio
+import json
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.models.itinerary import ItineraryRequest
+from app.services.itinerary_store import request_key
+from app.services.scheduler import priority
+
+
+def load_top_requests_from_log(path: str, n: int) -> List[ItineraryRequest]:
+    """Top-N distinct requests from a JSONL request log (see REQUEST_LOG_PATH)"""
+    counts: Counter = Counter()
+    latest: Dict[str, ItineraryRequest] = {}
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = ItineraryRequest(**json.loads(line))
+            except ValueError as e:
+                print(f"[WARM] Skipping invalid log line: {e}")
+                continue
+            key = request_key(request)
+            counts[key] += 1
+            latest[key] = request
+    return [latest[key] for key, _ in counts.most_common(n)]
+
+
+class RateLimiter:
+    """Spaces call starts evenly to stay within a per-minute budget"""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_start = max(now, self._next_start) + self.interval
+
+
+class CacheWarmer:
+    """Generates missing itineraries for popular requests"""
+
+    def __init__(
+        self,
+        service,
+        concurrency: Optional[int] = None,
+        rate_per_minute: Optional[int] = None,
+        state_path: Optional[str] = None
+    ):
+        self.service = service
+        self.concurrency = concurrency or settings.CACHE_WARMING_CONCURRENCY
+        self.rate_per_minute = rate_per_minute or settings.CACHE_WARMING_RATE_PER_MINUTE
+        self.state_path = Path(state_path or settings.CACHE_WARMING_STATE_PATH)
+
+    async def warm(self, requests: List[ItineraryRequest], resume: bool = False) -> Dict[str, object]:
+        """Warm the given requests; returns a coverage report"""
+        store = self.service.store
+        store.load_journal()
+        done = self._load_state() if resume else set()
+
+        unique: Dict[str, ItineraryRequest] = {}
+        for request in requests:
+            unique.setdefault(request_key(request), request)
+
+        report = {"requested": len(unique), "already_cached": 0, "resumed": 0, "warmed": 0, "failed": 0, "errors": []}
+        pending = []
+        for key, request in unique.items():
+            if not store.has_key(key):
+                done.discard(key)
+                pending.append((key, request))
+            elif key in done:
+                report["resumed"] += 1  # warmed by an earlier, interrupted run
+            else:
+                report["already_cached"] += 1
+                done.add(key)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        limiter = RateLimiter(self.rate_per_minute)
+
+        async def warm_one(key: str, request: ItineraryRequest) -> None:
+            async with semaphore:
+                await limiter.wait()
+                try:
+                    with priority("warming"):
+                        await self.service.generate(request, track_demand=False)
+                    report["warmed"] += 1
+                    done.add(key)
+                    self._save_state(done)
+                    print(f"[WARM] {request.start_location} -> {request.end_location} ({request.trip_duration}d) warmed")
+                except Exception as e:
+                    report["failed"] += 1
+                    report["errors"].append({"key": key, "error": str(e)})
+                    print(f"[WARM] Failed {key[:10]}: {e}")
+
+        await asyncio.gather(*(warm_one(key, request) for key, request in pending))
+        self._save_state(done)
+
+        covered = report["already_cached"] + report["resumed"] + report["warmed"]
+        report["coverage"] = round(covered / report["requested"], 3) if report["requested"] else 1.0
+        print(f"[WARM] Coverage {covered}/{report['requested']} ({report['coverage']:.0%}), {report['failed']} failed")
+        return report
+
+    async def run_schedule(self) -> None:
+        """Background loop: warm the store's top requests once a day at the quiet hour"""
+        while True:
+            await asyncio.sleep(self._seconds_until_quiet_hour())
+            try:
+                await self.warm(self.service.store.top_requests(settings.CACHE_WARMING_TOP_N))
+            except Exception as e:
+                print(f"[WARM] Scheduled run failed: {e}")
+
+    def _seconds_until_quiet_hour(self) -> float:
+        now = datetime.utcnow()
+        target = now.replace(hour=settings.CACHE_WARMING_HOUR_UTC, minute=0, second=0, microsecond=0)
+        if target <= now:
+            target += timedelta(days=1)
+        return (target - now).total_seconds()
+
+    def _load_state(self) -> set:
+        if not self.state_path.exists():
+            return set()
+        try:
+            return set(json.loads(self.state_path.read_text(encoding="utf-8")).get("completed", []))
+        except ValueError:
+            return set()
+
+    def _save_state(self, done: set) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"completed": sorted(done)}), encoding="utf-8")
+        tmp.replace(self.state_path)
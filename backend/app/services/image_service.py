@@ -0,0 +1,333 @@
+"""
+Day image resolution with a size-bounded disk cache
+Resolves each day's image_keyword once on the backend and serves stable URLs
+(/api/images/{slug}/{variant}.webp) instead of every page view hitting the
+image host again:
+- Pluggable providers (LoremFlickr, Unsplash, a local directory for tests/offline)
+- One pooled httpx.AsyncClient; concurrent fetches, deduplicated per keyword
+- Pillow converts the original into resized WebP variants
+- Disk cache with LRU eviction by total bytes (file mtime is the recency stamp,
+  so the order survives restarts and is shared by workers)
+"""
+import abc
+import asyncio
+import hashlib
+import io
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+# variant -> target width in px (height follows the aspect ratio)
+VARIANTS = {"thumb": 400, "card": 800, "hero": 1200}
+DEFAULT_VARIANT = "hero"
+WEBP_QUALITY = 80
+
+
+# Latin letters NFKD does not split into base letter + accent
+_NO_DECOMPOSITION = str.maketrans({"æ": "ae", "ø": "o", "œ": "oe", "ß": "ss", "đ": "d", "ł": "l", "þ": "th"})
+
+
+def keyword_slug(keyword: str) -> str:
+    """
+    'Grand Canyon, AZ' -> 'grand-canyon-az' (stable URL component)
+    ASCII only, so it always matches the image route: 'Café Río' -> 'cafe-rio'
+    """
+    text = (keyword or "").lower().translate(_NO_DECOMPOSITION)
+    ascii_text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    slug = "-".join(re.sub(r"[^a-z0-9_\s-]", " ", ascii_text).split()).strip("-")
+    return slug[:80] or "landscape"
+
+
+def image_url(keyword: str, variant: str = DEFAULT_VARIANT) -> str:
+    return f"/api/images/{keyword_slug(keyword)}/{variant}.webp"
+
+
+def attach_image_urls(days: Optional[List[dict]]) -> List[str]:
+    """Set image_url on each day; returns the distinct slugs referenced"""
+    slugs: List[str] = []
+    for day in days or []:
+        slug = keyword_slug(day.get("image_keyword") or day.get("location") or "")
+        day["image_url"] = image_url(slug)
+        if slug not in slugs:
+            slugs.append(slug)
+    return slugs
+
+
+class ImageProviderError(Exception):
+    """Provider could not return an image for a keyword"""
+
+
+class ImageProvider(abc.ABC):
+    """Returns original image bytes for a keyword"""
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def fetch(self, keyword: str, client: Any) -> bytes:
+        """Original image bytes; raises ImageProviderError when there is none"""
+
+
+class LoremFlickrProvider(ImageProvider):
+    """Keyword-tagged Flickr photos (what the frontend used directly)"""
+
+    name = "loremflickr"
+
+    async def fetch(self, keyword: str, client: Any) -> bytes:
+        width = max(VARIANTS.values())
+        response = await client.get(
+            f"https://loremflickr.com/{width}/{width // 2}/{keyword.replace('-', ',')}",
+            follow_redirects=True
+        )
+        if response.status_code != 200:
+            raise ImageProviderError(f"loremflickr returned {response.status_code}")
+        return response.content
+
+
+class UnsplashProvider(ImageProvider):
+    """Top Unsplash search result (requires UNSPLASH_ACCESS_KEY)"""
+
+    name = "unsplash"
+
+    def __init__(self, access_key: str):
+        self.access_key = access_key
+
+    async def fetch(self, keyword: str, client: Any) -> bytes:
+        search = await client.get(
+            "https://api.unsplash.com/search/photos",
+            params={"query": keyword.replace("-", " "), "per_page": 1, "orientation": "landscape"},
+            headers={"Authorization": f"Client-ID {self.access_key}"}
+        )
+        if search.status_code != 200:
+            raise ImageProviderError(f"unsplash search returned {search.status_code}")
+        results = search.json().get("results") or []
+        if not results:
+            raise ImageProviderError(f"no unsplash results for '{keyword}'")
+        photo = await client.get(results[0]["urls"]["regular"], follow_redirects=True)
+        if photo.status_code != 200:
+            raise ImageProviderError(f"unsplash download returned {photo.status_code}")
+        return photo.content
+
+
+class LocalDirectoryProvider(ImageProvider):
+    """Serves {slug}.jpg/.png/.webp from a directory, else default.*; no network"""
+
+    name = "local"
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    async def fetch(self, keyword: str, client: Any) -> bytes:
+        for stem in (keyword, "default"):
+            for suffix in (".jpg", ".jpeg", ".png", ".webp"):
+                path = self.directory / f"{stem}{suffix}"
+                if path.exists():
+                    return path.read_bytes()
+        raise ImageProviderError(f"no local image for '{keyword}'")
+
+
+def provider_from_settings() -> ImageProvider:
+    if settings.IMAGE_PROVIDER == "local":
+        return LocalDirectoryProvider(settings.IMAGE_LOCAL_DIR)
+    if settings.IMAGE_PROVIDER == "unsplash" and settings.UNSPLASH_ACCESS_KEY:
+        return UnsplashProvider(settings.UNSPLASH_ACCESS_KEY)
+    return LoremFlickrProvider()
+
+
+def render_variants(original: bytes) -> Dict[str, bytes]:
+    """Resize to every variant width and encode as WebP (CPU bound - run in a thread)"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(original)) as source:
+        source = source.convert("RGB")
+        variants = {}
+        for variant, width in VARIANTS.items():
+            image = source
+            if source.width > width:
+                height = max(1, round(source.height * width / source.width))
+                image = source.resize((width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+            variants[variant] = buffer.getvalue()
+    return variants
+
+
+class ImageDiskCache:
+    """Variant files under directory/<slug>/<variant>.webp, evicted LRU by total size"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._files: "OrderedDict[Path, int]" = OrderedDict()
+        self._total = 0
+        self._scanned = False
+
+    def _scan(self) -> None:
+        """Index existing files oldest-first by mtime"""
+        if self._scanned:
+            return
+        self._scanned = True
+        self.directory.mkdir(parents=True, exist_ok=True)
+        found = []
+        for path in self.directory.glob("*/*.webp"):
+            stat = path.stat()
+            found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._files[path] = size
+            self._total += size
+
+    def path(self, slug: str, variant: str) -> Path:
+        return self.directory / slug / f"{variant}.webp"
+
+    def get(self, slug: str, variant: str) -> Optional[Path]:
+        """Path of a cached variant (marks it recently used), or None"""
+        self._scan()
+        path = self.path(slug, variant)
+        if not path.exists():
+            if path in self._files:
+                self._total -= self._files.pop(path)  # evicted by another worker
+            return None
+        if path not in self._files:
+            # Written by another worker
+            size = path.stat().st_size
+            self._files[path] = size
+            self._total += size
+        self._files.move_to_end(path)
+        os.utime(path)
+        return path
+
+    def put(self, slug: str, variants: Dict[str, bytes]) -> None:
+        self._scan()
+        (self.directory / slug).mkdir(parents=True, exist_ok=True)
+        for variant, data in variants.items():
+            path = self.path(slug, variant)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)  # readers never see a partial file
+            self._total += len(data) - self._files.pop(path, 0)
+            self._files[path] = len(data)
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and self._files:
+            path, size = self._files.popitem(last=False)
+            self._total -= size
+            try:
+                path.unlink()
+                if not any(path.parent.iterdir()):
+                    path.parent.rmdir()
+            except OSError:
+                pass
+            metrics.inc("image_cache_evictions_total")
+        metrics.set_gauge("image_cache_bytes", self._total)
+
+    @property
+    def total_bytes(self) -> int:
+        self._scan()
+        return self._total
+
+
+class ImageService:
+    """Keyword -> cached WebP variants"""
+
+    def __init__(
+        self,
+        provider: Optional[ImageProvider] = None,
+        cache: Optional[ImageDiskCache] = None,
+        concurrency: Optional[int] = None
+    ):
+        self.provider = provider or provider_from_settings()
+        self.cache = cache or ImageDiskCache(settings.IMAGE_CACHE_DIR, settings.IMAGE_CACHE_MAX_MB * 1024 * 1024)
+        self.concurrency = concurrency or settings.IMAGE_FETCH_CONCURRENCY
+        self._client = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _http(self):
+        """Shared pooled client (created on first use)"""
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(15.0, connect=5.0),
+                limits=httpx.Limits(max_connections=self.concurrency * 2, max_keepalive_connections=self.concurrency),
+                headers={"User-Agent": "AI-Roadtrip-Genie/3.0"}
+            )
+        return self._client
+
+    async def get(self, slug: str, variant: str = DEFAULT_VARIANT) -> Path:
+        """Cached variant path, fetching and rendering on a miss"""
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown image variant '{variant}'")
+        path = self.cache.get(slug, variant)
+        if path is not None:
+            metrics.inc("image_requests_total", outcome="hit")
+            return path
+        metrics.inc("image_requests_total", outcome="miss")
+        await self._resolve(slug)
+        path = self.cache.get(slug, variant)
+        if path is None:
+            raise ImageProviderError(f"variant '{variant}' missing after resolving '{slug}'")
+        return path
+
+    async def _resolve(self, slug: str) -> None:
+        """Fetch + render once per slug, even with many concurrent requests for it"""
+        pending = self._inflight.get(slug)
+        if pending is not None:
+            return await pending
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[slug] = future
+        try:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.concurrency)
+            async with self._semaphore:
+                original = await self.provider.fetch(slug, self._http())
+            variants = await asyncio.to_thread(render_variants, original)
+            self.cache.put(slug, variants)
+            future.set_result(None)
+        except Exception as e:
+            metrics.inc("image_fetch_errors_total", provider=self.provider.name)
+            future.set_exception(e)
+            future.exception()  # retrieved here; waiters re-raise it
+            raise
+        finally:
+            del self._inflight[slug]
+
+    async def prefetch(self, slugs: Iterable[str]) -> int:
+        """Resolve uncached slugs concurrently; returns how many were fetched"""
+        missing = [s for s in dict.fromkeys(slugs) if self.cache.get(s, DEFAULT_VARIANT) is None]
+        results = await asyncio.gather(*(self._resolve(s) for s in missing), return_exceptions=True)
+        for slug, result in zip(missing, results):
+            if isinstance(result, Exception):
+                print(f"[IMAGES] Prefetch failed for '{slug}': {result}")
+        return sum(1 for r in results if not isinstance(r, Exception))
+
+    def prefetch_in_background(self, slugs: List[str]) -> None:
+        """Start resolving an itinerary's images before the browser asks for them"""
+        if not slugs:
+            return
+        task = asyncio.create_task(self.prefetch(slugs))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_image_service: Optional[ImageService] = None
+
+
+def get_image_service() -> ImageService:
+    """Process-wide service (one connection pool, one in-flight map)"""
+    global _image_service
+    if _image_service is None:
+        _image_service = ImageService()
+    return _image_service
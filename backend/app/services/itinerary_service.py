@@ -7,16 +7,27 @@ Core business logic following CLAUDE.md three-axis principles:
 """
 import uuid
 from datetime import datetime
+from typing import Any, Dict, Optional
 
+from app.core.config import settings
+from app.core.progress import report
 from app.models.itinerary import (
     ItineraryRequest,
     ItineraryResponse,
     LogisticsInfo,
     BudgetBreakdown,
     ActivityPoint,
-    SciencePoint
+    SciencePoint,
+    ScheduleWarning
 )
 from app.services.ai_service import AIService
+from app.services.image_service import attach_image_urls, get_image_service
+from app.services.itinerary_store import get_itinerary_store
+from app.services.refinement_rules import RefinementRuleEngine
+from app.services.refinement_sessions import get_refinement_sessions
+from app.services.route_optimizer import get_route_optimizer
+from app.services.schedule_checker import get_schedule_checker
+from app.services.scheduler import priority
 
 
 class ItineraryService:
@@ -24,12 +35,22 @@ class ItineraryService:
 
     def __init__(self):
         self.ai_service = AIService()
+        self.store = get_itinerary_store()
+        self.refinement_rules = RefinementRuleEngine(self._get_season_info, self.ai_service.budget_engine)
 
-    async def generate(self, request: ItineraryRequest) -> ItineraryResponse:
+    async def generate(self, request: ItineraryRequest, track_demand: bool = True) -> ItineraryResponse:
         """
         Generate comprehensive roadtrip itinerary using Gemini AI
         Following three-axis principles from CLAUDE.md
         """
+        if track_demand:
+            self.store.record_request(request)
+        report("cache_lookup")
+        reused = self._from_store(request)
+        if reused is not None:
+            report("reused", itinerary_id=reused.itinerary_id)
+            return reused
+
         itinerary_id = f"itin_{uuid.uuid4().hex[:12]}"
 
         print(f"[GEN] Generating itinerary with Gemini AI...")
@@ -42,13 +63,36 @@ class ItineraryService:
 
         print(f"[GEN] Gemini AI response received!")
         print(f"[GEN] Markdown length: {len(ai_response.get('itinerary_markdown', ''))} chars")
+        report("assembling")
+        image_slugs = attach_image_urls(ai_response.get("itinerary_daily"))
+
+        response = self._build_response(itinerary_id, datetime.utcnow().isoformat(), request, ai_response)
+
+        report("storing", itinerary_id=itinerary_id)
+        self.store.put(request, response.model_dump(mode="json"))
+        if settings.IMAGE_PREFETCH:
+            get_image_service().prefetch_in_background(image_slugs)
+
+        print(f"[GEN] Itinerary {itinerary_id} generated successfully!")
+        return response
 
-        response = ItineraryResponse(
+    def _build_response(
+        self,
+        itinerary_id: str,
+        created_at: str,
+        request: ItineraryRequest,
+        ai_response: Dict[str, Any],
+        payment_status: str = "pending",
+        detail_level: str = "full"
+    ) -> ItineraryResponse:
+        """ItineraryResponse from AIService output (full itinerary or preview)"""
+        return ItineraryResponse(
             itinerary_id=itinerary_id,
-            created_at=datetime.utcnow().isoformat(),
+            created_at=created_at,
 
             trip_summary=ai_response.get("trip_summary", "AI-generated itinerary"),
             season_info=ai_response.get("season_info", self._get_season_info(request.start_date)),
+            start_date=request.start_date,
             itinerary_markdown=ai_response.get("itinerary_markdown", ""),
 
             itinerary_daily=ai_response.get("itinerary_daily"),
@@ -92,14 +136,89 @@ class ItineraryService:
 
             risk_warnings=ai_response.get("risk_warnings", []),
             packing_list=ai_response.get("packing_list", []),
+            schedule_warnings=[
+                ScheduleWarning(**warning)
+                for warning in ai_response.get("schedule_warnings", [])
+            ],
 
-            payment_status="pending"
+            payment_status=payment_status,
+            detail_level=detail_level
         )
 
-        print(f"[GEN] Itinerary {itinerary_id} generated successfully!")
-        return response
-
-    def _get_season_info(self, start_date) -> str:
+    def _from_store(self, request: ItineraryRequest) -> Optional[ItineraryResponse]:
+        """
+        Serve an exact or near-duplicate stored itinerary without a model call
+        The hit is stored as an alias (new id plus adapted fields), not a copy
+        """
+        data = self.store.find_exact(request)
+        if data is not None:
+            print(f"[CACHE] Exact hit for {request.start_location} -> {request.end_location}")
+            fields = {"start_date": request.start_date.isoformat()}
+        elif settings.SIMILAR_REUSE_ENABLED:
+            similar = self.store.find_similar(request)
+            if similar is None:
+                return None
+            stored_request, data = similar
+            print(f"[CACHE] Similar hit from {data['itinerary_id']} - adapting locally")
+            fields = self._adapt(stored_request, data, request)
+        else:
+            return None
+
+        source_id = data["itinerary_id"]
+        fields["itinerary_id"] = f"itin_{uuid.uuid4().hex[:12]}"
+        fields["created_at"] = datetime.utcnow().isoformat()
+        fields["payment_status"] = "pending"
+        data.update(fields)
+        self.store.put_alias(fields["itinerary_id"], source_id, fields)
+        return ItineraryResponse(**data)
+
+    def _adapt(self, stored_request: ItineraryRequest, data: dict, request: ItineraryRequest) -> dict:
+        """Fields that adapt a stored itinerary to a close request: party size and start date"""
+        fields: Dict[str, Any] = {"start_date": request.start_date.isoformat()}
+        if stored_request.number_of_persons != request.number_of_persons:
+            fields["budget"] = self.ai_service.budget_engine.rescale(
+                data.get("itinerary_daily"), data.get("budget"), request.number_of_persons
+            )
+        if stored_request.start_date != request.start_date:
+            fields["season_info"] = self._get_season_info(request.start_date)
+        return fields
+
+    async def refine(self, current_itinerary: dict, refinement_request: str, summary: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Refine an itinerary
+        Mechanical edits (party size, swap/drop day, date shift) are applied locally;
+        everything else goes to the model (summary: cached prompt form of current_itinerary)
+        """
+        refined = self.refinement_rules.try_apply(current_itinerary, refinement_request)
+        if refined is None:
+            with priority(self.priority_for(current_itinerary.get("itinerary_id"))):
+                changes = await self.ai_service.refine_itinerary(
+                    current_itinerary=current_itinerary,
+                    refinement_request=refinement_request,
+                    summary=summary
+                )
+            attach_image_urls(changes.get("itinerary_daily"))
+            # Fields the model left out (route, dates, detail level) stay as they were
+            refined = {**current_itinerary, **{k: v for k, v in changes.items() if v is not None}}
+
+        # New or moved days change driving legs, daylight, stop order and the rendered text
+        get_schedule_checker().check(refined, refined.get("start_date"))
+        get_route_optimizer().check(refined)
+        if refined.get("itinerary_daily"):
+            refined["itinerary_markdown"] = self.ai_service.render_markdown(refined["itinerary_daily"])
+        return refined
+
+    async def refine_version(self, itinerary_id: str, refinement_request: str, version: int):
+        """Refine a stored itinerary by id; raises SessionError on unknown id or stale version"""
+        return await get_refinement_sessions().refine(itinerary_id, refinement_request, version, self.refine)
+
+    def priority_for(self, itinerary_id: Optional[str]) -> str:
+        """Scheduler class for work on an itinerary: paid if the store says so (never the client)"""
+        stored = self.store.get(itinerary_id) if itinerary_id else None
+        return "paid" if stored is not None and stored.get("payment_status") == "paid" else "interactive"
+
+    @staticmethod
+    def _get_season_info(start_date) -> str:
         """Determine season and provide relevant warnings"""
         month = start_date.month
 
@@ -0,0 +1,564 @@
+"""
+In-process itinerary store
+Keeps generated itineraries by itinerary_id and indexes them for reuse:
+- Exact index: canonical request key -> itinerary
+- Reuse hits are light aliases (own id and adapted fields over the source's
+  content), never indexed for reuse, so a popular route costs one entry
+- Similarity index: canonical (start, end, trip_duration, round trip) -> candidates
+  that differ only in number_of_persons, same-season start_date or activity_level
+- Demand tracking: bounded request counts (optionally logged as JSONL, buffered
+  and written off the event loop) for cache warming
+- Optional append-only JSONL journal so other processes (e.g. the warming CLI)
+  can fill the store the server loads on startup
+- Entries are held as CompactItinerary (slotted, array-backed) rather than
+  dict trees, so the same memory holds several times more itineraries
+- Optional shared tier (SQLite, see app.core.shared_cache) behind the in-process
+  LRU, so exact and by-id hits work across gunicorn workers; by-id reads compare
+  the local copy's write stamp with the shared one, so a field another worker
+  changed (e.g. payment_status from the webhook consumer) is never served stale
+"""
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.shared_cache import SharedCache, get_shared_cache
+from app.models.compact import CompactItinerary
+from app.models.itinerary import ItineraryRequest
+
+
+ACTIVITY_ORDER = ["easy", "moderate", "challenging", "expert"]
+SEASONS = {12: 0, 1: 0, 2: 0, 3: 1, 4: 1, 5: 1, 6: 2, 7: 2, 8: 2, 9: 3, 10: 3, 11: 3}
+
+
+def canonical_location(value: str) -> str:
+    """'Seattle, WA ' -> 'seattle wa'"""
+    return " ".join(re.sub(r"[^\w\s]", " ", value.lower()).split())
+
+
+def _enum_value(value: Any) -> str:
+    return getattr(value, "value", value)
+
+
+def route_key(request: ItineraryRequest) -> Tuple[str, str, int, bool]:
+    """Coarse key shared by all requests a stored itinerary could be adapted to"""
+    return (
+        canonical_location(request.start_location),
+        canonical_location(request.end_location),
+        request.trip_duration,
+        request.is_round_trip,
+    )
+
+
+def request_key(request: ItineraryRequest) -> str:
+    """Exact canonical key for a generation request"""
+    payload = {
+        "route": route_key(request),
+        "start_date": request.start_date.isoformat(),
+        "persons": request.number_of_persons,
+        "vehicle": _enum_value(request.vehicle_type),
+        "interests": sorted(_enum_value(i) for i in request.interests),
+        "activity": _enum_value(request.activity_level),
+        "offroad": request.include_offroad,
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class StoredItinerary:
+    """A stored itinerary plus the request that produced it"""
+
+    __slots__ = ("request", "response", "key", "route", "adapted", "detached", "aliased", "synced_at")
+
+    def __init__(self, request: ItineraryRequest, response: dict, adapted: bool = False, detached: bool = False):
+        self.request = request
+        self.response = CompactItinerary(response)
+        self.key = request_key(request)
+        self.route = route_key(request)
+        self.adapted = adapted
+        self.detached = detached  # edited after generation: fetchable by id, never reused
+        self.aliased = False  # reuse hits point at this content (see ItineraryStore.put_alias)
+        self.synced_at: Optional[float] = None  # shared-tier stamp this copy matches
+
+
+class AliasEntry:
+    """A reuse hit: its own identity and adapted fields over a stored itinerary"""
+
+    __slots__ = ("source", "fields", "synced_at")
+
+    def __init__(self, source: str, fields: dict):
+        self.source = source
+        self.fields = fields  # itinerary_id, created_at, payment_status, adapted budget...
+        self.synced_at: Optional[float] = None
+
+    def to_record(self) -> dict:
+        return {"source": self.source, "fields": self.fields}
+
+
+# A source refined after it was aliased keeps its original content under this id
+SOURCE_SNAPSHOT_SUFFIX = ".source"
+
+
+class ItineraryStore:
+    """Bounded LRU store with exact and near-duplicate lookup"""
+
+    def __init__(
+        self,
+        max_entries: int = 500,
+        max_aliases: int = 10000,
+        journal_path: Optional[str] = None,
+        request_log_path: Optional[str] = None,
+        shared: Optional[SharedCache] = None,
+        max_demand: int = 2000,
+        request_log_flush_lines: int = 50
+    ):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, StoredItinerary]" = OrderedDict()
+        self.max_aliases = max_aliases
+        self._aliases: "OrderedDict[str, AliasEntry]" = OrderedDict()
+        self._by_key: Dict[str, str] = {}
+        self._by_route: Dict[Tuple, Set[str]] = {}
+        self.max_demand = max_demand
+        self._demand: Counter = Counter()
+        self._demand_requests: Dict[str, ItineraryRequest] = {}
+        self.request_log_flush_lines = request_log_flush_lines
+        self._request_log: List[str] = []  # buffered lines, see flush_request_log()
+        self._write_lock = threading.Lock()
+        self.journal_path = Path(journal_path) if journal_path else None
+        self.request_log_path = Path(request_log_path) if request_log_path else None
+        self._journal_offset = 0
+        self.shared = shared
+        if self.journal_path and self.journal_path.exists():
+            self.load_journal()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, request: ItineraryRequest, response: dict, adapted: bool = False, detached: bool = False) -> None:
+        """
+        Store a generated (or adapted) itinerary; response must be JSON-ready
+        detached: fetchable by id but never reused for other requests (e.g. previews)
+        """
+        entry = self._insert(request, response, adapted, detached)
+        self._share(entry)
+        if self.journal_path:
+            record = {
+                "request": request.model_dump(mode="json"),
+                "response": response,
+                "adapted": adapted,
+            }
+            if detached:
+                record["detached"] = True
+            self._append_line(self.journal_path, record)
+
+    def _insert(
+        self, request: ItineraryRequest, response: dict, adapted: bool, detached: bool = False
+    ) -> StoredItinerary:
+        itinerary_id = response["itinerary_id"]
+        entry = StoredItinerary(request, response, adapted, detached)
+        if itinerary_id in self._entries:
+            self._unindex(itinerary_id)
+        self._entries[itinerary_id] = entry
+        self._entries.move_to_end(itinerary_id)
+        if not detached:
+            self._by_key[entry.key] = itinerary_id
+        if not adapted and not detached:
+            # Only model output seeds adaptation, so drift never compounds
+            self._by_route.setdefault(entry.route, set()).add(itinerary_id)
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._unindex(oldest)
+            del self._entries[oldest]
+        return entry
+
+    def _share(self, entry: StoredItinerary) -> None:
+        """Write an entry through to the shared tier (best effort)"""
+        if self.shared is None:
+            return
+        itinerary_id = entry.response.itinerary_id
+        try:
+            entry.synced_at = self.shared.set("itinerary", itinerary_id, {
+                "request": entry.request.model_dump(mode="json"),
+                "response": entry.response.to_dict(),
+                "adapted": entry.adapted,
+                "detached": entry.detached,
+                "aliased": entry.aliased,
+            })
+            if not entry.detached:
+                self.shared.set("request_key", entry.key, itinerary_id)
+        except sqlite3.Error as e:
+            print(f"[STORE] Shared cache write failed: {e}")
+
+    def _from_shared(self, itinerary_id: str) -> Optional[StoredItinerary]:
+        """Pull an entry another worker produced into the local LRU"""
+        if self.shared is None:
+            return None
+        try:
+            found = self.shared.get_stamped("itinerary", itinerary_id)
+        except sqlite3.Error as e:
+            print(f"[STORE] Shared cache read failed: {e}")
+            return None
+        if found is None:
+            return None
+        record, stamp = found
+        entry = self._insert(
+            ItineraryRequest(**record["request"]), record["response"],
+            record.get("adapted", False), record.get("detached", False)
+        )
+        entry.aliased = record.get("aliased", False)
+        entry.synced_at = stamp
+        return entry
+
+    def _current(self, itinerary_id: str) -> Optional[StoredItinerary]:
+        """
+        The local entry, re-read from the shared tier when another worker wrote a
+        newer version since this copy was taken (one indexed stamp lookup)
+        """
+        entry = self._entries.get(itinerary_id)
+        if self.shared is None:
+            return entry
+        if entry is not None:
+            try:
+                stamp = self.shared.stamp("itinerary", itinerary_id)
+            except sqlite3.Error as e:
+                print(f"[STORE] Shared cache read failed: {e}")
+                return entry
+            if stamp is None or stamp == entry.synced_at:
+                return entry  # unchanged, or pruned from the shared tier
+        return self._from_shared(itinerary_id) or entry
+
+    def get(self, itinerary_id: str) -> Optional[dict]:
+        """Fetch a stored itinerary (or alias) by id (a fresh dict the caller owns)"""
+        entry = self._current(itinerary_id)
+        if entry is None:
+            return self._resolve(itinerary_id)
+        self._entries.move_to_end(itinerary_id)
+        return entry.response.to_dict()
+
+    # ---- Aliases ----
+
+    def put_alias(self, itinerary_id: str, source_id: str, fields: dict) -> bool:
+        """
+        Store a reuse hit as an alias of a stored itinerary: fields (its identity and
+        adapted values) overlay the source's content; never indexed for reuse
+        """
+        source = self._current(source_id)
+        if source is None:
+            return False
+        if not source.aliased:
+            source.aliased = True  # refining the source now keeps a snapshot for its aliases
+            self._share(source)
+        alias = self._insert_alias(itinerary_id, AliasEntry(source_id, fields))
+        self._share_alias(itinerary_id, alias)
+        if self.journal_path:
+            self._append_line(self.journal_path, {"alias": itinerary_id, **alias.to_record()})
+        return True
+
+    def _insert_alias(self, itinerary_id: str, alias: AliasEntry) -> AliasEntry:
+        self._aliases[itinerary_id] = alias
+        self._aliases.move_to_end(itinerary_id)
+        while len(self._aliases) > self.max_aliases:
+            self._aliases.popitem(last=False)
+        return alias
+
+    def _share_alias(self, itinerary_id: str, alias: AliasEntry) -> None:
+        if self.shared is None:
+            return
+        try:
+            alias.synced_at = self.shared.set("itinerary_alias", itinerary_id, alias.to_record())
+        except sqlite3.Error as e:
+            print(f"[STORE] Shared cache write failed: {e}")
+
+    def _current_alias(self, itinerary_id: str) -> Optional[AliasEntry]:
+        """Local alias, re-read from the shared tier when another worker changed it"""
+        alias = self._aliases.get(itinerary_id)
+        if self.shared is None:
+            return alias
+        try:
+            found = self.shared.get_stamped("itinerary_alias", itinerary_id)
+        except sqlite3.Error as e:
+            print(f"[STORE] Shared cache read failed: {e}")
+            return alias
+        if found is None or (alias is not None and found[1] == alias.synced_at):
+            return alias
+        record, stamp = found
+        alias = self._insert_alias(itinerary_id, AliasEntry(record["source"], record["fields"]))
+        alias.synced_at = stamp
+        return alias
+
+    def _alias_source(self, alias: AliasEntry) -> Optional[StoredItinerary]:
+        """The content an alias overlays (None once the source is evicted everywhere)"""
+        source = self._current(alias.source)
+        if source is not None and source.detached:
+            # Refined since the alias was made: the original content lives on as a snapshot
+            source = self._current(alias.source + SOURCE_SNAPSHOT_SUFFIX) or source
+        return source
+
+    def _resolve(self, itinerary_id: str) -> Optional[dict]:
+        """An alias as a full itinerary, or None"""
+        alias = self._current_alias(itinerary_id)
+        source = self._alias_source(alias) if alias is not None else None
+        if source is None:
+            return None
+        self._entries.move_to_end(source.response.itinerary_id)
+        self._aliases.move_to_end(itinerary_id)
+        data = source.response.to_dict()
+        data.update(alias.fields)
+        return data
+
+    def refresh(self, itinerary_id: str) -> Optional[dict]:
+        """Re-read an itinerary from the shared tier (another worker replaced it)"""
+        entry = self._from_shared(itinerary_id)
+        return entry.response.to_dict() if entry is not None else self.get(itinerary_id)
+
+    def update(self, itinerary_id: str, detach: bool = False, **fields: Any) -> bool:
+        """
+        Patch top-level fields of a stored itinerary (e.g. payment_status)
+        detach: the content no longer answers its request (e.g. refined), so it stays
+        fetchable by id but is never reused for other requests
+        The patch applies to the latest shared version, so it never reverts a
+        field another worker changed
+        """
+        entry = self._current(itinerary_id)
+        if entry is None:
+            return self._update_alias(itinerary_id, detach, fields)
+        if detach and entry.aliased and not entry.detached:
+            # Aliases still show the original content: keep it under a snapshot id
+            snapshot = entry.response.to_dict()
+            snapshot["itinerary_id"] = itinerary_id + SOURCE_SNAPSHOT_SUFFIX
+            self.put(entry.request, snapshot, entry.adapted, detached=True)
+        entry.response.update(fields)
+        if detach:
+            self._detach(itinerary_id)
+        self._share(entry)
+        if self.journal_path:
+            record = {"update": itinerary_id, "fields": fields}
+            if detach:
+                record["detach"] = True
+            self._append_line(self.journal_path, record)
+        return True
+
+    def _update_alias(self, itinerary_id: str, detach: bool, fields: dict) -> bool:
+        alias = self._current_alias(itinerary_id)
+        if alias is None:
+            return False
+        if detach:
+            # Content of its own from now on (e.g. refined): becomes a full entry
+            source = self._alias_source(alias)
+            if source is None:
+                return False
+            data = source.response.to_dict()
+            data.update(alias.fields)
+            data.update(fields)
+            self.put(source.request, data, adapted=True, detached=True)
+            self._aliases.pop(itinerary_id, None)
+            if self.shared is not None:
+                try:
+                    self.shared.delete("itinerary_alias", itinerary_id)
+                except sqlite3.Error as e:
+                    print(f"[STORE] Shared cache write failed: {e}")
+            return True
+        alias.fields.update(fields)
+        self._share_alias(itinerary_id, alias)
+        if self.journal_path:
+            self._append_line(self.journal_path, {"update": itinerary_id, "fields": fields})
+        return True
+
+    def _detach(self, itinerary_id: str) -> None:
+        entry = self._entries[itinerary_id]
+        self._unindex(itinerary_id)
+        entry.detached = True
+        if self.shared is not None:
+            try:
+                if self.shared.get("request_key", entry.key) == itinerary_id:
+                    self.shared.delete("request_key", entry.key)
+            except sqlite3.Error as e:
+                print(f"[STORE] Shared cache write failed: {e}")
+
+    def has_key(self, key: str) -> bool:
+        """Whether an itinerary exists for this exact request key"""
+        if key in self._by_key:
+            return True
+        try:
+            return self.shared is not None and self.shared.get("request_key", key) is not None
+        except sqlite3.Error:
+            return False
+
+    def record_request(self, request: ItineraryRequest) -> None:
+        """Count demand for a request (feeds cache warming)"""
+        key = request_key(request)
+        self._demand[key] += 1
+        self._demand_requests[key] = request
+        if len(self._demand) > self.max_demand:
+            self._decay_demand()
+        if self.request_log_path:
+            self._request_log.append(json.dumps(request.model_dump(mode="json"), ensure_ascii=False, default=str) + "\n")
+            if len(self._request_log) >= self.request_log_flush_lines:
+                self.flush_request_log()
+
+    def _decay_demand(self) -> None:
+        """Keep the most requested half, with halved counts so old popularity fades"""
+        kept = self._demand.most_common(self.max_demand // 2)
+        self._demand = Counter({key: (count + 1) // 2 for key, count in kept})
+        self._demand_requests = {key: self._demand_requests[key] for key in self._demand}
+
+    def flush_request_log(self, background: bool = True) -> None:
+        """Write buffered request-log lines (in a worker thread when called on the event loop)"""
+        lines, self._request_log = self._request_log, []
+        if not lines or not self.request_log_path:
+            return
+        try:
+            loop = asyncio.get_running_loop() if background else None
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            self._write_lines(self.request_log_path, lines)
+        else:
+            loop.run_in_executor(None, self._write_lines, self.request_log_path, lines)
+
+    def _write_lines(self, path: Path, lines: List[str]) -> None:
+        try:
+            with self._write_lock:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "a", encoding="utf-8") as fh:
+                    fh.write("".join(lines))
+        except OSError as e:
+            print(f"[STORE] Request log write failed: {e}")
+
+    def top_requests(self, n: int) -> List[ItineraryRequest]:
+        """Most requested distinct requests seen by this process"""
+        return [self._demand_requests[key] for key, _ in self._demand.most_common(n)]
+
+    def load_journal(self) -> int:
+        """Replay journal lines not seen yet (written by this or another process)"""
+        if not self.journal_path or not self.journal_path.exists():
+            return 0
+        loaded = 0
+        with open(self.journal_path, encoding="utf-8") as fh:
+            fh.seek(self._journal_offset)
+            while True:
+                line = fh.readline()
+                if not line.endswith("\n"):
+                    break  # EOF, or a line still being written
+                self._journal_offset = fh.tell()
+                try:
+                    record = json.loads(line)
+                    if "update" in record:
+                        entry = self._entries.get(record["update"])
+                        alias = self._aliases.get(record["update"])
+                        if entry is not None:
+                            entry.response.update(record["fields"])
+                            if record.get("detach"):
+                                self._detach(record["update"])
+                        elif alias is not None:
+                            alias.fields.update(record["fields"])
+                        continue
+                    if "alias" in record:
+                        source = self._entries.get(record["source"])
+                        if source is not None:
+                            source.aliased = True
+                        self._insert_alias(record["alias"], AliasEntry(record["source"], record["fields"]))
+                        continue
+                    request = ItineraryRequest(**record["request"])
+                    self._insert(request, record["response"], record.get("adapted", False), record.get("detached", False))
+                    loaded += 1
+                except (ValueError, KeyError, TypeError) as e:
+                    # Corrupt line (e.g. torn write before a crash) - skip it
+                    print(f"[STORE] Skipping unreadable journal line: {e}")
+        if loaded:
+            print(f"[STORE] Loaded {loaded} itineraries from {self.journal_path}")
+        return loaded
+
+    def _append_line(self, path: Path, record: dict) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def find_exact(self, request: ItineraryRequest) -> Optional[dict]:
+        """Itinerary generated for an identical request, if any"""
+        key = request_key(request)
+        itinerary_id = self._by_key.get(key)
+        if itinerary_id is None and self.shared is not None:
+            try:
+                itinerary_id = self.shared.get("request_key", key)
+            except sqlite3.Error:
+                itinerary_id = None
+        return self.get(itinerary_id) if itinerary_id else None
+
+    def find_similar(self, request: ItineraryRequest) -> Optional[Tuple[ItineraryRequest, dict]]:
+        """
+        Closest stored itinerary that can be adapted locally
+        Must match route, vehicle, off-road and interests; may differ in persons,
+        start_date (same season) and activity_level (within the configured steps)
+        """
+        candidates = self._by_route.get(route_key(request))
+        if not candidates:
+            return None
+
+        wanted_interests = sorted(_enum_value(i) for i in request.interests)
+        wanted_activity = ACTIVITY_ORDER.index(_enum_value(request.activity_level))
+        best: Optional[StoredItinerary] = None
+        best_score = None
+
+        for itinerary_id in candidates:
+            entry = self._entries[itinerary_id]
+            stored = entry.request
+            if _enum_value(stored.vehicle_type) != _enum_value(request.vehicle_type):
+                continue
+            if stored.include_offroad != request.include_offroad:
+                continue
+            if sorted(_enum_value(i) for i in stored.interests) != wanted_interests:
+                continue
+            if SEASONS[stored.start_date.month] != SEASONS[request.start_date.month]:
+                continue
+            activity_steps = abs(ACTIVITY_ORDER.index(_enum_value(stored.activity_level)) - wanted_activity)
+            if activity_steps > settings.SIMILAR_REUSE_MAX_ACTIVITY_STEPS:
+                continue
+
+            score = (
+                activity_steps * 30
+                + abs((stored.start_date - request.start_date).days)
+                + abs(stored.number_of_persons - request.number_of_persons)
+            )
+            if best_score is None or score < best_score:
+                best, best_score = entry, score
+
+        if best is None:
+            return None
+        self._entries.move_to_end(best.response.itinerary_id)
+        return best.request, best.response.to_dict()
+
+    def _unindex(self, itinerary_id: str) -> None:
+        entry = self._entries[itinerary_id]
+        if self._by_key.get(entry.key) == itinerary_id:
+            del self._by_key[entry.key]
+        ids = self._by_route.get(entry.route)
+        if ids is not None:
+            ids.discard(itinerary_id)
+            if not ids:
+                del self._by_route[entry.route]
+
+
+_store: Optional[ItineraryStore] = None
+
+
+def get_itinerary_store() -> ItineraryStore:
+    """Process-wide store shared by all ItineraryService instances (created on first use)"""
+    global _store
+    if _store is None:
+        _store = ItineraryStore(
+            settings.ITINERARY_CACHE_SIZE,
+            max_aliases=settings.ITINERARY_ALIAS_CACHE_SIZE,
+            journal_path=settings.ITINERARY_STORE_PATH,
+            request_log_path=settings.REQUEST_LOG_PATH,
+            shared=get_shared_cache(),
+            max_demand=settings.DEMAND_TRACK_MAX,
+            request_log_flush_lines=settings.REQUEST_LOG_FLUSH_LINES
+        )
+    return _store
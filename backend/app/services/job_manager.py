@@ -0,0 +1,326 @@
+"""
+Asynchronous generation jobs
+Submitting returns a job id at once; generation runs in a managed pool instead
+of inside the HTTP request:
+- A fixed set of worker tasks pulls queued jobs and runs ItineraryService.generate
+- Stage progress (app.core.progress) is recorded as job events for polling and
+  WebSocket subscribers
+- Results outlive the client connection and are kept for JOB_RETENTION_SECONDS
+- Queued and running jobs can be cancelled; cancelling a running job stops
+  waiting for it, but a model call already in flight runs (and is billed) until
+  it returns or hits its tier's SDK timeout (MODEL_TIERS timeout_seconds)
+- Snapshots are published to the shared cache tier, so any gunicorn worker can
+  answer a poll and forward a cancel to the worker that owns the job; publishing
+  is batched (at most one write per JOB_PUBLISH_INTERVAL_SECONDS) and, like the
+  janitor's cancel check, runs in a worker thread rather than on the event loop
+"""
+import asyncio
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.progress import listen
+from app.core.shared_cache import SharedCache, get_shared_cache
+from app.models.compact import CompactItinerary
+from app.models.itinerary import ItineraryRequest
+
+
+TERMINAL = ("succeeded", "failed", "cancelled")
+MAX_EVENTS = 50
+
+
+class JobError(Exception):
+    """Job queue full (429)"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Job:
+    """One generation request and its progress"""
+
+    __slots__ = (
+        "job_id", "request", "status", "stage", "events", "itinerary_id", "result", "error",
+        "created_at", "updated_at", "task", "subscribers",
+    )
+
+    def __init__(self, request: ItineraryRequest):
+        self.job_id = f"job_{uuid.uuid4().hex[:16]}"
+        self.request = request
+        self.status = "queued"
+        self.stage = "queued"
+        self.events: List[dict] = []
+        self.itinerary_id: Optional[str] = None
+        self.result: Optional[CompactItinerary] = None
+        self.error: Optional[str] = None
+        self.created_at = self.updated_at = time.time()
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers: Set[asyncio.Queue] = set()
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL
+
+    def snapshot(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stage": self.stage,
+            "itinerary_id": self.itinerary_id,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "events": list(self.events),
+        }
+
+
+class JobManager:
+    """In-process job table plus a fixed pool of worker tasks"""
+
+    def __init__(
+        self,
+        service: Any,
+        workers: int = 4,
+        retention_seconds: float = 3600,
+        max_queued: int = 1000,
+        shared: Optional[SharedCache] = None,
+        publish_interval: float = 0.5
+    ):
+        self.service = service
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self.max_queued = max_queued
+        self.shared = shared
+        self.publish_interval = publish_interval
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._unpublished: Dict[str, Job] = {}
+        self._publisher: Optional[asyncio.Task] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Start the pool on the running loop (idempotent; submit() calls it)"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._janitor()))
+
+    async def stop(self) -> None:
+        for job in self._jobs.values():
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._publish()
+
+    # ---- Client operations ----
+
+    def submit(self, request: ItineraryRequest) -> Job:
+        queued = sum(1 for job in self._jobs.values() if job.status == "queued")
+        if queued >= self.max_queued:
+            raise JobError(f"{queued} jobs already queued; retry later", 429)
+        self.start()
+        job = Job(request)
+        self._jobs[job.job_id] = job
+        self._event(job, "queued", {})
+        self._queue.put_nowait(job.job_id)
+        metrics.inc("jobs_submitted_total")
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Snapshot from this worker, or from the shared tier if another worker owns the job"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        return self._shared_get("job", job_id)
+
+    def result(self, job_id: str) -> Optional[dict]:
+        """Itinerary of a succeeded job (None if unknown or not succeeded)"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.result.to_dict() if job.result is not None else None
+        snapshot = self._shared_get("job", job_id)
+        if snapshot is None or snapshot["status"] != "succeeded":
+            return None
+        return self.service.store.get(snapshot["itinerary_id"])
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """
+        Cancel a queued job, or stop waiting for a running one (its in-flight model
+        call is not interrupted; the SDK timeout bounds it)
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            snapshot = self._shared_get("job", job_id)
+            if snapshot is not None and snapshot["status"] not in TERMINAL:
+                self._shared_set("job_cancel", job_id, True)  # the owning worker's janitor acts on it
+            return snapshot
+        if job.status == "queued":
+            self._finish(job, "cancelled")
+        elif job.task is not None and not job.task.done():
+            job.task.cancel()
+        return job.snapshot()
+
+    async def events(self, job_id: str, poll_seconds: float = 0.5) -> AsyncIterator[dict]:
+        """Current snapshot, then each event until the job ends"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            # Owned by another worker: follow its published snapshot
+            last = None
+            while True:
+                snapshot = self._shared_get("job", job_id)
+                if snapshot is None:
+                    return
+                if snapshot["updated_at"] != last:
+                    last = snapshot["updated_at"]
+                    yield snapshot
+                if snapshot["status"] in TERMINAL:
+                    return
+                await asyncio.sleep(poll_seconds)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        job.subscribers.add(queue)
+        try:
+            yield job.snapshot()
+            if job.done:
+                return
+            while True:
+                event = await queue.get()
+                yield event
+                if event["status"] in TERMINAL:
+                    return
+        finally:
+            job.subscribers.discard(queue)
+
+    # ---- Pool ----
+
+    async def _worker(self) -> None:
+        while True:
+            job = self._jobs.get(await self._queue.get())
+            if job is None or job.status != "queued":
+                continue  # cancelled or pruned while waiting
+            job.task = asyncio.create_task(self._run(job))
+            # wait() rather than await: cancelling the job must not cancel this worker
+            await asyncio.wait([job.task])
+
+    async def _run(self, job: Job) -> None:
+        listen(lambda stage, detail: self._event(job, stage, detail))
+        job.status = "running"
+        self._event(job, "running", {})
+        metrics.observe("job_queue_wait_seconds", time.time() - job.created_at)
+        started = time.time()
+        try:
+            response = await self.service.generate(job.request)
+            data = response.model_dump(mode="json")
+            job.itinerary_id = data["itinerary_id"]
+            job.result = CompactItinerary(data)
+            self._finish(job, "succeeded")
+            metrics.observe("job_run_seconds", time.time() - started)
+        except asyncio.CancelledError:
+            self._finish(job, "cancelled")
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, "failed")
+            print(f"[JOBS] {job.job_id} failed: {e}")
+
+    def _event(self, job: Job, stage: str, detail: Dict[str, Any]) -> None:
+        job.stage = stage
+        job.updated_at = time.time()
+        event = {"stage": stage, "at": job.updated_at, **detail}
+        if "itinerary_id" in detail:
+            job.itinerary_id = detail["itinerary_id"]
+        job.events.append(event)
+        del job.events[:-MAX_EVENTS]
+        for queue in job.subscribers:
+            queue.put_nowait({"job_id": job.job_id, "status": job.status, **event})
+        if self.shared is not None:
+            self._unpublished[job.job_id] = job
+            if self._publisher is None or self._publisher.done():
+                self._publisher = asyncio.create_task(self._publish_soon())
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status = status
+        self._event(job, status, {"error": job.error} if job.error else {})
+        metrics.inc("jobs_finished_total", status=status)
+
+    async def _publish_soon(self) -> None:
+        """Publish changed snapshots every publish_interval while jobs keep changing"""
+        while self._unpublished:
+            await asyncio.sleep(self.publish_interval)
+            await self._publish()
+
+    async def _publish(self) -> None:
+        """Write the latest snapshot of every changed job in one transaction"""
+        if not self._unpublished:
+            return
+        snapshots = {job_id: job.snapshot() for job_id, job in self._unpublished.items()}
+        self._unpublished = {}
+        try:
+            await asyncio.to_thread(self.shared.set_many, "job", snapshots, self.retention_seconds)
+        except sqlite3.Error as e:
+            print(f"[JOBS] Shared cache write failed: {e}")
+
+    async def _janitor(self) -> None:
+        """Apply cancels forwarded by other workers; drop jobs past retention"""
+        last_prune = time.time()
+        while True:
+            await asyncio.sleep(1.0)
+            live = [job.job_id for job in self._jobs.values() if not job.done]
+            if self.shared is not None and live:
+                try:
+                    cancels = await asyncio.to_thread(self.shared.get_many, "job_cancel", live)
+                except sqlite3.Error as e:
+                    print(f"[JOBS] Shared cache read failed: {e}")
+                    cancels = {}
+                for job_id in cancels:
+                    if job_id in self._jobs:
+                        self.cancel(job_id)
+            if time.time() - last_prune >= min(60.0, self.retention_seconds):
+                last_prune = time.time()
+                cutoff = last_prune - self.retention_seconds
+                for job_id in [j.job_id for j in self._jobs.values() if j.done and j.updated_at < cutoff]:
+                    del self._jobs[job_id]
+            metrics.set_gauge("jobs_queued", sum(1 for job in self._jobs.values() if job.status == "queued"))
+
+    def _shared_get(self, namespace: str, key: str) -> Any:
+        if self.shared is None:
+            return None
+        try:
+            return self.shared.get(namespace, key)
+        except sqlite3.Error as e:
+            print(f"[JOBS] Shared cache read failed: {e}")
+            return None
+
+    def _shared_set(self, namespace: str, key: str, value: Any) -> None:
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(namespace, key, value, ttl=self.retention_seconds)
+        except sqlite3.Error as e:
+            print(f"[JOBS] Shared cache write failed: {e}")
+
+
+_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    if _manager is None:
+        from app.services.itinerary_service import ItineraryService
+        _manager = JobManager(
+            ItineraryService(),
+            workers=settings.JOB_WORKERS,
+            retention_seconds=settings.JOB_RETENTION_SECONDS,
+            max_queued=settings.JOB_MAX_QUEUED,
+            shared=get_shared_cache(),
+            publish_interval=settings.JOB_PUBLISH_INTERVAL_SECONDS
+        )
+    return _manager
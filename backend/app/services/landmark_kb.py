@@ -0,0 +1,217 @@
+"""
+Landmark science knowledge base
+Science notes for well-known landmarks come from a bundled file instead of the model:
+- app/data/landmarks.tsv: one landmark per line - lat, lon, id, keywords, JSON entry
+- Memory-mapped on first use; only lat/lon/keywords are read up front into a
+  grid index of line offsets, an entry's JSON is parsed when a query first hits it
+- along_route() finds landmarks within LANDMARK_RADIUS_KM of a route (haversine)
+- matching() finds landmarks named in free text (start/end locations) for prompts
+"""
+import json
+import math
+import mmap
+import os
+import re
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "landmarks.tsv")
+EARTH_RADIUS_KM = 6371.0
+CELL_DEGREES = 1.0
+# A model marker this close to a landmark is the same place (the landmark's notes win)
+SAME_PLACE_KM = 3.0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _coordinates(point: Optional[dict]) -> Optional[Tuple[float, float]]:
+    try:
+        return float(point["lat"]), float(point["lon"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class LandmarkKB:
+    """Read-only, spatially indexed view of the landmark file"""
+
+    def __init__(self, path: str, cell_degrees: float = CELL_DEGREES):
+        self.path = path
+        self.cell_degrees = cell_degrees
+        self._mm: Optional[mmap.mmap] = None
+        self._loaded = False
+        self._grid: Dict[Tuple[int, int], array] = {}  # cell -> line offsets
+        self._keywords: Dict[str, array] = {}  # keyword -> line offsets
+        self._keyword_re: Optional[re.Pattern] = None
+        self._entries: Dict[int, dict] = {}  # line offset -> parsed entry
+
+    def __len__(self) -> int:
+        self._load()
+        return sum(len(offsets) for offsets in self._grid.values())
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError as e:
+            print(f"[LANDMARKS] Knowledge base unavailable ({self.path}): {e}")
+            return
+
+        mm, offset, size = self._mm, 0, len(self._mm)
+        while offset < size:
+            end = mm.find(b"\n", offset)
+            if end < 0:
+                end = size
+            if end > offset and mm[offset] != ord("#"):
+                tabs = [mm.find(b"\t", offset, end)]
+                for _ in range(3):
+                    tabs.append(mm.find(b"\t", tabs[-1] + 1, end))
+                try:
+                    if min(tabs) < 0:
+                        raise ValueError("missing fields")
+                    lat, lon = float(mm[offset:tabs[0]]), float(mm[tabs[0] + 1:tabs[1]])
+                    keywords = mm[tabs[2] + 1:tabs[3]].decode("utf-8").split(",")
+                except ValueError as e:  # includes UnicodeDecodeError
+                    print(f"[LANDMARKS] Skipping malformed line at byte {offset}: {e}")
+                else:
+                    self._grid.setdefault(self._cell(lat, lon), array("q")).append(offset)
+                    for keyword in keywords:
+                        if keyword.strip():
+                            self._keywords.setdefault(keyword.strip().lower(), array("q")).append(offset)
+            offset = end + 1
+        if self._keywords:
+            # Longest first, so "grand teton" matches whole rather than as "teton"
+            alternatives = sorted(self._keywords, key=len, reverse=True)
+            self._keyword_re = re.compile(r"\b(" + "|".join(re.escape(k) for k in alternatives) + r")\b")
+        print(f"[LANDMARKS] Indexed {len(self)} landmarks from {self.path}")
+
+    def _entry(self, offset: int) -> dict:
+        entry = self._entries.get(offset)
+        if entry is None:
+            mm = self._mm
+            end = mm.find(b"\n", offset)
+            line = mm[offset:end if end >= 0 else len(mm)].decode("utf-8")
+            lat, lon, landmark_id, _, payload = line.split("\t", 4)
+            entry = self._entries[offset] = {
+                "id": landmark_id,
+                "coordinates": {"lat": float(lat), "lon": float(lon)},
+                **json.loads(payload)
+            }
+        return entry
+
+    def near(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, dict]]:
+        """(distance_km, entry) within radius_km of a point, nearest first"""
+        self._load()
+        d_lat = radius_km / 111.0
+        d_lon = radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+        lat_lo, lon_lo = self._cell(lat - d_lat, lon - d_lon)
+        lat_hi, lon_hi = self._cell(lat + d_lat, lon + d_lon)
+        found = []
+        for cell_lat in range(lat_lo, lat_hi + 1):
+            for cell_lon in range(lon_lo, lon_hi + 1):
+                for offset in self._grid.get((cell_lat, cell_lon), ()):
+                    entry = self._entry(offset)
+                    coords = entry["coordinates"]
+                    distance = haversine_km(lat, lon, coords["lat"], coords["lon"])
+                    if distance <= radius_km:
+                        found.append((distance, entry))
+        found.sort(key=lambda item: item[0])
+        return found
+
+    def along_route(self, points: Iterable[dict], radius_km: float, limit: int = 0) -> List[dict]:
+        """
+        Entries within radius_km of a route, in route order
+        Consecutive points are interpolated so long polyline segments are covered too
+        """
+        coords = [c for c in (_coordinates(p) for p in points) if c is not None]
+        samples: List[Tuple[float, float]] = coords[:1]
+        for (lat1, lon1), (lat2, lon2) in zip(coords, coords[1:]):
+            steps = max(1, int(haversine_km(lat1, lon1, lat2, lon2) / radius_km))
+            samples.extend(
+                (lat1 + (lat2 - lat1) * i / steps, lon1 + (lon2 - lon1) * i / steps) for i in range(1, steps + 1)
+            )
+        found: Dict[str, dict] = {}
+        for lat, lon in samples:
+            for _, entry in self.near(lat, lon, radius_km):
+                found.setdefault(entry["id"], entry)
+                if limit and len(found) >= limit:
+                    return list(found.values())
+        return list(found.values())
+
+    def matching(self, text: str, limit: int = 0) -> List[dict]:
+        """Entries whose keywords appear in text (e.g. 'Moab, UT to Zion'), in order of mention"""
+        self._load()
+        if self._keyword_re is None or not text:
+            return []
+        found: Dict[str, dict] = {}
+        for match in self._keyword_re.finditer(text.lower()):
+            for offset in self._keywords[match.group(1)]:
+                entry = self._entry(offset)
+                found.setdefault(entry["id"], entry)
+        entries = list(found.values())
+        return entries[:limit] if limit else entries
+
+
+def science_point(entry: dict) -> dict:
+    """A knowledge-base entry in SciencePoint shape (a copy; entries are shared)"""
+    return {
+        "name": entry["name"],
+        "category": entry.get("category", "general"),
+        "coordinates": dict(entry["coordinates"]),
+        "scientific_explanation": entry.get("scientific_explanation", ""),
+        "observation_tips": entry.get("observation_tips", "")
+    }
+
+
+def attach_science_points(data: dict) -> List[dict]:
+    """
+    Set data["science_points"]: landmarks near the route from the knowledge base,
+    then the model's scenic_spot/viewpoint markers that are not one of them
+    """
+    kb, radius = get_landmark_kb(), settings.LANDMARK_RADIUS_KM
+    markers = data.get("markers") or []
+    found = {entry["id"]: entry for entry in kb.along_route(data.get("route_coordinates") or [], radius)}
+    for marker in markers:  # markers are not in route order: look around each one, not between them
+        for entry in kb.along_route([marker.get("coordinates")], radius):
+            found.setdefault(entry["id"], entry)
+    landmarks = list(found.values())
+    points = [science_point(entry) for entry in landmarks]
+    for marker in markers:
+        if marker.get("type") not in ["scenic_spot", "viewpoint"]:
+            continue
+        coords = _coordinates(marker.get("coordinates"))
+        if coords is not None and any(
+            haversine_km(*coords, p["coordinates"]["lat"], p["coordinates"]["lon"]) <= SAME_PLACE_KM for p in points
+        ):
+            continue
+        points.append(marker)
+    metrics.inc("science_points_total", len(landmarks), source="knowledge_base")
+    metrics.inc("science_points_total", len(points) - len(landmarks), source="model")
+    data["science_points"] = points
+    return points
+
+
+_kb: Optional[LandmarkKB] = None
+
+
+def get_landmark_kb() -> LandmarkKB:
+    global _kb
+    if _kb is None:
+        _kb = LandmarkKB(settings.LANDMARK_KB_PATH or DEFAULT_PATH)
+    return _kb
@@ -0,0 +1,175 @@
+"""
+Model tier routing with latency-aware fallback
+A configurable ladder of model/config tiers (MODEL_TIERS). Each call is routed
+by estimated request complexity, skipping tiers whose observed latency or error
+rate is unhealthy, and falls back down the ladder on timeout or error.
+- Backends get the tier's timeout (the Gemini backend passes it to the SDK), so a
+  timed-out call ends instead of running on, billed, in its executor thread;
+  the router's own timeout is a backstop slightly later
+- A degraded tier is probed by one request at a time (marked before dispatch)
+Backends are plain callables, so routing is testable with local fakes
+(tests/test_model_router.py).
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+T = TypeVar("T")
+
+
+@dataclass
+class ModelTier:
+    """One rung of the ladder"""
+    name: str
+    model_name: str
+    max_complexity: float = float("inf")  # only route requests up to this complexity here
+    temperature: float = 0.7
+    timeout_seconds: float = 120.0
+    latency_budget_seconds: float = 60.0  # EWMA latency above this marks the tier degraded
+
+
+class TierStats:
+    """EWMA latency / error rate for a tier"""
+
+    __slots__ = ("latency", "error_rate", "calls", "last_call", "probing")
+
+    def __init__(self):
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.calls = 0
+        self.last_call = 0.0
+        self.probing = False  # a probe of this (degraded) tier is in flight
+
+    def record(self, latency: float, ok: bool, alpha: float) -> None:
+        if self.calls == 0:
+            self.latency = latency
+            self.error_rate = 0.0 if ok else 1.0
+        else:
+            self.latency += alpha * (latency - self.latency)
+            self.error_rate += alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        self.calls += 1
+        self.last_call = time.monotonic()
+
+
+class AllTiersFailed(Exception):
+    """Every candidate tier errored or timed out"""
+
+
+def estimate_complexity(
+    trip_duration: int,
+    interest_count: int = 0,
+    is_round_trip: bool = False,
+    include_offroad: bool = False
+) -> float:
+    """Complexity in 'day equivalents': days plus extra weight for harder requests"""
+    return trip_duration + 0.5 * interest_count + (2 if is_round_trip else 0) + (2 if include_offroad else 0)
+
+
+class ModelRouter:
+    """Chooses tiers per call and records per-tier outcomes"""
+
+    def __init__(
+        self,
+        tiers: List[ModelTier],
+        error_threshold: float = 0.5,
+        probe_after_seconds: float = 30.0,
+        alpha: float = 0.2,
+        timeout_grace_seconds: float = 5.0
+    ):
+        if not tiers:
+            raise ValueError("At least one model tier is required")
+        self.tiers = tiers
+        self.error_threshold = error_threshold
+        self.probe_after_seconds = probe_after_seconds
+        self.alpha = alpha
+        self.timeout_grace_seconds = timeout_grace_seconds  # backstop after the backend's own timeout
+        self.stats: Dict[str, TierStats] = {tier.name: TierStats() for tier in tiers}
+
+    @classmethod
+    def from_settings(cls) -> "ModelRouter":
+        tiers = [ModelTier(**tier) for tier in settings.MODEL_TIERS]
+        return cls(tiers, error_threshold=settings.MODEL_TIER_ERROR_THRESHOLD)
+
+    def is_degraded(self, tier: ModelTier) -> bool:
+        stats = self.stats[tier.name]
+        return stats.calls > 0 and (
+            stats.error_rate > self.error_threshold or stats.latency > tier.latency_budget_seconds
+        )
+
+    def is_healthy(self, tier: ModelTier) -> bool:
+        if not self.is_degraded(tier):
+            return True
+        # Let one request probe a degraded tier now and then so it can recover
+        stats = self.stats[tier.name]
+        return not stats.probing and time.monotonic() - stats.last_call > self.probe_after_seconds
+
+    def candidates(self, complexity: float) -> List[ModelTier]:
+        """Tiers to try, in order: eligible healthy tiers, then eligible degraded ones"""
+        eligible = [tier for tier in self.tiers if complexity <= tier.max_complexity] or list(self.tiers)
+        healthy = [tier for tier in eligible if self.is_healthy(tier)]
+        return healthy + [tier for tier in eligible if tier not in healthy]
+
+    def record(self, tier: ModelTier, latency: float, ok: bool) -> None:
+        self.stats[tier.name].record(latency, ok, self.alpha)
+        metrics.inc("model_calls_total", tier=tier.name, outcome="ok" if ok else "error")
+        metrics.observe("model_latency_seconds", latency, tier=tier.name)
+
+    async def run(self, complexity: float, call: Callable[[ModelTier], Awaitable[T]]) -> T:
+        """Run call(tier) down the candidate ladder until one succeeds"""
+        errors: List[str] = []
+        ladder = self.candidates(complexity)
+        metrics.inc("model_tier_routed_total", tier=ladder[0].name)
+        for position, tier in enumerate(ladder):
+            stats = self.stats[tier.name]
+            started = time.monotonic()
+            probe = self.is_degraded(tier) and not stats.probing
+            if probe:
+                # In flight from now on, so concurrent requests do not all probe
+                stats.probing = True
+                stats.last_call = started
+            try:
+                result = await asyncio.wait_for(call(tier), timeout=tier.timeout_seconds + self.timeout_grace_seconds)
+            except Exception as e:
+                latency = time.monotonic() - started
+                self.record(tier, latency, ok=False)
+                reason = "timeout" if isinstance(e, asyncio.TimeoutError) else str(e) or type(e).__name__
+                errors.append(f"{tier.name}: {reason}")
+                if position + 1 < len(ladder):
+                    metrics.inc("model_fallbacks_total", from_tier=tier.name)
+                    print(f"[ROUTER] Tier {tier.name} failed ({reason}) - falling back to {ladder[position + 1].name}")
+                continue
+            finally:
+                if probe:
+                    stats.probing = False
+            self.record(tier, time.monotonic() - started, ok=True)
+            return result
+        raise AllTiersFailed("; ".join(errors))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-tier health for diagnostics"""
+        return {
+            tier.name: {
+                "model_name": tier.model_name,
+                "healthy": self.is_healthy(tier),
+                "ewma_latency_seconds": round(self.stats[tier.name].latency, 3),
+                "ewma_error_rate": round(self.stats[tier.name].error_rate, 3),
+                "calls": self.stats[tier.name].calls,
+            }
+            for tier in self.tiers
+        }
+
+
+_router: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """Process-wide router so tier statistics survive per-request AIService instances"""
+    global _router
+    if _router is None:
+        _router = ModelRouter.from_settings()
+    return _router
@@ -1,87 +1,259 @@
 """
 Payment service using Stripe API
 Handles $12.99 per itinerary transactions
+Checkout goes through the Stripe REST API on a pooled async client (no
+blocking SDK call on the event loop), with idempotency keys and per-itinerary
+session reuse
+- The key covers the itinerary, customer, redirect URLs and a checkout attempt
+  number; a failed or expired payment (webhook) starts a new attempt, so the
+  next click gets a fresh session instead of the spent one
 """
-from sqlalchemy.ext.asyncio import AsyncSession
-import stripe
+import asyncio
+import hashlib
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.shared_cache import get_shared_cache
 from app.models.payment import PaymentRequest, PaymentResponse
 
-# Initialize Stripe
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from app.services.webhook_queue import (
+    WebhookSignatureError,
+    get_webhook_consumer,
+    get_webhook_queue,
+    verify_signature
+)
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class PaymentError(Exception):
+    """Stripe rejected or could not be reached"""
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def form_encode(params: Dict[str, Any], prefix: str = "") -> List[Tuple[str, str]]:
+    """Stripe's bracketed form encoding: {"a": {"b": [1]}} -> [("a[b][0]", "1")]"""
+    pairs: List[Tuple[str, str]] = []
+    for key, value in params.items():
+        name = f"{prefix}[{key}]" if prefix else str(key)
+        if isinstance(value, dict):
+            pairs.extend(form_encode(value, name))
+        elif isinstance(value, (list, tuple)):
+            for index, item in enumerate(value):
+                item_name = f"{name}[{index}]"
+                if isinstance(item, dict):
+                    pairs.extend(form_encode(item, item_name))
+                else:
+                    pairs.append((item_name, str(item)))
+        elif isinstance(value, bool):
+            pairs.append((name, "true" if value else "false"))
+        elif value is not None:
+            pairs.append((name, str(value)))
+    return pairs
+
+
+def idempotency_key(request: PaymentRequest, attempt: int = 0) -> str:
+    """
+    Same request and attempt -> same key, so retried clicks cannot create a second
+    session; Stripe rejects a reused key with other parameters, so all of them count
+    """
+    raw = "\n".join((
+        request.itinerary_id, request.customer_email.strip().lower(),
+        request.success_url, request.cancel_url, str(attempt)
+    ))
+    return "checkout_" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# Checkout attempt per itinerary when no shared cache is configured
+_attempts: Dict[str, int] = {}
+
+
+def checkout_attempt(itinerary_id: str) -> int:
+    shared = get_shared_cache()
+    if shared is not None:
+        return shared.get("checkout_attempt", itinerary_id) or 0
+    return _attempts.get(itinerary_id, 0)
+
+
+def new_checkout_attempt(itinerary_ids: List[str]) -> None:
+    """The last checkout failed or expired: later clicks create a new session (blocking I/O)"""
+    shared = get_shared_cache()
+    for itinerary_id in itinerary_ids:
+        if shared is not None:
+            attempt = (shared.get("checkout_attempt", itinerary_id) or 0) + 1
+            shared.set("checkout_attempt", itinerary_id, attempt, ttl=settings.CHECKOUT_SESSION_TTL_SECONDS * 2)
+        else:
+            _attempts[itinerary_id] = _attempts.get(itinerary_id, 0) + 1
+
+
+class StripeClient:
+    """Minimal async Stripe REST client over one pooled httpx.AsyncClient"""
+
+    def __init__(self, api_key: str, api_base: str = "https://api.stripe.com", timeout: float = 20.0):
+        import httpx
+
+        self._client = httpx.AsyncClient(
+            base_url=api_base.rstrip("/"),
+            auth=(api_key, ""),
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            headers={"Stripe-Version": settings.STRIPE_API_VERSION} if settings.STRIPE_API_VERSION else None
+        )
+
+    async def post(self, path: str, params: Dict[str, Any], idempotency: Optional[str] = None) -> Dict[str, Any]:
+        headers = {"Idempotency-Key": idempotency} if idempotency else {}
+        started = time.monotonic()
+        try:
+            response = await self._client.post(path, data=form_encode(params), headers=headers)
+        except Exception as e:
+            metrics.inc("stripe_requests_total", outcome="error")
+            raise PaymentError(f"Stripe unreachable: {e}")
+        metrics.observe("stripe_latency_seconds", time.monotonic() - started)
+        body = response.json() if response.content else {}
+        if response.status_code >= 400:
+            metrics.inc("stripe_requests_total", outcome="rejected")
+            message = (body.get("error") or {}).get("message") or f"HTTP {response.status_code}"
+            raise PaymentError(f"Stripe error: {message}", 400 if response.status_code < 500 else 502)
+        metrics.inc("stripe_requests_total", outcome="ok")
+        return body
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+_client: Optional[StripeClient] = None
+
+
+def get_stripe_client() -> StripeClient:
+    """Process-wide pooled client (STRIPE_API_BASE can point at a local stripe-mock)"""
+    global _client
+    if _client is None:
+        if not settings.STRIPE_SECRET_KEY:
+            raise PaymentError("Payments are not configured", 503)
+        _client = StripeClient(settings.STRIPE_SECRET_KEY, settings.STRIPE_API_BASE)
+    return _client
 
 
 class PaymentService:
     """Service for payment processing"""
 
-    def __init__(self, db: AsyncSession):
+    # Checkout sessions per (itinerary, customer) when no shared cache is configured
+    _sessions: Dict[str, Tuple[float, dict]] = {}
+    _pending: Dict[str, asyncio.Future] = {}
+
+    def __init__(self, db: Optional["AsyncSession"] = None, client: Optional[StripeClient] = None):
         self.db = db
+        self.client = client
+
+    def _cached_session(self, key: str) -> Optional[dict]:
+        shared = get_shared_cache()
+        if shared is not None:
+            return shared.get("checkout", key)
+        cached = PaymentService._sessions.get(key)
+        if cached and cached[0] > time.time():
+            return cached[1]
+        PaymentService._sessions.pop(key, None)
+        return None
+
+    def _remember_session(self, key: str, session: dict) -> None:
+        ttl = settings.CHECKOUT_SESSION_TTL_SECONDS
+        shared = get_shared_cache()
+        if shared is not None:
+            shared.set("checkout", key, session, ttl=ttl)
+        else:
+            PaymentService._sessions[key] = (time.time() + ttl, session)
 
     async def create_checkout_session(self, request: PaymentRequest) -> PaymentResponse:
         """
         Create Stripe Checkout session
         Fixed price: $12.99 per itinerary
+        Repeat clicks for the same itinerary and customer reuse the open session
         """
-        try:
-            session = stripe.checkout.Session.create(
-                payment_method_types=["card"],
-                line_items=[
-                    {
-                        "price_data": {
-                            "currency": "usd",
-                            "product_data": {
-                                "name": "AI Roadtrip Itinerary",
-                                "description": f"Premium AI-generated roadtrip plan (ID: {request.itinerary_id})",
-                            },
-                            "unit_amount": int(settings.PRICE_PER_ITINERARY * 100),  # Convert to cents
+        key = idempotency_key(request, checkout_attempt(request.itinerary_id))
+        session = self._cached_session(key)
+        if session is not None:
+            metrics.inc("checkout_sessions_total", outcome="reused")
+        else:
+            pending = PaymentService._pending.get(key)
+            if pending is not None:
+                # Concurrent double click - share the in-flight call
+                session = await asyncio.shield(pending)
+            else:
+                future = asyncio.get_running_loop().create_future()
+                PaymentService._pending[key] = future
+                try:
+                    session = await self._create_session(request, key)
+                    self._remember_session(key, session)
+                    future.set_result(session)
+                except Exception as e:
+                    future.set_exception(e)
+                    future.exception()  # retrieved here; waiters re-raise it
+                    raise
+                finally:
+                    del PaymentService._pending[key]
+                metrics.inc("checkout_sessions_total", outcome="created")
+
+        return PaymentResponse(
+            session_id=session["id"],
+            checkout_url=session["url"],
+            amount=settings.PRICE_PER_ITINERARY,
+            currency="usd"
+        )
+
+    async def _create_session(self, request: PaymentRequest, key: str) -> dict:
+        client = self.client or get_stripe_client()
+        session = await client.post("/v1/checkout/sessions", {
+            "payment_method_types": ["card"],
+            "line_items": [
+                {
+                    "price_data": {
+                        "currency": "usd",
+                        "product_data": {
+                            "name": "AI Roadtrip Itinerary",
+                            "description": f"Premium AI-generated roadtrip plan (ID: {request.itinerary_id})",
                         },
-                        "quantity": 1,
-                    }
-                ],
-                mode="payment",
-                success_url=request.success_url,
-                cancel_url=request.cancel_url,
-                customer_email=request.customer_email,
-                metadata={
-                    "itinerary_id": request.itinerary_id
+                        "unit_amount": int(round(settings.PRICE_PER_ITINERARY * 100)),  # Convert to cents
+                    },
+                    "quantity": 1,
                 }
-            )
-
-            return PaymentResponse(
-                session_id=session.id,
-                checkout_url=session.url,
-                amount=settings.PRICE_PER_ITINERARY,
-                currency="usd"
-            )
-        except Exception as e:
-            raise Exception(f"Failed to create checkout session: {str(e)}")
+            ],
+            "mode": "payment",
+            "success_url": request.success_url,
+            "cancel_url": request.cancel_url,
+            "customer_email": request.customer_email,
+            "client_reference_id": request.itinerary_id,
+            "metadata": {
+                "itinerary_id": request.itinerary_id
+            },
+            # So payment_intent.* webhook events can be mapped back to the itinerary
+            "payment_intent_data": {"metadata": {"itinerary_id": request.itinerary_id}}
+        }, idempotency=key)
+        return {"id": session["id"], "url": session.get("url") or ""}
 
-    async def handle_webhook(self, payload: bytes, sig_header: str):
+    async def handle_webhook(self, payload: bytes, sig_header: str) -> dict:
         """
-        Handle Stripe webhook events
-        Processes payment.succeeded, payment.failed, etc.
+        Verify and enqueue a Stripe webhook event
+        Acknowledged as soon as it is durable; WebhookConsumer applies
+        payment_status in the background. Retried/replayed events are no-ops.
         """
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            raise PaymentError("Webhook secret not configured", 503)
         try:
-            event = stripe.Webhook.construct_event(
-                payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
-            )
-
-            # Handle different event types
-            if event["type"] == "checkout.session.completed":
-                session = event["data"]["object"]
-                itinerary_id = session["metadata"]["itinerary_id"]
-
-                # TODO: Update itinerary payment status in database
-                # await self._update_payment_status(itinerary_id, "completed")
-
-            elif event["type"] == "payment_intent.payment_failed":
-                # TODO: Handle payment failure
-                pass
-
-            return {"status": "processed"}
+            event = verify_signature(payload, sig_header, settings.STRIPE_WEBHOOK_SECRET, settings.WEBHOOK_TOLERANCE_SECONDS)
+        except WebhookSignatureError as e:
+            metrics.inc("webhook_events_total", outcome="rejected")
+            raise PaymentError(str(e), 400)
+        if not event.get("id"):
+            raise PaymentError("Event without id", 400)
 
-        except ValueError as e:
-            raise Exception("Invalid payload")
-        except stripe.error.SignatureVerificationError as e:
-            raise Exception("Invalid signature")
+        is_new = await asyncio.to_thread(get_webhook_queue().enqueue, event)
+        metrics.inc("webhook_events_total", outcome="queued" if is_new else "duplicate")
+        if is_new:
+            get_webhook_consumer().notify()
+        return {"status": "queued" if is_new else "duplicate", "event_id": event["id"]}
@@ -0,0 +1,220 @@
+"""
+Two-phase generation: fast preview, full detail in the background
+- Phase one (AIService.generate_preview) returns the summary, route, vehicle
+  advice, budget and a day outline under a small output budget
+- Phase two generates the full itinerary conditioned on the preview and stores
+  it under the same itinerary_id (detail_level "preview" -> "full")
+- Clients poll GET /api/itinerary/{id}/detail; a preview nobody polls for
+  PREVIEW_KEEPALIVE_SECONDS (or that is DELETEd) is abandoned and its full
+  generation cancelled
+- The attached detail is a new version (X-Itinerary-Version 2), so a refine based
+  on the preview is rejected (409) rather than written over the detail
+- An outcome other than "full" is stored as the preview's detail_level (failed,
+  abandoned, or refined when the preview was refined meanwhile - the detail is
+  then not attached over the refinement), so it outlives this process
+- Without a live generation anywhere (restart, owning worker gone) a preview is
+  reported abandoned rather than generating forever
+Previews are stored detached, so they are never served as a cached full itinerary.
+"""
+import asyncio
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.itinerary import ItineraryRequest, ItineraryResponse
+from app.services.image_service import attach_image_urls, get_image_service
+from app.services.itinerary_service import ItineraryService
+from app.services.refinement_sessions import get_refinement_sessions
+from app.services.scheduler import priority
+
+
+class PendingDetail:
+    """A full generation running behind a preview"""
+
+    __slots__ = ("itinerary_id", "request", "preview", "task", "last_seen", "status", "error", "finished_at")
+
+    def __init__(self, itinerary_id: str, request: ItineraryRequest, preview: dict):
+        self.itinerary_id = itinerary_id
+        self.request = request
+        self.preview = preview
+        self.task: Optional[asyncio.Task] = None
+        self.last_seen = time.time()
+        self.status = "generating"  # -> full | failed | abandoned
+        self.error: Optional[str] = None
+        self.finished_at: Optional[float] = None
+
+
+class PreviewService:
+    """Preview now, full itinerary later, same itinerary_id"""
+
+    # Phase-two generations started by this process, by itinerary_id
+    _pending: Dict[str, PendingDetail] = {}
+
+    def __init__(self, itinerary_service: Optional[ItineraryService] = None):
+        self.itineraries = itinerary_service or ItineraryService()
+        self.ai_service = self.itineraries.ai_service
+        self.store = self.itineraries.store
+
+    async def preview(self, request: ItineraryRequest) -> ItineraryResponse:
+        """Preview response; starts the full generation unless a full itinerary is already stored"""
+        self._prune()
+        self.store.record_request(request)
+        reused = self.itineraries._from_store(request)
+        if reused is not None:
+            return reused  # already full - no second phase needed
+
+        itinerary_id = f"itin_{uuid.uuid4().hex[:12]}"
+        started = time.time()
+        data = await self.ai_service.generate_preview(request)
+        attach_image_urls(data.get("itinerary_daily"))
+        response = self.itineraries._build_response(
+            itinerary_id, datetime.utcnow().isoformat(), request, data, detail_level="preview"
+        )
+        preview = response.model_dump(mode="json")
+        self.store.put(request, preview, detached=True)
+        metrics.observe("preview_seconds", time.time() - started)
+
+        pending = PendingDetail(itinerary_id, request, preview)
+        self._pending[itinerary_id] = pending
+        self._heartbeat(pending)
+        pending.task = asyncio.create_task(self._complete(pending))
+        print(f"[PREVIEW] {itinerary_id} preview ready in {time.time() - started:.1f}s - generating detail")
+        return response
+
+    def detail(self, itinerary_id: str) -> Tuple[str, Optional[dict]]:
+        """
+        (status, itinerary): ("full", itinerary) once attached, else one of
+        generating / failed / abandoned / refined / unknown with None. Counts as a keepalive.
+        """
+        pending = self._pending.get(itinerary_id)
+        if pending is not None:
+            pending.last_seen = time.time()
+        else:
+            self._shared_set("preview_seen", itinerary_id, time.time())
+
+        itinerary = self.store.get(itinerary_id)
+        if itinerary is None:
+            return "unknown", None
+        level = itinerary.get("detail_level", "full")
+        if level == "full":
+            return "full", itinerary
+        if level != "preview":
+            return level, None  # failed / abandoned / refined, recorded when the generation ended
+        if pending is not None:
+            return pending.status, None
+
+        # Started by another worker: it publishes a heartbeat, then the outcome
+        outcome = self._shared_get("preview_status", itinerary_id)
+        if outcome is None or (
+            outcome["status"] == "generating"
+            and time.time() - outcome.get("at", 0) > settings.PREVIEW_KEEPALIVE_SECONDS
+        ):
+            # Nobody is generating it (restart, or the owning worker died)
+            self.store.update(itinerary_id, detail_level="abandoned")
+            return "abandoned", None
+        status = outcome["status"]
+        if status == "full":
+            itinerary = self.store.refresh(itinerary_id)
+            if itinerary is not None and itinerary.get("detail_level") == "full":
+                return "full", itinerary
+            return "generating", None
+        return status, None
+
+    def abandon(self, itinerary_id: str) -> Optional[str]:
+        """Cancel the full generation behind a preview (the preview stays available); None if unknown"""
+        pending = self._pending.get(itinerary_id)
+        if pending is None:
+            itinerary = self.store.get(itinerary_id)
+            if itinerary is None:
+                return None
+            level = itinerary.get("detail_level", "full")
+            if level != "preview":
+                return level  # already ended
+            self._shared_set("preview_abandon", itinerary_id, True)  # the owning worker's watchdog acts on it
+            return "abandoned"
+        if pending.task is not None and not pending.task.done():
+            pending.task.cancel()
+            return "abandoned"
+        return pending.status
+
+    async def _complete(self, pending: PendingDetail) -> None:
+        watchdog = asyncio.create_task(self._watch(pending))
+        try:
+            with priority(self.itineraries.priority_for(pending.itinerary_id)):
+                ai_response = await self.ai_service.generate_itinerary(pending.request, preview=pending.preview)
+            image_slugs = attach_image_urls(ai_response.get("itinerary_daily"))
+            # payment_status may have changed while the detail was generating
+            current = self.store.get(pending.itinerary_id) or pending.preview
+            if current.get("version", 1) != pending.preview.get("version", 1):
+                # Refined meanwhile (refinement sessions): the detail would overwrite it
+                pending.status = "refined"
+                print(f"[PREVIEW] {pending.itinerary_id} refined during generation - detail not attached")
+                return
+            response = self.itineraries._build_response(
+                pending.itinerary_id, current["created_at"], pending.request, ai_response,
+                payment_status=current.get("payment_status", "pending")
+            )
+            full = response.model_dump(mode="json")
+            full["version"] = current.get("version", 1) + 1
+            self.store.put(pending.request, full)
+            get_refinement_sessions().attach(full)
+            pending.status = "full"
+            if settings.IMAGE_PREFETCH:
+                get_image_service().prefetch_in_background(image_slugs)
+            print(f"[PREVIEW] {pending.itinerary_id} full detail attached")
+        except asyncio.CancelledError:
+            pending.status = "abandoned"
+            print(f"[PREVIEW] {pending.itinerary_id} abandoned - full generation cancelled")
+        except Exception as e:
+            pending.status = "failed"
+            pending.error = str(e)
+            print(f"[PREVIEW] {pending.itinerary_id} full generation failed: {e}")
+        finally:
+            watchdog.cancel()
+            pending.finished_at = time.time()
+            if pending.status != "full":
+                self.store.update(pending.itinerary_id, detail_level=pending.status)
+            metrics.inc("preview_detail_total", outcome=pending.status)
+            self._shared_set("preview_status", pending.itinerary_id, {"status": pending.status, "error": pending.error})
+
+    async def _watch(self, pending: PendingDetail) -> None:
+        """Cancel the full generation once the client stops polling (or asks to)"""
+        keepalive = settings.PREVIEW_KEEPALIVE_SECONDS
+        while True:
+            await asyncio.sleep(min(keepalive / 4, 5.0))
+            self._heartbeat(pending)
+            seen = max(pending.last_seen, self._shared_get("preview_seen", pending.itinerary_id) or 0)
+            if time.time() - seen > keepalive or self._shared_get("preview_abandon", pending.itinerary_id):
+                pending.task.cancel()
+                return
+
+    def _heartbeat(self, pending: PendingDetail) -> None:
+        """Tell other workers the generation is still running here"""
+        self._shared_set("preview_status", pending.itinerary_id, {"status": "generating", "at": time.time()})
+
+    def _prune(self) -> None:
+        cutoff = time.time() - settings.PREVIEW_KEEPALIVE_SECONDS
+        for itinerary_id, pending in list(self._pending.items()):
+            if pending.finished_at is not None and pending.finished_at < cutoff:
+                del self._pending[itinerary_id]
+
+    def _shared_get(self, namespace: str, key: str) -> Any:
+        if self.store.shared is None:
+            return None
+        try:
+            return self.store.shared.get(namespace, key)
+        except sqlite3.Error as e:
+            print(f"[PREVIEW] Shared cache read failed: {e}")
+            return None
+
+    def _shared_set(self, namespace: str, key: str, value: Any) -> None:
+        if self.store.shared is None:
+            return
+        try:
+            self.store.shared.set(namespace, key, value, ttl=max(settings.PREVIEW_KEEPALIVE_SECONDS * 10, 3600))
+        except sqlite3.Error as e:
+            print(f"[PREVIEW] Shared cache write failed: {e}")
@@ -0,0 +1,217 @@
+"""
+Rule-based refinement fast path
+Recognizes mechanical refinement requests and applies them locally, so only
+free-form requests pay for a model round-trip:
+- "make it 4 people"      -> rescale budget for the new party size
+- "swap day 2 and 3"      -> reorder days, nights and fuel stops
+- "drop day 5"            -> remove the day, renumber, shrink budget/logistics
+- "start a week later"    -> shift start_date and recompute season_info
+"""
+import copy
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services.budget_engine import BudgetEngine, VARIABLE_FIELDS, _as_float
+
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "a": 1, "an": 1,
+}
+_NUM = r"(\d+|" + "|".join(NUMBER_WORDS) + r")"
+
+# Whole-request patterns only: anything with extra content goes to the model
+_PREFIX = r"^(?:please\s+|can you\s+|could you\s+|i want to\s+|let'?s\s+)?"
+_SUFFIX = r"(?:\s+please)?[\s.!?]*$"
+
+_PATTERNS = [
+    ("set_persons", re.compile(
+        _PREFIX + r"(?:make it|change (?:it )?to|set (?:it )?to|plan for|it'?s|we are|we'?re|now)?\s*(?:for\s+)?"
+        + _NUM + r"\s+(?:people|persons|travell?ers|adults|guests|of us)" + _SUFFIX)),
+    ("swap_days", re.compile(
+        _PREFIX + r"(?:swap|switch|exchange)\s+days?\s+(\d+)\s+(?:and|with|&)\s+(?:day\s+)?(\d+)" + _SUFFIX)),
+    ("drop_day", re.compile(
+        _PREFIX + r"(?:drop|remove|delete|skip|cut)\s+day\s+(\d+)" + _SUFFIX)),
+    ("shift_start", re.compile(
+        _PREFIX + r"(?:start|leave|depart|begin|push (?:the trip|it)|move (?:the trip|it))\s+(?:back\s+)?(?:by\s+)?"
+        + _NUM + r"\s+(day|week)s?\s+(later|earlier|back|forward|sooner)" + _SUFFIX)),
+    ("start_on", re.compile(
+        _PREFIX + r"(?:start|leave|depart|begin)\s+(?:on\s+)?(\d{4}-\d{2}-\d{2})" + _SUFFIX)),
+]
+
+
+def _to_int(token: str) -> int:
+    """Parse a digit string or number word"""
+    return int(token) if token.isdigit() else NUMBER_WORDS[token]
+
+
+def parse_driving_hours(text: Any) -> float:
+    """Parse daily_driving_time strings like '3.5 hrs', '2h 30m', '45 min'"""
+    if isinstance(text, (int, float)):
+        return float(text)
+    if not isinstance(text, str):
+        return 0.0
+    lowered = text.lower()
+    hours = re.search(r"(\d+(?:\.\d+)?)\s*(?:h|hr|hrs|hour|hours)\b", lowered)
+    minutes = re.search(r"(\d+)\s*(?:m|min|mins|minute|minutes)\b", lowered)
+    total = 0.0
+    if hours:
+        total += float(hours.group(1))
+    if minutes:
+        total += int(minutes.group(1)) / 60.0
+    if not hours and not minutes:
+        bare = re.search(r"(\d+(?:\.\d+)?)", lowered)
+        total = float(bare.group(1)) if bare else 0.0
+    return total
+
+
+@dataclass
+class RefinementIntent:
+    """A recognized mechanical edit"""
+    action: str
+    args: Dict[str, Any] = field(default_factory=dict)
+
+
+class RefinementRuleEngine:
+    """Classifies refinement_request text and applies recognized edits locally"""
+
+    def __init__(self, season_info: Callable[[date], str], budget_engine: Optional[BudgetEngine] = None):
+        self.season_info = season_info
+        self.budget_engine = budget_engine or BudgetEngine()
+
+    def classify(self, refinement_request: str) -> Optional[RefinementIntent]:
+        """Return the intent for a mechanical request, or None for free-form text"""
+        text = " ".join(refinement_request.lower().split())
+        for action, pattern in _PATTERNS:
+            match = pattern.match(text)
+            if not match:
+                continue
+            groups = match.groups()
+            if action == "set_persons":
+                return RefinementIntent(action, {"persons": _to_int(groups[0])})
+            if action == "swap_days":
+                return RefinementIntent(action, {"a": int(groups[0]), "b": int(groups[1])})
+            if action == "drop_day":
+                return RefinementIntent(action, {"day": int(groups[0])})
+            if action == "shift_start":
+                days = _to_int(groups[0]) * (7 if groups[1] == "week" else 1)
+                sign = -1 if groups[2] in ("earlier", "forward", "sooner") else 1
+                return RefinementIntent(action, {"days": sign * days})
+            if action == "start_on":
+                try:
+                    return RefinementIntent(action, {"start_date": date.fromisoformat(groups[0])})
+                except ValueError:
+                    return None
+        return None
+
+    def try_apply(self, itinerary: dict, refinement_request: str) -> Optional[Dict[str, Any]]:
+        """Apply the request locally if recognized and valid; None means 'ask the model'"""
+        intent = self.classify(refinement_request)
+        if intent is None:
+            return None
+        data = copy.deepcopy(itinerary)
+        handler = getattr(self, f"_apply_{intent.action}")
+        if not handler(data, **intent.args):
+            return None
+        print(f"[REFINE] Applied locally: {intent.action} {intent.args}")
+        return data
+
+    # ---- Edits (return False when the edit does not fit this itinerary) ----
+
+    def _apply_set_persons(self, data: dict, persons: int) -> bool:
+        if not 1 <= persons <= 12:
+            return False
+        data["budget"] = self.budget_engine.rescale(data.get("itinerary_daily"), data.get("budget"), persons)
+        return True
+
+    def _apply_swap_days(self, data: dict, a: int, b: int) -> bool:
+        days = data.get("itinerary_daily") or []
+        if a == b or not (1 <= a <= len(days) and 1 <= b <= len(days)):
+            return False
+        days[a - 1], days[b - 1] = days[b - 1], days[a - 1]
+        self._renumber_days(days)
+
+        logistics = data.get("logistics") or {}
+        swap = {a: b, b: a}
+        for stop in logistics.get("fuel_stops") or []:
+            stop["day"] = swap.get(stop.get("day"), stop.get("day"))
+        for point in logistics.get("accommodation_points") or []:
+            point["night"] = swap.get(point.get("night"), point.get("night"))
+        logistics["fuel_stops"] = sorted(logistics.get("fuel_stops") or [], key=lambda s: s.get("day", 0))
+        logistics["accommodation_points"] = sorted(
+            logistics.get("accommodation_points") or [], key=lambda p: p.get("night", 0)
+        )
+        return True
+
+    def _apply_drop_day(self, data: dict, day: int) -> bool:
+        days = data.get("itinerary_daily") or []
+        if len(days) < 2 or not 1 <= day <= len(days):
+            return False
+
+        total_hours = sum(parse_driving_hours(d.get("daily_driving_time")) for d in days)
+        dropped = days.pop(day - 1)
+        dropped_hours = parse_driving_hours(dropped.get("daily_driving_time"))
+        self._renumber_days(days)
+
+        logistics = data.setdefault("logistics", {})
+        logistics["fuel_stops"] = self._drop_and_shift(logistics.get("fuel_stops"), "day", day)
+        logistics["accommodation_points"] = self._drop_and_shift(logistics.get("accommodation_points"), "night", day)
+
+        # Driving-dependent figures shrink by the dropped day's share of driving
+        budget = dict(data.get("budget") or {})
+        if total_hours > 0:
+            keep = 1 - dropped_hours / total_hours
+            for key in ("total_distance_km", "estimated_driving_hours"):
+                if key in logistics:
+                    logistics[key] = round(_as_float(logistics[key]) * keep, 1)
+            for key in ("fuel_cost", "toll_fees"):
+                budget[key] = _as_float(budget.get(key)) * keep
+        if not any(_as_float(d.get("daily_budget_per_person")) for d in days):
+            for key in VARIABLE_FIELDS:
+                budget[key] = _as_float(budget.get(key)) * len(days) / (len(days) + 1)
+
+        data["budget"] = self.budget_engine.compute(days, budget)
+        return True
+
+    def _apply_shift_start(self, data: dict, days: int) -> bool:
+        start = self._start_date(data)
+        if start is None:
+            return False
+        return self._apply_start_on(data, start + timedelta(days=days))
+
+    def _apply_start_on(self, data: dict, start_date: date) -> bool:
+        if self._start_date(data) is None:
+            return False
+        data["start_date"] = start_date.isoformat()
+        data["season_info"] = self.season_info(start_date)
+        return True
+
+    # ---- Helpers ----
+
+    def _start_date(self, data: dict) -> Optional[date]:
+        value = data.get("start_date")
+        if isinstance(value, date):
+            return value
+        try:
+            return date.fromisoformat(str(value)) if value else None
+        except ValueError:
+            return None
+
+    def _renumber_days(self, days: List[dict]) -> None:
+        for index, day in enumerate(days, start=1):
+            day["day_number"] = index
+
+    def _drop_and_shift(self, items: Optional[List[dict]], key: str, removed: int) -> List[dict]:
+        """Remove entries pinned to the removed day/night and pull later ones forward"""
+        kept = []
+        for item in items or []:
+            value = item.get(key)
+            if value == removed:
+                continue
+            if isinstance(value, int) and value > removed:
+                item[key] = value - 1
+            kept.append(item)
+        return kept
@@ -0,0 +1,264 @@
+"""
+Server-side refinement sessions
+Clients refine by itinerary_id instead of uploading the whole itinerary each time:
+- The latest version and a bounded history are kept on the server (CompactItinerary)
+- Each refine names the version it was based on; a stale version is a conflict (409)
+- The prompt summary of a version is built once and cached with it
+- Sessions start from the itinerary store and write each new version back to it,
+  so GET by id, exports and checkout always see the latest version
+- The version number is stored with the itinerary, so a session rebuilt after
+  eviction or a restart continues from it (older history is gone, but versions
+  never go backwards and a stale client is still rejected)
+- With the shared cache tier, versions are visible to every gunicorn worker
+"""
+import asyncio
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.shared_cache import SharedCache, get_shared_cache
+from app.models.compact import CompactItinerary
+from app.services.ai_service import compact_summary
+from app.services.itinerary_store import ItineraryStore, get_itinerary_store
+
+
+# Fields a refinement never changes (the model and local edits do not own them)
+IDENTITY_FIELDS = ("itinerary_id", "created_at", "payment_status")
+# Set by the session, never taken from model output
+VERSION_FIELD = "version"
+
+RefineFn = Callable[[dict, str, str], Awaitable[Dict[str, Any]]]
+
+
+class SessionError(Exception):
+    """Unknown itinerary (404) or stale version (409)"""
+
+    def __init__(self, message: str, status_code: int, current_version: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.current_version = current_version
+
+
+class SessionVersion:
+    """One version of an itinerary and the request that produced it"""
+
+    __slots__ = ("version", "itinerary", "refinement_request", "created_at", "_summary")
+
+    def __init__(self, version: int, itinerary: dict, refinement_request: Optional[str], created_at: str):
+        self.version = version
+        self.itinerary = CompactItinerary(itinerary)
+        self.refinement_request = refinement_request
+        self.created_at = created_at
+        self._summary: Optional[str] = None
+
+    def summary(self) -> str:
+        if self._summary is None:
+            self._summary = compact_summary(self.itinerary.to_dict(), settings.REFINE_SUMMARY_MAX_CHARS)
+        return self._summary
+
+    def info(self) -> dict:
+        return {"version": self.version, "refinement_request": self.refinement_request, "created_at": self.created_at}
+
+    def to_record(self) -> dict:
+        return {**self.info(), "itinerary": self.itinerary.to_dict()}
+
+    @classmethod
+    def from_record(cls, record: dict) -> "SessionVersion":
+        return cls(record["version"], record["itinerary"], record.get("refinement_request"), record["created_at"])
+
+
+class RefinementSession:
+    """Version history of one itinerary (oldest first)"""
+
+    __slots__ = ("itinerary_id", "versions", "lock")
+
+    def __init__(self, itinerary_id: str, versions: List[SessionVersion]):
+        self.itinerary_id = itinerary_id
+        self.versions = versions
+        self.lock = asyncio.Lock()
+
+    @property
+    def latest(self) -> SessionVersion:
+        return self.versions[-1]
+
+    def find(self, version: int) -> Optional[SessionVersion]:
+        for entry in self.versions:
+            if entry.version == version:
+                return entry
+        return None
+
+
+class RefinementSessions:
+    """Bounded LRU of sessions, seeded from and written back to the itinerary store"""
+
+    def __init__(
+        self,
+        store: ItineraryStore,
+        max_sessions: int = 200,
+        history_limit: int = 10,
+        shared: Optional[SharedCache] = None
+    ):
+        self.store = store
+        self.max_sessions = max_sessions
+        self.history_limit = max(history_limit, 1)
+        self.shared = shared
+        self._sessions: "OrderedDict[str, RefinementSession]" = OrderedDict()
+
+    def get(self, itinerary_id: str) -> Optional[RefinementSession]:
+        """Session for an itinerary (seeded from the stored itinerary and its version), or None if unknown"""
+        session = self._sessions.get(itinerary_id)
+        if session is None:
+            session = self._load_shared(itinerary_id)
+            if session is None:
+                itinerary = self.store.get(itinerary_id)
+                if itinerary is None:
+                    return None
+                session = RefinementSession(itinerary_id, [SessionVersion(
+                    itinerary.get(VERSION_FIELD) or 1, itinerary, None,
+                    itinerary.get("created_at") or datetime.utcnow().isoformat()
+                )])
+            self._sessions[itinerary_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sync(session)
+        self._sessions.move_to_end(itinerary_id)
+        return session
+
+    def attach(self, itinerary: dict) -> SessionVersion:
+        """
+        Record a version written outside refine (the full detail behind a preview), so
+        sessions seeded from the earlier content move on and its clients get a 409
+        """
+        itinerary_id = itinerary["itinerary_id"]
+        new = SessionVersion(
+            itinerary.get(VERSION_FIELD) or 1, itinerary, None, datetime.utcnow().isoformat()
+        )
+        session = self._sessions.get(itinerary_id)
+        if session is None or session.latest.version >= new.version:
+            session = self._sessions[itinerary_id] = RefinementSession(itinerary_id, [new])
+        else:
+            session.versions.append(new)
+            del session.versions[:-self.history_limit]
+        self._sessions.move_to_end(itinerary_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        self._share(session, new)
+        return new
+
+    async def refine(self, itinerary_id: str, refinement_request: str, version: int, refine_fn: RefineFn) -> SessionVersion:
+        """
+        Refine the latest version if the client saw it
+        refine_fn(current_itinerary, refinement_request, summary) returns the refined dict
+        """
+        session = self.get(itinerary_id)
+        if session is None:
+            raise SessionError(f"Itinerary {itinerary_id} not found", 404)
+
+        # Serializes refines of one itinerary in this worker; the loser sees a stale version
+        async with session.lock:
+            self._sync(session)
+            current = session.latest
+            if version != current.version:
+                raise SessionError(
+                    f"Version {version} is stale; latest is {current.version}", 409, current.version
+                )
+            current_itinerary = current.itinerary.to_dict()
+            refined = await refine_fn(current_itinerary, refinement_request, current.summary())
+
+            # Another worker may have committed while the model was running
+            self._sync(session)
+            if session.latest.version != current.version:
+                raise SessionError(
+                    f"Version {version} was refined concurrently; latest is {session.latest.version}",
+                    409, session.latest.version
+                )
+
+            changes = {k: v for k, v in refined.items() if k not in IDENTITY_FIELDS}
+            changes[VERSION_FIELD] = current.version + 1
+            # Identity comes from the store: payment_status may have moved on since version 1
+            stored = self.store.get(itinerary_id) or current_itinerary
+            identity = {field: stored[field] for field in IDENTITY_FIELDS if field in stored}
+
+            # Fields refine_fn dropped are kept, and the store gets the same content as the session
+            itinerary = {**current_itinerary, **identity, **changes}
+            new = SessionVersion(current.version + 1, itinerary, refinement_request, datetime.utcnow().isoformat())
+            session.versions.append(new)
+            del session.versions[:-self.history_limit]
+            self.store.update(itinerary_id, detach=True, **{
+                k: v for k, v in itinerary.items() if k not in IDENTITY_FIELDS
+            })
+            self._share(session, new)
+            print(f"[REFINE] {itinerary_id} -> version {new.version}")
+            return new
+
+    # ---- Shared tier: head pointer plus one record per version ----
+
+    def _share(self, session: RefinementSession, new: SessionVersion) -> None:
+        if self.shared is None:
+            return
+        try:
+            # The seed version is shared along with the first refine
+            for entry in (session.versions if len(session.versions) == 2 else [new]):
+                self.shared.set("refine_version", f"{session.itinerary_id}:{entry.version}", entry.to_record())
+            self.shared.set("refine_head", session.itinerary_id, {
+                "version": new.version, "first": session.versions[0].version
+            })
+        except sqlite3.Error as e:
+            print(f"[REFINE] Shared cache write failed: {e}")
+
+    def _head(self, itinerary_id: str) -> Optional[dict]:
+        if self.shared is None:
+            return None
+        try:
+            return self.shared.get("refine_head", itinerary_id)
+        except sqlite3.Error as e:
+            print(f"[REFINE] Shared cache read failed: {e}")
+            return None
+
+    def _versions(self, itinerary_id: str, first: int, last: int) -> List[SessionVersion]:
+        versions = []
+        try:
+            for number in range(max(first, last - self.history_limit + 1), last + 1):
+                record = self.shared.get("refine_version", f"{itinerary_id}:{number}")
+                if record is not None:
+                    versions.append(SessionVersion.from_record(record))
+        except sqlite3.Error as e:
+            print(f"[REFINE] Shared cache read failed: {e}")
+        return versions
+
+    def _load_shared(self, itinerary_id: str) -> Optional[RefinementSession]:
+        head = self._head(itinerary_id)
+        if head is None:
+            return None
+        versions = self._versions(itinerary_id, head["first"], head["version"])
+        if not versions or versions[-1].version != head["version"]:
+            return None
+        return RefinementSession(itinerary_id, versions)
+
+    def _sync(self, session: RefinementSession) -> None:
+        """Pull versions committed by other workers"""
+        head = self._head(session.itinerary_id)
+        if head is None or head["version"] <= session.latest.version:
+            return
+        newer = self._versions(session.itinerary_id, session.latest.version + 1, head["version"])
+        if newer and newer[-1].version == head["version"]:
+            session.versions.extend(newer)
+            del session.versions[:-self.history_limit]
+
+
+_sessions: Optional[RefinementSessions] = None
+
+
+def get_refinement_sessions() -> RefinementSessions:
+    global _sessions
+    if _sessions is None:
+        _sessions = RefinementSessions(
+            get_itinerary_store(),
+            max_sessions=settings.REFINE_SESSION_CACHE_SIZE,
+            history_limit=settings.REFINE_HISTORY_LIMIT,
+            shared=get_shared_cache()
+        )
+    return _sessions
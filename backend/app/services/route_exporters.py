@@ -0,0 +1,185 @@
+"""
+Lightweight streaming exports (no WeasyPrint)
+Generator-based writers that yield the document line by line, so memory stays
+constant regardless of trip length:
+- GPX 1.1: markers and fuel stops as waypoints, route_coordinates as a track
+- KML 2.2: the same as placemarks plus a LineString
+- iCalendar: one event per morning/afternoon/evening block of each day
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+
+Itinerary = Dict[str, Any]
+
+SLOTS = ("morning", "afternoon", "evening")
+
+
+def _point(value: Any) -> Optional[Tuple[float, float]]:
+    """(lat, lon) from {"lat", "lon"} (or "lng"), or None when unusable"""
+    if not isinstance(value, dict):
+        return None
+    try:
+        return float(value["lat"]), float(value.get("lon", value.get("lng")))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _waypoints(itinerary: Itinerary) -> Iterator[Tuple[Tuple[float, float], str, str]]:
+    """(point, name, kind) for markers, then fuel stops"""
+    for marker in itinerary.get("markers") or []:
+        point = _point(marker.get("coordinates"))
+        if point:
+            yield point, str(marker.get("name", "")), str(marker.get("type", "marker"))
+    for stop in (itinerary.get("logistics") or {}).get("fuel_stops") or []:
+        point = _point(stop.get("coordinates"))
+        if point:
+            yield point, f"Day {stop.get('day', '?')} fuel: {stop.get('location', '')}", "fuel"
+
+
+def _route(itinerary: Itinerary) -> Iterator[Tuple[float, float]]:
+    for coordinate in itinerary.get("route_coordinates") or []:
+        point = _point(coordinate)
+        if point:
+            yield point
+
+
+def _title(itinerary: Itinerary) -> str:
+    return str(itinerary.get("trip_summary") or "AI Roadtrip Genie itinerary")
+
+
+def gpx_lines(itinerary: Itinerary) -> Iterator[str]:
+    """GPX 1.1 document"""
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<gpx version="1.1" creator="AI Roadtrip Genie" xmlns="http://www.topografix.com/GPX/1/1">\n'
+    yield f"  <metadata><name>{escape(_title(itinerary))}</name></metadata>\n"
+    for (lat, lon), name, kind in _waypoints(itinerary):
+        yield f'  <wpt lat="{lat:.6f}" lon="{lon:.6f}"><name>{escape(name)}</name><type>{escape(kind)}</type></wpt>\n'
+    yield f"  <trk><name>{escape(_title(itinerary))}</name><trkseg>\n"
+    for lat, lon in _route(itinerary):
+        yield f'    <trkpt lat="{lat:.6f}" lon="{lon:.6f}"/>\n'
+    yield "  </trkseg></trk>\n"
+    yield "</gpx>\n"
+
+
+def kml_lines(itinerary: Itinerary) -> Iterator[str]:
+    """KML 2.2 document (KML orders coordinates lon,lat)"""
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n'
+    yield f"  <name>{escape(_title(itinerary))}</name>\n"
+    yield '  <Style id="route"><LineStyle><color>ff2f6bff</color><width>4</width></LineStyle></Style>\n'
+    for (lat, lon), name, kind in _waypoints(itinerary):
+        yield (
+            f"  <Placemark><name>{escape(name)}</name><description>{escape(kind)}</description>"
+            f"<Point><coordinates>{lon:.6f},{lat:.6f}</coordinates></Point></Placemark>\n"
+        )
+    yield "  <Placemark><name>Route</name><styleUrl>#route</styleUrl><LineString><tessellate>1</tessellate><coordinates>\n"
+    for lat, lon in _route(itinerary):
+        yield f"    {lon:.6f},{lat:.6f}\n"
+    yield "  </coordinates></LineString></Placemark>\n"
+    yield "</Document></kml>\n"
+
+
+def _ics_text(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ics_line(line: str) -> str:
+    """Fold to 75 octets per RFC 5545 (continuation lines start with a space)"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts, current, size = [], "", 0
+    for ch in line:
+        width = len(ch.encode("utf-8"))
+        if size + width > (75 if not parts else 74):
+            parts.append(current)
+            current, size = "", 0
+        current += ch
+        size += width
+    parts.append(current)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _start_date(itinerary: Itinerary) -> date:
+    value = itinerary.get("start_date")
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        return date.today()
+
+
+def _block_start(day_date: date, start_time: Any) -> Optional[datetime]:
+    try:
+        hour, minute = (int(part) for part in str(start_time).strip().split(":")[:2])
+        return datetime(day_date.year, day_date.month, day_date.day, hour, minute)
+    except (TypeError, ValueError):
+        return None
+
+
+def ics_lines(itinerary: Itinerary) -> Iterator[str]:
+    """iCalendar with floating local times (the traveller's local time at each stop)"""
+    itinerary_id = itinerary.get("itinerary_id", "itinerary")
+    first_day = _start_date(itinerary)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    yield _ics_line("BEGIN:VCALENDAR")
+    yield _ics_line("VERSION:2.0")
+    yield _ics_line("PRODID:-//AI Roadtrip Genie//Itinerary//EN")
+    yield _ics_line("CALSCALE:GREGORIAN")
+    yield _ics_line(f"X-WR-CALNAME:{_ics_text(_title(itinerary))}")
+    for day in itinerary.get("itinerary_daily") or []:
+        try:
+            number = int(day.get("day_number"))
+        except (TypeError, ValueError):
+            continue
+        day_date = first_day + timedelta(days=number - 1)
+        location = str(day.get("location", "")).strip()
+        for slot in SLOTS:
+            block = day.get(slot)
+            if not isinstance(block, dict):
+                continue
+            start = _block_start(day_date, block.get("start_time"))
+            if start is None:
+                continue
+            try:
+                minutes = max(int(block.get("duration_minutes") or 60), 1)
+            except (TypeError, ValueError):
+                minutes = 60
+            end = start + timedelta(minutes=minutes)
+            tip = block.get("photo_tip") or block.get("logistics") or block.get("dining_tip") or ""
+            description = str(block.get("activity", "")) + (f"\n\nTip: {tip}" if tip else "")
+            yield _ics_line("BEGIN:VEVENT")
+            yield _ics_line(f"UID:{itinerary_id}-d{number}-{slot}@roadtripgenie")
+            yield _ics_line(f"DTSTAMP:{stamp}")
+            yield _ics_line(f"DTSTART:{start:%Y%m%dT%H%M%S}")
+            yield _ics_line(f"DTEND:{end:%Y%m%dT%H%M%S}")
+            yield _ics_line(f"SUMMARY:{_ics_text(f'Day {number} {slot}: {location}')}")
+            yield _ics_line(f"LOCATION:{_ics_text(location)}")
+            yield _ics_line(f"DESCRIPTION:{_ics_text(description)}")
+            yield _ics_line("END:VEVENT")
+    yield _ics_line("END:VCALENDAR")
+
+
+def buffered(lines: Iterable[str], size: int = 16384) -> Iterator[bytes]:
+    """Group small lines into ~size byte chunks (fewer writes when streaming)"""
+    chunk: List[str] = []
+    length = 0
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(chunk).encode("utf-8")
+            chunk, length = [], 0
+    if chunk:
+        yield "".join(chunk).encode("utf-8")
+
+
+# format -> (writer, media type, file extension)
+EXPORT_FORMATS: Dict[str, Tuple[Callable[[Itinerary], Iterator[str]], str, str]] = {
+    "gpx": (gpx_lines, "application/gpx+xml", "gpx"),
+    "kml": (kml_lines, "application/vnd.google-earth.kml+xml", "kml"),
+    "ics": (ics_lines, "text/calendar; charset=utf-8", "ics"),
+}
@@ -0,0 +1,306 @@
+"""
+Local waypoint ordering
+Orders stops without a model call, so backtracking loops are caught before they
+reach the traveller:
+- Distance matrix over start, stops and end in one pass (haversine x ROUTE_ROAD_FACTOR),
+  in plain Python: itineraries carry a few dozen stops at most, too few for numpy
+- Nearest-neighbour construction plus 2-opt; open path or round trip (is_round_trip)
+- Ordered stops are split into driving days under ROUTE_MAX_DAILY_DRIVING_HOURS
+- skeleton() gives generation and refine prompts a pre-ordered plan, so the model
+  writes days, stops and totals for a good order in the first place
+- check() never rewrites model output (days, fuel stops and totals follow the
+  model's order, and straight-line savings are no measure of road distance); when
+  reordering would save at least ROUTE_REORDER_MIN_SAVING it adds a trip-wide
+  route_backtracking entry to schedule_warnings
+"""
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+EARTH_RADIUS_KM = 6371.0
+MAX_TWO_OPT_PASSES = 50
+
+Point = Tuple[float, float]
+
+
+def _coordinates(point: Any) -> Optional[Point]:
+    try:
+        return float(point["lat"]), float(point["lon"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def distance_matrix(points: Sequence[Point], scale: float = 1.0) -> List[List[float]]:
+    """Pairwise great-circle distances in km (times scale), as nested lists"""
+    n = len(points)
+    lats = [math.radians(p[0]) for p in points]
+    lons = [math.radians(p[1]) for p in points]
+    cosines = [math.cos(lat) for lat in lats]
+    factor = 2 * EARTH_RADIUS_KM * scale
+    matrix = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        row = matrix[i]
+        for j in range(i + 1, n):
+            a = math.sin((lats[j] - lats[i]) / 2) ** 2 + cosines[i] * cosines[j] * math.sin((lons[j] - lons[i]) / 2) ** 2
+            row[j] = matrix[j][i] = factor * math.asin(min(1.0, math.sqrt(a)))
+    return matrix
+
+
+def path_length(matrix: List[List[float]], path: Sequence[int]) -> float:
+    return sum(matrix[a][b] for a, b in zip(path, path[1:]))
+
+
+def nearest_neighbour(matrix: List[List[float]], start: int, nodes: Sequence[int]) -> List[int]:
+    """Greedy order of nodes starting from start (start included first)"""
+    path, remaining = [start], set(nodes)
+    while remaining:
+        row = matrix[path[-1]]
+        nxt = min(remaining, key=lambda node: row[node])
+        path.append(nxt)
+        remaining.remove(nxt)
+    return path
+
+
+def two_opt(matrix: List[List[float]], path: List[int], fixed_end: bool) -> List[int]:
+    """
+    Reverse segments while that shortens the path; path[0] stays first, and
+    path[-1] stays last when fixed_end (a round trip ends at its start)
+    """
+    path = list(path)
+    n = len(path)
+    last = n - 1 if fixed_end else n  # exclusive bound for movable positions
+    for _ in range(MAX_TWO_OPT_PASSES):
+        improved = False
+        for i in range(1, last - 1):
+            a, b = path[i - 1], path[i]
+            for j in range(i + 1, last):
+                c = path[j]
+                delta = matrix[a][c] - matrix[a][b]
+                if j + 1 < n:
+                    e = path[j + 1]
+                    delta += matrix[b][e] - matrix[c][e]
+                if delta < -1e-9:
+                    path[i:j + 1] = path[i:j + 1][::-1]
+                    b = path[i]
+                    improved = True
+        if not improved:
+            break
+    return path
+
+
+def split_days(legs: Sequence[float], days: int) -> List[int]:
+    """
+    Cut a sequence of leg distances into at most `days` consecutive groups with the
+    smallest possible longest group; returns the index of the first leg of each group
+    """
+    if not legs:
+        return []
+    days = max(1, min(days, len(legs)))
+
+    def groups_needed(cap: float) -> int:
+        count, total = 1, 0.0
+        for leg in legs:
+            if total + leg > cap and total > 0:
+                count, total = count + 1, 0.0
+            total += leg
+        return count
+
+    low, high = max(legs), sum(legs)
+    for _ in range(40):  # bisection on the cap; 40 halvings is well below a metre
+        mid = (low + high) / 2
+        if groups_needed(mid) <= days:
+            high = mid
+        else:
+            low = mid
+    starts, total = [0], 0.0
+    for index, leg in enumerate(legs):
+        if total + leg > high and total > 0:
+            starts.append(index)
+            total = 0.0
+        total += leg
+    return starts
+
+
+@dataclass
+class RoutePlan:
+    """Visiting order of the stops and how it splits into driving days"""
+    order: List[int]  # stop indexes in visiting order
+    distance_km: float
+    original_km: float  # stops in the given order
+    days: List[Dict[str, Any]] = field(default_factory=list)  # {"stops": [...], "distance_km", "hours"}
+
+    @property
+    def saving(self) -> float:
+        return 1 - self.distance_km / self.original_km if self.original_km > 0 else 0.0
+
+
+class RouteOptimizer:
+    """Orders stops between a start and an (optional) end point"""
+
+    def __init__(
+        self,
+        road_factor: float = 1.3,
+        speed_kmh: float = 80.0,
+        max_daily_hours: float = 6.0,
+        min_saving: float = 0.05
+    ):
+        self.road_factor = road_factor
+        self.speed_kmh = speed_kmh
+        self.max_daily_hours = max_daily_hours
+        self.min_saving = min_saving
+
+    @classmethod
+    def from_settings(cls) -> "RouteOptimizer":
+        return cls(
+            settings.ROUTE_ROAD_FACTOR,
+            settings.ROUTE_AVG_SPEED_KMH,
+            settings.ROUTE_MAX_DAILY_DRIVING_HOURS,
+            settings.ROUTE_REORDER_MIN_SAVING
+        )
+
+    def plan(
+        self,
+        start: Point,
+        stops: Sequence[Point],
+        end: Optional[Point] = None,
+        round_trip: bool = False,
+        days: int = 0
+    ) -> RoutePlan:
+        """
+        Best order found for the stops; end is fixed when given (round trips end at
+        start). The given order is kept as a candidate, so the result is never worse.
+        """
+        points = [start, *stops]
+        fixed_end = round_trip or end is not None
+        if fixed_end:
+            points.append(start if round_trip else end)
+        matrix = distance_matrix(points, self.road_factor)
+        inner = list(range(1, len(stops) + 1))
+        tail = [len(points) - 1] if fixed_end else []
+
+        given = [0, *inner, *tail]
+        greedy = nearest_neighbour(matrix, 0, inner) + tail
+        candidates = [two_opt(matrix, given, fixed_end), two_opt(matrix, greedy, fixed_end)]
+        best = min(candidates, key=lambda path: path_length(matrix, path))
+
+        plan = RoutePlan(
+            order=[node - 1 for node in best[1:len(stops) + 1]],
+            distance_km=path_length(matrix, best),
+            original_km=path_length(matrix, given)
+        )
+        if days:
+            plan.days = self._days(matrix, best, days, len(stops))
+        return plan
+
+    def _days(self, matrix: List[List[float]], path: List[int], days: int, stop_count: int) -> List[Dict[str, Any]]:
+        """As few driving days as the daily limit allows (at most `days`), balanced"""
+        legs = [matrix[a][b] for a, b in zip(path, path[1:])]
+        if not legs:
+            return []
+        limit_km = self.max_daily_hours * self.speed_kmh
+        most = max(1, min(days, len(legs)))
+        groups = min(max(1, math.ceil(sum(legs) / limit_km)), most)
+        while True:
+            starts = split_days(legs, groups)
+            bounds = list(zip(starts, starts[1:] + [len(legs)]))
+            if groups >= most or max(sum(legs[i:j]) for i, j in bounds) <= limit_km:
+                break
+            groups += 1
+
+        result = []
+        for begin, finish in bounds:
+            km = sum(legs[begin:finish])
+            # Leg k arrives at path[k + 1]; nodes 1..stop_count are the stops
+            arrivals = [path[k + 1] - 1 for k in range(begin, finish) if 1 <= path[k + 1] <= stop_count]
+            result.append({"stops": arrivals, "distance_km": round(km, 1), "hours": round(km / self.speed_kmh, 1)})
+        return result
+
+    # ---- Model output ----
+
+    def check(self, data: Dict[str, Any]) -> Optional[dict]:
+        """
+        Warn when the model's stop order backtracks; the itinerary itself is left as
+        generated. Replaces an earlier route_backtracking entry in
+        data["schedule_warnings"] (run it after the schedule checker, which resets
+        the list); returns the warning, or None
+        """
+        warnings = [w for w in data.get("schedule_warnings") or [] if w.get("code") != "route_backtracking"]
+        route = data.get("route_coordinates") or []
+        start = _coordinates(route[0]) if route else None
+        warning = None
+        markers = sorted(
+            (m for m in data.get("markers") or [] if isinstance(m, dict)), key=lambda m: m.get("sequence") or 0
+        )
+        marker_points = [_coordinates(m.get("coordinates")) for m in markers]
+        if len(markers) >= 3 and start is not None and None not in marker_points:
+            round_trip = bool(data.get("is_round_trip"))
+            end = None if round_trip else _coordinates(route[-1])
+            plan = self.plan(start, marker_points, end=end, round_trip=round_trip)
+            if plan.saving >= self.min_saving:
+                names = " -> ".join(str(markers[i].get("name") or "?") for i in plan.order)
+                warning = self._backtracking(plan, f"visiting the stops as {names}", "marker")
+        else:
+            route_points = [_coordinates(p) for p in route]
+            if len(route) >= 4 and None not in route_points:
+                # Interior points may move; the ends (equal on a round trip) stay put
+                plan = self.plan(route_points[0], route_points[1:-1], end=route_points[-1])
+                if plan.saving >= self.min_saving:
+                    warning = self._backtracking(plan, "reordering the route points", "route")
+        if warning is not None:
+            warnings.append(warning)
+        data["schedule_warnings"] = warnings
+        return warning
+
+    def _backtracking(self, plan: RoutePlan, remedy: str, part: str) -> dict:
+        metrics.inc("route_backtracking_total", part=part)
+        print(f"[ROUTE] Model order backtracks ({part}: reordering saves {plan.saving:.0%})")
+        return {
+            "day": None,
+            "block": None,
+            "code": "route_backtracking",
+            "message": (
+                f"The route backtracks: {remedy} would shorten it by about {plan.saving:.0%} "
+                f"(straight-line estimate). Ask for a refinement to reorder the trip."
+            ),
+        }
+
+    # ---- Prompt skeleton ----
+
+    def skeleton(self, itinerary: Dict[str, Any], days: int) -> str:
+        """
+        Pre-ordered stop plan for a prompt, from an itinerary's markers and route ends
+        (a preview or the version being refined); "" when there is nothing to order
+        """
+        route = itinerary.get("route_coordinates") or []
+        markers = [m for m in itinerary.get("markers") or [] if _coordinates(m.get("coordinates")) is not None]
+        start = _coordinates(route[0]) if route else None
+        if start is None or len(markers) < 2:
+            return ""
+        round_trip = bool(itinerary.get("is_round_trip"))
+        end = None if round_trip else _coordinates(route[-1])
+        plan = self.plan(start, [_coordinates(m["coordinates"]) for m in markers], end, round_trip, days)
+
+        lines = [
+            f"ROUTE SKELETON (stop order optimized locally; max {self.max_daily_hours:g} h driving "
+            f"per day, ~{plan.distance_km:.0f} km total):"
+        ]
+        for number, day in enumerate(plan.days, 1):
+            names = " -> ".join(markers[i].get("name", "?") for i in day["stops"]) or "return to start"
+            lines.append(f"- Leg {number}: {names} (~{day['distance_km']:.0f} km, {day['hours']:g} h)")
+        if any(day["hours"] > self.max_daily_hours for day in plan.days):
+            lines.append("- Some legs exceed the daily limit: add an overnight stop between them.")
+        return "\n".join(lines)
+
+
+_optimizer: Optional[RouteOptimizer] = None
+
+
+def get_route_optimizer() -> RouteOptimizer:
+    global _optimizer
+    if _optimizer is None:
+        _optimizer = RouteOptimizer.from_settings()
+    return _optimizer
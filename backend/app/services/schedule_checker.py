@@ -0,0 +1,314 @@
+"""
+Schedule feasibility check with local repair
+One pass over itinerary_daily after generation or refinement:
+- Time blocks: morning/afternoon/evening must not overlap -> later blocks are shifted
+- Daylight: morning may start up to PRE_DAWN_MINUTES before sunrise (blue hour),
+  afternoon must end by sunset + SCHEDULE_DAYLIGHT_MARGIN_MINUTES -> moved earlier
+  or shortened; sunrise/sunset from the day's position and date (NOAA approximation)
+- Driving: daily_driving_time must cover the distance between consecutive overnight
+  locations -> understated days are corrected, and hours the model put on the
+  neighbouring day are moved back (rebalanced); days over the daily limit are reported
+What cannot be repaired locally becomes a structured schedule_warnings entry.
+"""
+import math
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.landmark_kb import get_landmark_kb, haversine_km
+from app.services.refinement_rules import parse_driving_hours
+
+
+BLOCKS = ("morning", "afternoon", "evening")
+PRE_DAWN_MINUTES = 60  # sunrise photography sets up in the blue hour
+DAY_END_MINUTES = 24 * 60
+MIN_BLOCK_MINUTES = 45  # shorter than this is not worth keeping as a block
+MAX_ACTIVE_MINUTES = 16 * 60  # blocks plus driving beyond this is an overbooked day
+_TIME = re.compile(r"^\s*(\d{1,2}):(\d{2})")
+
+Point = Tuple[float, float]
+
+
+def _minutes(value: Any) -> Optional[int]:
+    match = _TIME.match(value) if isinstance(value, str) else None
+    if match is None or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def _clock(minutes: int) -> str:
+    minutes = max(0, min(int(minutes), DAY_END_MINUTES - 1))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _coordinates(point: Any) -> Optional[Point]:
+    try:
+        return float(point["lat"]), float(point["lon"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _us_dst(day: date) -> bool:
+    """US daylight saving: second Sunday of March to first Sunday of November"""
+    march = date(day.year, 3, 8)
+    november = date(day.year, 11, 1)
+    begins = march + timedelta(days=(6 - march.weekday()) % 7)
+    ends = november + timedelta(days=(6 - november.weekday()) % 7)
+    return begins <= day < ends
+
+
+def _utc_offset_minutes(lat: float, lon: float, day: date) -> int:
+    """
+    Approximate local clock offset: US zones by longitude band (Arizona without DST),
+    elsewhere the nearest 15-degree meridian
+    """
+    if 24.0 <= lat <= 50.0 and -125.0 <= lon <= -66.0:
+        hours = -8 if lon < -114.5 else -7 if lon < -102.0 else -6 if lon < -86.5 else -5
+        arizona = 31.3 <= lat <= 37.0 and -114.8 <= lon <= -109.05
+        return (hours + (1 if _us_dst(day) and not arizona else 0)) * 60
+    return round(lon / 15) * 60
+
+
+def daylight(lat: float, lon: float, day: date) -> Optional[Tuple[int, int]]:
+    """
+    (sunrise, sunset) in local clock minutes, or None during polar day/night
+    Zone borders are approximated (_utc_offset_minutes); the daylight margin absorbs the rest
+    """
+    gamma = 2 * math.pi / 365 * (day.timetuple().tm_yday - 1)
+    eqtime = 229.18 * (0.000075 + 0.001868 * math.cos(gamma) - 0.032077 * math.sin(gamma)
+                       - 0.014615 * math.cos(2 * gamma) - 0.040849 * math.sin(2 * gamma))
+    decl = (0.006918 - 0.399912 * math.cos(gamma) + 0.070257 * math.sin(gamma)
+            - 0.006758 * math.cos(2 * gamma) + 0.000907 * math.sin(2 * gamma)
+            - 0.002697 * math.cos(3 * gamma) + 0.00148 * math.sin(3 * gamma))
+    phi = math.radians(lat)
+    cos_ha = math.cos(math.radians(90.833)) / (math.cos(phi) * math.cos(decl)) - math.tan(phi) * math.tan(decl)
+    if abs(cos_ha) > 1:
+        return None
+    ha = math.degrees(math.acos(cos_ha))
+    offset = _utc_offset_minutes(lat, lon, day)
+    sunrise = 720 - 4 * (lon + ha) - eqtime + offset
+    sunset = 720 - 4 * (lon - ha) - eqtime + offset
+    return int(round(sunrise)), int(round(sunset))
+
+
+class ScheduleChecker:
+    """Finds and locally repairs infeasible day schedules"""
+
+    def __init__(
+        self,
+        road_factor: float = 1.3,
+        speed_kmh: float = 80.0,
+        max_daily_hours: float = 6.0,
+        daylight_margin: int = 30
+    ):
+        self.road_factor = road_factor
+        self.speed_kmh = speed_kmh
+        self.max_daily_hours = max_daily_hours
+        self.daylight_margin = daylight_margin
+
+    @classmethod
+    def from_settings(cls) -> "ScheduleChecker":
+        return cls(
+            settings.ROUTE_ROAD_FACTOR,
+            settings.ROUTE_AVG_SPEED_KMH,
+            settings.ROUTE_MAX_DAILY_DRIVING_HOURS,
+            settings.SCHEDULE_DAYLIGHT_MARGIN_MINUTES
+        )
+
+    def check(self, data: Dict[str, Any], start_date: Any = None) -> List[dict]:
+        """Repair data["itinerary_daily"] in place; sets and returns data["schedule_warnings"]"""
+        days = [day for day in data.get("itinerary_daily") or [] if isinstance(day, dict)]
+        if isinstance(start_date, str):
+            try:
+                start_date = date.fromisoformat(start_date[:10])
+            except ValueError:
+                start_date = None
+        route = [c for c in (_coordinates(p) for p in data.get("route_coordinates") or []) if c is not None]
+        markers = [
+            (str(m.get("name") or "").lower(), _coordinates(m.get("coordinates")))
+            for m in data.get("markers") or [] if isinstance(m, dict)
+        ]
+        fuel_stops: Dict[int, Point] = {}
+        for stop in (data.get("logistics") or {}).get("fuel_stops") or []:
+            coords = _coordinates(stop.get("coordinates")) if isinstance(stop, dict) else None
+            if coords is not None:
+                fuel_stops[stop.get("day")] = coords
+
+        warnings: List[dict] = []
+        fixes: List[str] = []
+        driving_delta = 0.0
+        prev_pos: Optional[Point] = route[0] if route else None
+        prev: Optional[Dict[str, Any]] = None  # previous day's driving facts
+        for index, day in enumerate(days):
+            try:
+                number = int(day.get("day_number") or index + 1)
+            except (TypeError, ValueError):
+                number = index + 1
+            pos = self._position(day, number, markers, fuel_stops)
+            sun_pos = pos or self._route_point(route, index, len(days))
+            sun = None
+            if sun_pos is not None and isinstance(start_date, date):
+                sun = daylight(*sun_pos, start_date + timedelta(days=number - 1))
+
+            block_minutes = self._check_blocks(day, number, sun, warnings, fixes)
+
+            # ---- Driving vs the distance from the previous overnight location ----
+            stated = parse_driving_hours(day.get("daily_driving_time"))
+            implied = None
+            if prev_pos is not None and pos is not None:
+                implied = haversine_km(*prev_pos, *pos) * self.road_factor / self.speed_kmh
+            hours = stated
+            deficit = 0.0
+            if implied is not None and stated < implied * 0.7 - 0.5:
+                # Cannot cover the distance in the stated time
+                deficit = implied - stated
+                hours = self._set_driving(day, implied)
+                fixes.append("driving_understated")
+                # The model often books a leg on the wrong day: take the excess back from the day before
+                if prev is not None and prev["implied"] is not None and prev["hours"] - prev["implied"] >= deficit / 2:
+                    driving_delta += self._set_driving(prev["day"], prev["implied"]) - prev["hours"]
+                    fixes.append("driving_rebalanced")
+                    for warning in prev["warnings"]:
+                        warnings.remove(warning)
+                    warnings.extend(self._driving_warnings(prev["number"], prev["implied"], prev["block_minutes"]))
+            elif prev is not None and prev["deficit"] and implied is not None and stated - implied >= prev["deficit"] / 2:
+                hours = self._set_driving(day, implied)
+                fixes.append("driving_rebalanced")
+            driving_delta += hours - stated
+
+            day_warnings = self._driving_warnings(number, hours, block_minutes)
+            warnings.extend(day_warnings)
+            prev = {
+                "day": day, "number": number, "implied": implied, "hours": hours, "deficit": deficit,
+                "block_minutes": block_minutes, "warnings": day_warnings
+            }
+            prev_pos = pos  # unknown breaks the chain rather than spanning two days
+
+        logistics = data.get("logistics")
+        if driving_delta and isinstance(logistics, dict) and isinstance(logistics.get("estimated_driving_hours"), (int, float)):
+            logistics["estimated_driving_hours"] = round(max(logistics["estimated_driving_hours"] + driving_delta, 0.0), 1)
+
+        for code in fixes:
+            metrics.inc("schedule_fixes_total", code=code)
+        for warning in warnings:
+            metrics.inc("schedule_warnings_total", code=warning["code"])
+        if fixes or warnings:
+            print(f"[SCHEDULE] {len(fixes)} fixed locally, {len(warnings)} warnings")
+        data["schedule_warnings"] = warnings
+        return warnings
+
+    def _check_blocks(
+        self, day: dict, number: int, sun: Optional[Tuple[int, int]], warnings: List[dict], fixes: List[str]
+    ) -> int:
+        """Shift/shorten the day's blocks in order; returns their total minutes"""
+        total = 0
+        prev_end: Optional[int] = None
+        for name in BLOCKS:
+            block = day.get(name)
+            if not isinstance(block, dict):
+                continue
+            start = _minutes(block.get("start_time"))
+            try:
+                duration = max(int(block.get("duration_minutes") or 0), 0)
+            except (TypeError, ValueError):
+                duration = 0
+            if start is None:
+                warnings.append(self._warning(number, name, "invalid_time", f"Unreadable start_time {block.get('start_time')!r}"))
+                continue
+            original = (start, duration)
+
+            if name == "morning" and sun is not None and start < sun[0] - PRE_DAWN_MINUTES:
+                start = self._round(sun[0] - PRE_DAWN_MINUTES)
+                fixes.append("before_daylight")
+            if prev_end is not None and start < prev_end:
+                start = prev_end
+                fixes.append("overlap")
+            if name == "afternoon" and sun is not None:
+                last = sun[1] + self.daylight_margin
+                if start + duration > last:
+                    start = max(prev_end or 0, self._round(last - duration, up=False))
+                    if start + duration > last and last - start >= MIN_BLOCK_MINUTES:
+                        duration = last - start
+                    if start + duration > last:
+                        warnings.append(self._warning(
+                            number, name, "after_dark",
+                            f"Afternoon runs to {_clock(start + duration)}, after sunset ({_clock(sun[1])})"
+                        ))
+                    else:
+                        fixes.append("after_dark")
+            if start + duration > DAY_END_MINUTES:
+                start = max(prev_end or 0, self._round(DAY_END_MINUTES - duration, up=False))
+                if start + duration > DAY_END_MINUTES and DAY_END_MINUTES - start >= MIN_BLOCK_MINUTES:
+                    duration = DAY_END_MINUTES - start
+                if start + duration <= DAY_END_MINUTES:
+                    fixes.append("past_midnight")
+                else:
+                    warnings.append(self._warning(
+                        number, name, "past_midnight", f"{name.capitalize()} cannot start at {_clock(start)} and end by midnight"
+                    ))
+
+            if (start, duration) != original:
+                block["start_time"] = _clock(start)
+                block["duration_minutes"] = duration
+            prev_end = start + duration
+            total += duration
+        return total
+
+    def _driving_warnings(self, number: int, hours: float, block_minutes: int) -> List[dict]:
+        warnings = []
+        if hours > self.max_daily_hours:
+            warnings.append(self._warning(
+                number, None, "driving_over_limit",
+                f"About {hours:.1f} h of driving exceeds the {self.max_daily_hours:g} h daily limit; "
+                "consider an extra overnight stop"
+            ))
+        if block_minutes + hours * 60 > MAX_ACTIVE_MINUTES:
+            warnings.append(self._warning(
+                number, None, "day_overbooked",
+                f"{block_minutes // 60} h of activities plus {hours:.1f} h of driving do not fit in one day"
+            ))
+        return warnings
+
+    def _position(
+        self, day: dict, number: int, markers: List[Tuple[str, Optional[Point]]], fuel_stops: Dict[int, Point]
+    ) -> Optional[Point]:
+        """Overnight position: a marker named like the location, a known landmark, or the day's fuel stop"""
+        location = str(day.get("location") or "").lower().strip()
+        if len(location) >= 4:
+            for name, coords in markers:
+                if coords is not None and len(name) >= 4 and (name in location or location in name):
+                    return coords
+            landmarks = get_landmark_kb().matching(location, 1)
+            if landmarks:
+                coords = landmarks[0]["coordinates"]
+                return coords["lat"], coords["lon"]
+        return fuel_stops.get(number)
+
+    def _route_point(self, route: List[Point], index: int, count: int) -> Optional[Point]:
+        """Where on the polyline day `index` of `count` roughly ends (for daylight only)"""
+        if not route:
+            return None
+        return route[min(len(route) - 1, round((index + 1) / max(count, 1) * (len(route) - 1)))]
+
+    def _set_driving(self, day: dict, hours: float) -> float:
+        hours = round(hours, 1)
+        day["daily_driving_time"] = f"{hours:g} hrs"
+        return hours
+
+    def _round(self, minutes: int, step: int = 15, up: bool = True) -> int:
+        return int((math.ceil if up else math.floor)(minutes / step) * step)
+
+    def _warning(self, day: int, block: Optional[str], code: str, message: str) -> dict:
+        return {"day": day, "block": block, "code": code, "message": message}
+
+
+_checker: Optional[ScheduleChecker] = None
+
+
+def get_schedule_checker() -> ScheduleChecker:
+    global _checker
+    if _checker is None:
+        _checker = ScheduleChecker.from_settings()
+    return _checker
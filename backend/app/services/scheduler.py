@@ -0,0 +1,157 @@
+"""
+Priority-aware generation scheduler
+Every model call (AIService._call_model) takes a slot here first:
+- Priority classes (SCHEDULER_CLASSES): paid, interactive, batch, warming;
+  lower rank is served first
+- Aging: each SCHEDULER_AGING_SECONDS of waiting promotes a request by one rank,
+  so batch and warming work never starves
+- Per-class caps bound each class; on top of them, the other classes together
+  never hold more than GENERATION_CONCURRENCY - SCHEDULER_PAID_RESERVE slots,
+  so paid work finds a free slot however much free traffic is queued
+- Queue wait is observed per class (scheduler_queue_wait_seconds{priority=...})
+The class comes from a contextvar set at the entry points (with priority("batch"): ...).
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+DEFAULT_PRIORITY = "interactive"
+
+_priority: ContextVar[str] = ContextVar("generation_priority", default=DEFAULT_PRIORITY)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def priority(name: str):
+    """Run model calls made inside this block (and tasks it starts) at this priority"""
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@dataclass
+class PriorityClass:
+    name: str
+    rank: int
+    max_concurrency: int
+
+
+class _Waiter:
+    __slots__ = ("cls", "enqueued", "future")
+
+    def __init__(self, cls: PriorityClass, future: asyncio.Future):
+        self.cls = cls
+        self.enqueued = time.monotonic()
+        self.future = future
+
+
+class GenerationScheduler:
+    """Grants model-call slots by rank (with aging) within per-class and total limits"""
+
+    def __init__(
+        self,
+        concurrency: int,
+        classes: List[PriorityClass],
+        aging_seconds: float = 10.0,
+        reserve: int = 0,
+        reserved_class: str = "paid"
+    ):
+        self.concurrency = concurrency
+        self.classes = {cls.name: cls for cls in classes}
+        self.aging_seconds = aging_seconds
+        self.reserve = min(max(reserve, 0), concurrency - 1)  # slots only reserved_class may take
+        self.reserved_class = reserved_class
+        self._running: Dict[str, int] = {name: 0 for name in self.classes}
+        self._waiting: Dict[str, Deque[_Waiter]] = {name: deque() for name in self.classes}
+
+    @classmethod
+    def from_settings(cls) -> "GenerationScheduler":
+        return cls(
+            settings.GENERATION_CONCURRENCY,
+            [PriorityClass(**entry) for entry in settings.SCHEDULER_CLASSES],
+            settings.SCHEDULER_AGING_SECONDS,
+            reserve=settings.SCHEDULER_PAID_RESERVE
+        )
+
+    @asynccontextmanager
+    async def slot(self, name: Optional[str] = None):
+        """Hold one model-call slot for the block"""
+        cls = self.classes.get(name or current_priority()) or self.classes[DEFAULT_PRIORITY]
+        waiter = _Waiter(cls, asyncio.get_running_loop().create_future())
+        self._waiting[cls.name].append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(cls)  # granted just as we were cancelled
+            elif waiter in self._waiting[cls.name]:
+                self._waiting[cls.name].remove(waiter)
+            raise
+        metrics.observe("scheduler_queue_wait_seconds", time.monotonic() - waiter.enqueued, priority=cls.name)
+        try:
+            yield
+        finally:
+            self._release(cls)
+
+    def _release(self, cls: PriorityClass) -> None:
+        self._running[cls.name] -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        while sum(self._running.values()) < self.concurrency:
+            unreserved_full = (
+                sum(self._running.values()) - self._running.get(self.reserved_class, 0)
+                >= self.concurrency - self.reserve
+            )
+            best: Optional[_Waiter] = None
+            best_score = 0.0
+            for name, queue in self._waiting.items():
+                while queue and queue[0].future.done():
+                    queue.popleft()  # cancelled while waiting
+                if not queue or self._running[name] >= self.classes[name].max_concurrency:
+                    continue
+                if unreserved_full and name != self.reserved_class:
+                    continue
+                head = queue[0]  # oldest in its class, so the most aged
+                score = head.cls.rank - (now - head.enqueued) / self.aging_seconds
+                if best is None or score < best_score:
+                    best, best_score = head, score
+            if best is None:
+                break
+            self._waiting[best.cls.name].popleft()
+            self._running[best.cls.name] += 1
+            best.future.set_result(None)
+        for name in self.classes:
+            metrics.set_gauge("scheduler_waiting", len(self._waiting[name]), priority=name)
+            metrics.set_gauge("scheduler_running", self._running[name], priority=name)
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {"running": self._running[name], "waiting": len(self._waiting[name]), "max_concurrency": cls.max_concurrency}
+            for name, cls in self.classes.items()
+        }
+
+
+_scheduler: Optional[GenerationScheduler] = None
+
+
+def get_scheduler() -> GenerationScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = GenerationScheduler.from_settings()
+    return _scheduler
@@ -0,0 +1,173 @@
+"""
+Precompiled response-schema validator with coercion
+Compiles the JSON schema from AIService._build_schema once into nested
+closures, then validates model output in a single pass:
+- Coerces types (e.g. "120" -> 120, "$1,200" -> 1200.0, "true" -> True)
+- Fills defaults for missing required fields
+- Clamps arrays to maxItems (max 6 markers, 12 route points, ...)
+- Reports every fix/violation as {"path", "issue"}
+"""
+import math
+from typing import Any, Callable, Dict, List, Tuple
+
+
+Violations = List[Dict[str, str]]
+Checker = Callable[[Any, str, Violations], Any]
+
+
+def _to_number(value: Any) -> Any:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        cleaned = value.replace("$", "").replace(",", "").strip()
+        try:
+            return float(cleaned)
+        except ValueError:
+            return None
+    return None
+
+
+def default_for(schema: dict) -> Any:
+    """Type-appropriate default, with required sub-fields filled for objects"""
+    kind = schema.get("type")
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {key: default_for(properties.get(key, {})) for key in schema.get("required", [])}
+    if kind == "array":
+        return []
+    if kind == "string":
+        enum = schema.get("enum")
+        return enum[0] if enum else ""
+    if kind in ("number", "integer"):
+        return 0
+    if kind == "boolean":
+        return False
+    return None
+
+
+def _compile_string(schema: dict) -> Checker:
+    enum = schema.get("enum")
+    lowered = {e.lower(): e for e in enum} if enum else None
+
+    def check(value: Any, path: str, violations: Violations) -> Any:
+        if not isinstance(value, str):
+            if value is None or isinstance(value, (dict, list)):
+                violations.append({"path": path, "issue": f"expected string, got {type(value).__name__}"})
+                return default_for(schema)
+            value = str(value)
+            violations.append({"path": path, "issue": "coerced to string"})
+        if lowered is not None and value not in enum:
+            match = lowered.get(value.strip().lower())
+            if match is None:
+                violations.append({"path": path, "issue": f"'{value}' not in {enum}"})
+                return value
+            violations.append({"path": path, "issue": f"normalized enum '{value}' -> '{match}'"})
+            return match
+        return value
+    return check
+
+
+def _compile_number(schema: dict, integer: bool) -> Checker:
+    def check(value: Any, path: str, violations: Violations) -> Any:
+        coerced = isinstance(value, bool) or not isinstance(value, (int, float))
+        number = _to_number(value) if coerced else value
+        if number is None:
+            violations.append({"path": path, "issue": f"expected number, got {value!r}"})
+            return 0
+        if isinstance(number, float) and not math.isfinite(number):
+            # "NaN", "inf", "1e999": json and float() accept them, round() and clients do not
+            violations.append({"path": path, "issue": f"expected finite number, got {value!r}"})
+            return 0
+        if coerced:
+            violations.append({"path": path, "issue": "coerced to number"})
+        if integer and not isinstance(number, int):
+            number = int(round(number))
+        return number
+    return check
+
+
+def _compile_boolean(schema: dict) -> Checker:
+    def check(value: Any, path: str, violations: Violations) -> Any:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in ("true", "false", "yes", "no"):
+            violations.append({"path": path, "issue": "coerced to boolean"})
+            return value.strip().lower() in ("true", "yes")
+        violations.append({"path": path, "issue": f"expected boolean, got {value!r}"})
+        return bool(value)
+    return check
+
+
+def _compile_object(schema: dict) -> Checker:
+    properties = schema.get("properties", {})
+    checkers = {key: compile_schema(sub) for key, sub in properties.items()}
+    defaults = {key: properties.get(key, {}) for key in schema.get("required", [])}
+
+    def check(value: Any, path: str, violations: Violations) -> Any:
+        if not isinstance(value, dict):
+            violations.append({"path": path or "$", "issue": f"expected object, got {type(value).__name__}"})
+            return default_for(schema)
+        for key, checker in checkers.items():
+            if key in value:
+                value[key] = checker(value[key], f"{path}.{key}" if path else key, violations)
+        for key, sub_schema in defaults.items():
+            if key not in value:
+                violations.append({"path": f"{path}.{key}" if path else key, "issue": "missing required field (default filled)"})
+                value[key] = default_for(sub_schema)
+        return value
+    return check
+
+
+def _compile_array(schema: dict) -> Checker:
+    item_checker = compile_schema(schema.get("items", {}))
+    max_items = schema.get("maxItems")
+    min_items = schema.get("minItems")
+
+    def check(value: Any, path: str, violations: Violations) -> Any:
+        if not isinstance(value, list):
+            if value is None:
+                violations.append({"path": path, "issue": "expected array, got null"})
+                return []
+            violations.append({"path": path, "issue": "wrapped single value in array"})
+            value = [value]
+        if max_items is not None and len(value) > max_items:
+            violations.append({"path": path, "issue": f"clamped {len(value)} items to {max_items}"})
+            del value[max_items:]
+        for index, item in enumerate(value):
+            value[index] = item_checker(item, f"{path}[{index}]", violations)
+        if min_items is not None and len(value) < min_items:
+            violations.append({"path": path, "issue": f"fewer than {min_items} items"})
+        return value
+    return check
+
+
+def compile_schema(schema: dict) -> Checker:
+    """Compile a (Gemini-style) JSON schema dict into a coercing checker"""
+    kind = schema.get("type")
+    if kind == "object":
+        return _compile_object(schema)
+    if kind == "array":
+        return _compile_array(schema)
+    if kind == "string":
+        return _compile_string(schema)
+    if kind == "integer":
+        return _compile_number(schema, integer=True)
+    if kind == "number":
+        return _compile_number(schema, integer=False)
+    if kind == "boolean":
+        return _compile_boolean(schema)
+    return lambda value, path, violations: value
+
+
+class CompiledValidator:
+    """Reusable validator; compile once, call per response"""
+
+    def __init__(self, schema: dict):
+        self._check = compile_schema(schema)
+
+    def validate(self, data: Any) -> Tuple[Any, Violations]:
+        """Coerce data in place (single pass); returns (data, violations)"""
+        violations: Violations = []
+        return self._check(data, "", violations), violations
@@ -0,0 +1,232 @@
+"""
+Output-token budgeting from trip shape
+Predicts the response size from trip_duration, interest count and round trip,
+then derives max_output_tokens and the prompt's length guidance from it:
+- Linear model: base + per_day * days + per_interest * interests + round_trip
+- Fitted by least squares on recorded responses (TOKEN_CALIBRATION_PATH JSONL)
+- Corrected online by an EWMA of actual/predicted; accuracy exported as metrics
+- Thinking tokens share max_output_tokens on gemini-2.5 and the SDK pinned here
+  cannot cap them, so the cap keeps a thinking reserve that grows with observed
+  thinking, and truncations (MAX_TOKENS) push both the reserve and the correction up
+- Calibration samples are buffered and appended off the event loop (flush())
+"""
+import asyncio
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+CHARS_PER_TOKEN = 3.6  # English JSON output, measured on recorded responses
+MODEL_OUTPUT_CEILING = 65536  # gemini-2.5-flash max_output_tokens
+MIN_OUTPUT_TOKENS = 4096  # guard for a low THINKING_TOKEN_RESERVE; headroom and reserve cover truncation
+CALIBRATION_FLUSH_LINES = 20  # calibration samples buffered per write
+THINKING_HEADROOM = 1.25
+FEATURES = ("intercept", "trip_duration", "interest_count", "is_round_trip")
+
+
+def _solve(matrix: List[List[float]], vector: List[float]) -> Optional[List[float]]:
+    """Gaussian elimination with partial pivoting for the small normal equations"""
+    n = len(vector)
+    aug = [row[:] + [vector[i]] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(aug[r][col]))
+        if abs(aug[pivot][col]) < 1e-9:
+            return None
+        aug[col], aug[pivot] = aug[pivot], aug[col]
+        for r in range(n):
+            if r != col:
+                factor = aug[r][col] / aug[col][col]
+                aug[r] = [a - factor * b for a, b in zip(aug[r], aug[col])]
+    return [aug[i][n] / aug[i][i] for i in range(n)]
+
+
+class TokenBudgetEstimator:
+    """Predicts output tokens per request; thread-safe for concurrent recording"""
+
+    def __init__(self, calibration_path: Optional[str] = None, headroom: Optional[float] = None):
+        # Defaults measured on V2.0 schema responses before calibration data exists
+        self.coefficients = {"intercept": 900.0, "trip_duration": 380.0, "interest_count": 40.0, "is_round_trip": 60.0}
+        self.correction = 1.0
+        # Resolved from settings on first use so importing this module stays cheap
+        self.headroom = headroom
+        self.thinking_reserve: Optional[int] = None
+        self.calibration_path = Path(calibration_path) if calibration_path else None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending: List[str] = []  # buffered calibration lines, see flush()
+        self._calibrated = False
+
+    def _features(self, trip_duration: int, interest_count: int, is_round_trip: bool) -> Dict[str, float]:
+        return {
+            "intercept": 1.0,
+            "trip_duration": float(trip_duration),
+            "interest_count": float(interest_count),
+            "is_round_trip": 1.0 if is_round_trip else 0.0,
+        }
+
+    def estimate(self, trip_duration: int, interest_count: int, is_round_trip: bool) -> int:
+        """Predicted visible output tokens for this trip shape"""
+        self._ensure_calibrated()
+        x = self._features(trip_duration, interest_count, is_round_trip)
+        raw = sum(self.coefficients[f] * x[f] for f in FEATURES)
+        return max(int(raw * self.correction), 256)
+
+    def max_output_tokens(self, trip_duration: int, interest_count: int, is_round_trip: bool) -> int:
+        """Generation cap: prediction + headroom + thinking reserve, rounded up to 256"""
+        predicted = self.estimate(trip_duration, interest_count, is_round_trip)
+        budget = predicted * self.headroom + self.thinking_reserve
+        budget = int(-(-budget // 256) * 256)
+        return max(MIN_OUTPUT_TOKENS, min(budget, MODEL_OUTPUT_CEILING))
+
+    def char_budget(self, trip_duration: int, interest_count: int, is_round_trip: bool) -> int:
+        """Total JSON length guidance for the prompt, rounded to 500 chars"""
+        chars = self.estimate(trip_duration, interest_count, is_round_trip) * CHARS_PER_TOKEN
+        return int(round(chars / 500.0) * 500) or 500
+
+    def activity_word_limit(self, trip_duration: int) -> int:
+        """Per-activity word cap: long trips get terser blocks to keep latency bounded"""
+        if trip_duration <= 7:
+            return 120
+        if trip_duration <= 14:
+            return 90
+        return 60
+
+    def record(
+        self,
+        trip_duration: int,
+        interest_count: int,
+        is_round_trip: bool,
+        output_tokens: int,
+        truncated: bool = False,
+        thinking_tokens: int = 0
+    ) -> None:
+        """
+        Record an actual response size; updates correction, thinking reserve and
+        accuracy metrics (thinking_tokens: thinking the response spent, 0 if unknown)
+        """
+        predicted = self.estimate(trip_duration, interest_count, is_round_trip)
+        if truncated:
+            metrics.inc("output_truncated_total")
+        with self._lock:
+            if thinking_tokens > 0:
+                metrics.observe("thinking_tokens", thinking_tokens)
+                wanted = int(thinking_tokens * THINKING_HEADROOM)
+                if truncated or wanted > self.thinking_reserve:
+                    self.thinking_reserve = max(self.thinking_reserve, wanted)
+                else:
+                    # Decay slowly towards what thinking actually uses, never below the configured floor
+                    self.thinking_reserve = max(
+                        settings.THINKING_TOKEN_RESERVE, int(self.thinking_reserve + 0.1 * (wanted - self.thinking_reserve))
+                    )
+                self.thinking_reserve = min(self.thinking_reserve, MODEL_OUTPUT_CEILING // 2)
+                metrics.set_gauge("token_budget_thinking_reserve", self.thinking_reserve)
+            if truncated and output_tokens <= predicted:
+                # Cut off short of the prediction: never a reason to lower the estimate
+                self.correction = min(self.correction * 1.1, 2.0)
+                metrics.set_gauge("token_budget_correction", round(self.correction, 4))
+        if output_tokens <= 0:
+            return
+        abs_pct_error = abs(output_tokens - predicted) / output_tokens
+
+        metrics.observe("token_budget_abs_pct_error", abs_pct_error)
+        metrics.observe("output_tokens", output_tokens)
+
+        with self._lock:
+            # Truncated sizes are lower bounds - only let them push the estimate up
+            ratio = output_tokens / predicted
+            if not truncated or ratio > 1:
+                self.correction *= 1 + 0.1 * (ratio - 1)
+                self.correction = min(max(self.correction, 0.5), 2.0)
+            metrics.set_gauge("token_budget_correction", round(self.correction, 4))
+
+        if self.calibration_path and not truncated:
+            sample = {
+                "trip_duration": trip_duration,
+                "interest_count": interest_count,
+                "is_round_trip": is_round_trip,
+                "output_tokens": output_tokens,
+            }
+            with self._lock:
+                self._pending.append(json.dumps(sample) + "\n")
+                full = len(self._pending) >= CALIBRATION_FLUSH_LINES
+            if full:
+                self.flush()
+
+    def flush(self, background: bool = True) -> None:
+        """Append buffered calibration samples (in a worker thread when called on the event loop)"""
+        with self._lock:
+            lines, self._pending = self._pending, []
+        if not lines or not self.calibration_path:
+            return
+        try:
+            loop = asyncio.get_running_loop() if background else None
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            self._write_lines(self.calibration_path, lines)
+        else:
+            loop.run_in_executor(None, self._write_lines, self.calibration_path, lines)
+
+    def _write_lines(self, path: Path, lines: List[str]) -> None:
+        try:
+            with self._write_lock:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "a", encoding="utf-8") as fh:
+                    fh.write("".join(lines))
+        except OSError as e:
+            print(f"[TOKENS] Calibration write failed: {e}")
+
+    def fit(self, samples: List[dict]) -> bool:
+        """Least-squares fit of the coefficients on recorded samples"""
+        if len(samples) < 2 * len(FEATURES):
+            return False
+        n = len(FEATURES)
+        xtx = [[0.0] * n for _ in range(n)]
+        xty = [0.0] * n
+        for sample in samples:
+            x = self._features(sample["trip_duration"], sample["interest_count"], sample["is_round_trip"])
+            row = [x[f] for f in FEATURES]
+            for i in range(n):
+                xty[i] += row[i] * sample["output_tokens"]
+                for j in range(n):
+                    xtx[i][j] += row[i] * row[j]
+        # Light ridge term keeps the fit stable when e.g. no round trips were recorded
+        for i in range(1, n):
+            xtx[i][i] += 1.0
+        solution = _solve(xtx, xty)
+        if solution is None:
+            return False
+        self.coefficients = dict(zip(FEATURES, solution))
+        self.correction = 1.0
+        print(f"[TOKENS] Calibrated on {len(samples)} samples: {self.coefficients}")
+        return True
+
+    def _ensure_calibrated(self) -> None:
+        if self._calibrated:
+            return
+        self._calibrated = True
+        if self.headroom is None:
+            self.headroom = settings.TOKEN_BUDGET_HEADROOM
+        if self.thinking_reserve is None:
+            self.thinking_reserve = settings.THINKING_TOKEN_RESERVE
+        if self.calibration_path is None and settings.TOKEN_CALIBRATION_PATH:
+            self.calibration_path = Path(settings.TOKEN_CALIBRATION_PATH)
+        if not self.calibration_path or not self.calibration_path.exists():
+            return
+        samples = []
+        with open(self.calibration_path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    sample = json.loads(line)
+                except ValueError:
+                    continue
+                if all(k in sample for k in ("trip_duration", "interest_count", "is_round_trip", "output_tokens")):
+                    samples.append(sample)
+        self.fit(samples)
+
+
+token_budget = TokenBudgetEstimator()
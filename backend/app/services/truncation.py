@@ -0,0 +1,133 @@
+"""
+Truncated model output handling
+When generation stops on max_output_tokens, salvage every complete value from
+the partial JSON (instead of force-closing at the last quote) and work out
+exactly which sections still need generating:
+- parse_partial_json: longest prefix that closes into valid JSON
+- prune_incomplete: drop array items / objects missing required fields
+- find_missing: missing top-level sections and missing day numbers
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def parse_partial_json(text: str, max_attempts: int = 400) -> Dict[str, Any]:
+    """Parse a truncated JSON object, keeping every complete member"""
+    text = re.sub(r'^```json\s*', '', text.strip())
+    text = re.sub(r'\s*```$', '', text)
+    start = text.find('{')
+    if start < 0:
+        raise ValueError("No JSON object in response")
+
+    # Single scan: structural commas / closers are the only safe cut points
+    stack: List[str] = []
+    cuts: List[Tuple[int, str]] = []
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+        elif ch in '}]':
+            if stack:
+                stack.pop()
+            if not stack:
+                return json.loads(text[start:i + 1])
+            cuts.append((i + 1, ''.join(reversed(stack))))
+        elif ch == ',':
+            cuts.append((i, ''.join(reversed(stack))))
+
+    for pos, closers in reversed(cuts[-max_attempts:]):
+        try:
+            data = json.loads(text[start:pos] + closers)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    raise ValueError("No parseable prefix in truncated response")
+
+
+def prune_incomplete(value: Any, schema: dict) -> bool:
+    """
+    Remove incomplete array items in place (recursively)
+    Returns False when value itself lacks required fields
+    """
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(value, dict):
+            return False
+        properties = schema.get("properties", {})
+        for key, sub_schema in properties.items():
+            if key in value and not prune_incomplete(value[key], sub_schema):
+                del value[key]
+        return all(key in value for key in schema.get("required", []))
+    if kind == "array":
+        if not isinstance(value, list):
+            return False
+        item_schema = schema.get("items", {})
+        value[:] = [item for item in value if prune_incomplete(item, item_schema)]
+        return True
+    return value is not None
+
+
+def find_missing(data: dict, schema: dict, trip_duration: int) -> Tuple[List[str], List[int]]:
+    """Top-level sections still missing (after pruning) and missing day numbers"""
+    prune_incomplete(data, schema)
+    missing_sections = [key for key in schema.get("required", []) if key not in data]
+
+    present_days = {
+        day.get("day_number") for day in data.get("days") or [] if isinstance(day.get("day_number"), int)
+    }
+    missing_days = [n for n in range(1, trip_duration + 1) if n not in present_days]
+    if missing_days and "days" not in missing_sections:
+        missing_sections.append("days")
+    return missing_sections, missing_days
+
+
+def continuation_schema(schema: dict, sections: List[str], missing_days: List[int]) -> dict:
+    """Subset of the full schema covering only the sections to generate"""
+    properties = {}
+    for key in sections:
+        prop = dict(schema["properties"][key])
+        if key == "days" and missing_days:
+            prop["description"] = f"ONLY days {', '.join(map(str, missing_days))}"
+        properties[key] = prop
+    return {"type": "object", "properties": properties, "required": list(sections)}
+
+
+def merge_continuation(data: dict, extra: dict, missing_days: List[int]) -> dict:
+    """Merge a continuation response into the partial result"""
+    for key, value in extra.items():
+        if key == "days":
+            wanted = set(missing_days)
+            new_days = [d for d in value if isinstance(d, dict)]
+            matched = [d for d in new_days if d.get("day_number") in wanted]
+            if not matched:
+                # Model restarted numbering at 1 - assign the requested numbers in order
+                for day, number in zip(new_days, missing_days):
+                    day["day_number"] = number
+                matched = new_days[:len(missing_days)]
+            days = list(data.get("days") or []) + matched
+            data["days"] = sorted(days, key=lambda d: d.get("day_number", 0))
+        elif key not in data:
+            data[key] = value
+    return data
+
+
+def summarize_days(days: Optional[List[dict]]) -> str:
+    """One line per generated day, for continuation prompts"""
+    return "\n".join(
+        f"- Day {d.get('day_number')}: {d.get('location', '')} ({d.get('daily_driving_time', '')} driving)"
+        for d in days or []
+    )
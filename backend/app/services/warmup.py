@@ -0,0 +1,146 @@
+"""
+Startup warmup and readiness
+Runs one-time initialization in the lifespan before the worker reports ready:
+- Steps: SDK import + model objects, response schemas/validator, token
+  calibration, store journal replay, default thread pool
+- Other services register their own steps (e.g. connection pools) via add_step
+- Dependency probes for /api/health/ready are cached for READINESS_PROBE_TTL_SECONDS
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+Probe = Callable[[], Any]  # sync or async; raise (or return False) when unhealthy
+
+
+def _warm_ai() -> None:
+    from app.services.ai_service import AIService
+    AIService().warm()
+
+
+def _warm_token_budget() -> None:
+    from app.services.token_budget import token_budget
+    token_budget.estimate(7, 0, False)
+
+
+def _warm_store() -> None:
+    from app.services.itinerary_store import get_itinerary_store
+    get_itinerary_store().load_journal()
+
+
+def _probe_gemini() -> bool:
+    if not settings.GEMINI_API_KEY:
+        raise RuntimeError("GEMINI_API_KEY not set")
+    if settings.READINESS_REMOTE_PROBES:
+        from app.services.ai_service import get_genai
+        from app.services.model_router import get_model_router
+        get_genai().get_model(f"models/{get_model_router().tiers[0].model_name}")
+    return True
+
+
+def _probe_model_tiers() -> bool:
+    from app.services.model_router import get_model_router
+    router = get_model_router()
+    if not any(router.is_healthy(tier) for tier in router.tiers):
+        raise RuntimeError("all model tiers degraded")
+    return True
+
+
+class Readiness:
+    """Warmup progress plus cached dependency probes"""
+
+    def __init__(self, probe_ttl: Optional[float] = None):
+        self.probe_ttl = probe_ttl
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self._steps: List[Tuple[str, Callable[[], Any]]] = [
+            ("ai_service", _warm_ai),
+            ("token_budget", _warm_token_budget),
+            ("itinerary_store", _warm_store),
+        ]
+        self._probes: Dict[str, Probe] = {"gemini": _probe_gemini, "model_tiers": _probe_model_tiers}
+        self._probe_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    def add_step(self, name: str, step: Callable[[], Any]) -> None:
+        """Register a warmup step (sync functions run in a thread, coroutines are awaited)"""
+        self._steps.append((name, step))
+
+    def add_probe(self, name: str, probe: Probe) -> None:
+        self._probes[name] = probe
+
+    @property
+    def warmed(self) -> bool:
+        return self.finished_at is not None
+
+    async def _run(self, fn: Callable[[], Any]) -> Any:
+        if asyncio.iscoroutinefunction(fn):
+            return await fn()
+        return await asyncio.to_thread(fn)
+
+    def skip(self) -> None:
+        """Warmup disabled: report ready as soon as probes pass"""
+        self.started_at = self.finished_at = time.monotonic()
+
+    async def warmup(self) -> None:
+        """Run every step once; a failing step is recorded but does not block the others"""
+        self.started_at = time.monotonic()
+        # Spin up the default executor's threads now, not on the first concurrent requests
+        await asyncio.gather(*(asyncio.to_thread(time.sleep, 0.01) for _ in range(settings.WARMUP_THREADS)))
+
+        for name, step in self._steps:
+            started = time.monotonic()
+            try:
+                await self._run(step)
+                self.steps[name] = {"ok": True}
+            except Exception as e:
+                self.steps[name] = {"ok": False, "error": str(e) or type(e).__name__}
+                print(f"[WARMUP] {name} failed: {e}")
+            elapsed = time.monotonic() - started
+            self.steps[name]["seconds"] = round(elapsed, 3)
+            metrics.observe("warmup_step_seconds", elapsed, step=name)
+
+        self.finished_at = time.monotonic()
+        total = self.finished_at - self.started_at
+        metrics.set_gauge("warmup_seconds", round(total, 3))
+        print(f"[WARMUP] Completed {len(self._steps)} steps in {total:.2f}s")
+
+    async def probe(self, name: str) -> Dict[str, Any]:
+        """Run a probe, reusing its result within the TTL so the LB cannot hammer dependencies"""
+        ttl = self.probe_ttl if self.probe_ttl is not None else settings.READINESS_PROBE_TTL_SECONDS
+        cached = self._probe_cache.get(name)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        try:
+            ok = await asyncio.wait_for(self._run(self._probes[name]), timeout=5.0)
+            result = {"ok": ok is not False}
+        except Exception as e:
+            reason = "timeout" if isinstance(e, asyncio.TimeoutError) else str(e) or type(e).__name__
+            result = {"ok": False, "error": reason}
+        self._probe_cache[name] = (time.monotonic(), result)
+        return result
+
+    async def status(self) -> Dict[str, Any]:
+        """Readiness report: ready only once warmup finished and every probe passes"""
+        checks = {}
+        if self.warmed:
+            results = await asyncio.gather(*(self.probe(name) for name in self._probes))
+            checks = dict(zip(self._probes, results))
+        ready = self.warmed and all(check["ok"] for check in checks.values())
+        return {
+            "status": "ready" if ready else ("warming" if not self.warmed else "degraded"),
+            "ready": ready,
+            "warmup": {
+                "finished": self.warmed,
+                "seconds": round(self.finished_at - self.started_at, 3) if self.warmed else None,
+                "steps": self.steps,
+            },
+            "checks": checks,
+        }
+
+
+readiness = Readiness()
@@ -0,0 +1,334 @@
+"""
+Durable Stripe webhook ingestion
+The webhook endpoint only verifies the signature and enqueues; everything else
+happens in a background consumer:
+- verify_signature: Stripe-Signature HMAC-SHA256 check with timestamp tolerance
+- WebhookQueue: SQLite (WAL) queue keyed by event id, so Stripe's retries and
+  replays are deduplicated by INSERT OR IGNORE
+- WebhookConsumer: claims batches (lease-based, safe across workers) and applies
+  payment_status updates to stored itineraries; queue I/O runs in a worker thread,
+  and an idle poll is a plain read (no write lock)
+- Events for itineraries this worker cannot find yet stay queued with exponential
+  backoff (another worker or a journal replay may have it) and are dead-lettered
+  after WEBHOOK_MAX_ATTEMPTS - kept, never pruned, for manual replay
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.shared_cache import open_wal
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created INTEGER,
+    received_at REAL NOT NULL,
+    claimed_until REAL,
+    processed_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS events_pending ON events (processed_at, received_at);
+"""
+
+DEAD_LETTER = "dead_letter"
+
+# event type -> payment_status written to the itinerary
+STATUS_BY_EVENT = {
+    "checkout.session.completed": "paid",
+    "checkout.session.async_payment_succeeded": "paid",
+    "checkout.session.async_payment_failed": "failed",
+    "checkout.session.expired": "pending",
+    "payment_intent.payment_failed": "failed",
+}
+
+
+class WebhookSignatureError(ValueError):
+    """Missing, malformed, stale or non-matching Stripe-Signature header"""
+
+
+def verify_signature(payload: bytes, sig_header: Optional[str], secret: str, tolerance: int = 300) -> dict:
+    """Verify a Stripe-Signature header and return the parsed event"""
+    if not sig_header:
+        raise WebhookSignatureError("Missing Stripe-Signature header")
+    timestamp = None
+    signatures = []
+    for part in sig_header.split(","):
+        name, _, value = part.strip().partition("=")
+        if name == "t":
+            timestamp = value
+        elif name == "v1":
+            signatures.append(value)
+    if timestamp is None or not timestamp.isdigit() or not signatures:
+        raise WebhookSignatureError("Malformed Stripe-Signature header")
+    if tolerance and abs(time.time() - int(timestamp)) > tolerance:
+        raise WebhookSignatureError("Timestamp outside tolerance")
+
+    signed = timestamp.encode("utf-8") + b"." + payload
+    expected = hmac.new(secret.encode("utf-8"), signed, hashlib.sha256).hexdigest()
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise WebhookSignatureError("No matching signature")
+    try:
+        return json.loads(payload)
+    except ValueError:
+        raise WebhookSignatureError("Invalid payload")
+
+
+def itinerary_id_for(event: dict) -> Optional[str]:
+    obj = (event.get("data") or {}).get("object") or {}
+    return (obj.get("metadata") or {}).get("itinerary_id") or obj.get("client_reference_id")
+
+
+class WebhookQueue:
+    """Append-once event queue; one connection per thread and process"""
+
+    def __init__(
+        self,
+        path: str,
+        lease_seconds: float = 60.0,
+        retry_base_seconds: float = 5.0,
+        retry_max_seconds: float = 3600.0,
+        max_attempts: int = 12
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = open_wal(str(self.path))
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, event: dict) -> bool:
+        """Store an event; False when this event id was already received"""
+        inserted = self._conn().execute(
+            "INSERT OR IGNORE INTO events (id, type, payload, created, received_at) VALUES (?, ?, ?, ?, ?)",
+            (event["id"], event.get("type", ""), json.dumps(event), event.get("created"), time.time())
+        ).rowcount
+        return inserted == 1
+
+    def claim(self, limit: int) -> List[Tuple[str, dict]]:
+        """Lease up to limit pending events (oldest first); expired leases are reclaimed"""
+        now = time.time()
+        conn = self._conn()
+        ready = conn.execute(
+            "SELECT 1 FROM events WHERE processed_at IS NULL "
+            "AND (claimed_until IS NULL OR claimed_until < ?) LIMIT 1",
+            (now,)
+        ).fetchone()
+        if ready is None:
+            return []  # idle poll: no write lock taken
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, payload FROM events WHERE processed_at IS NULL "
+                "AND (claimed_until IS NULL OR claimed_until < ?) ORDER BY created, received_at LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE events SET claimed_until = ?, attempts = attempts + 1 WHERE id = ?",
+                [(now + self.lease_seconds, event_id) for event_id, _ in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(event_id, json.loads(payload)) for event_id, payload in rows]
+
+    def complete(self, event_ids: List[str], error: Optional[str] = None) -> None:
+        self._conn().executemany(
+            "UPDATE events SET processed_at = ?, claimed_until = NULL, error = ? WHERE id = ?",
+            [(time.time(), error, event_id) for event_id in event_ids]
+        )
+
+    def release(self, event_ids: List[str], error: str) -> None:
+        """Return events to the queue for a later retry"""
+        self._conn().executemany(
+            "UPDATE events SET claimed_until = NULL, error = ? WHERE id = ?",
+            [(error, event_id) for event_id in event_ids]
+        )
+
+    def retry_later(self, event_ids: List[str], error: str) -> List[str]:
+        """
+        Re-queue events with exponential backoff by attempt count; events out of
+        attempts are dead-lettered instead. Returns the dead-lettered ids.
+        """
+        if not event_ids:
+            return []
+        conn = self._conn()
+        placeholders = ",".join("?" * len(event_ids))
+        rows = conn.execute(f"SELECT id, attempts FROM events WHERE id IN ({placeholders})", event_ids).fetchall()
+        now = time.time()
+        dead = [event_id for event_id, attempts in rows if attempts >= self.max_attempts]
+        conn.executemany(
+            "UPDATE events SET claimed_until = ?, error = ? WHERE id = ?",
+            [
+                (now + min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1)), error, event_id)
+                for event_id, attempts in rows if attempts < self.max_attempts
+            ]
+        )
+        self.complete(dead, error=f"{DEAD_LETTER}: {error}")
+        return dead
+
+    def pending(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM events WHERE processed_at IS NULL").fetchone()[0]
+
+    def dead_letters(self) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM events WHERE error LIKE ?", (DEAD_LETTER + ":%",)
+        ).fetchone()[0]
+
+    def prune(self, older_than_seconds: float) -> int:
+        """Forget processed events (dead letters are kept); ids stay deduplicated until pruned"""
+        return self._conn().execute(
+            "DELETE FROM events WHERE processed_at IS NOT NULL AND processed_at < ? "
+            "AND (error IS NULL OR error NOT LIKE ?)",
+            (time.time() - older_than_seconds, DEAD_LETTER + ":%")
+        ).rowcount
+
+
+class WebhookConsumer:
+    """Background batch applier of queued webhook events"""
+
+    def __init__(self, queue: WebhookQueue, store: Any, batch_size: int = 100, poll_seconds: float = 1.0):
+        self.queue = queue
+        self.store = store
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._wake = asyncio.Event()
+
+    def notify(self) -> None:
+        """New event enqueued in this process - skip the poll wait"""
+        self._wake.set()
+
+    async def apply_batch(self) -> int:
+        """
+        Claim and apply one batch; returns the number of events claimed
+        Queue I/O runs in a worker thread; the store (not thread-safe) is used on the loop
+        """
+        batch = await asyncio.to_thread(self.queue.claim, self.batch_size)
+        if not batch:
+            return 0
+
+        # Collapse per itinerary: the latest event decides the status, but paid is never undone
+        latest: Dict[str, Tuple[int, str]] = {}
+        events_for: Dict[str, List[str]] = {}
+        ignored = []
+        for event_id, event in batch:
+            status = STATUS_BY_EVENT.get(event.get("type", ""))
+            itinerary_id = itinerary_id_for(event)
+            if status is None or itinerary_id is None:
+                ignored.append(event_id)
+                continue
+            events_for.setdefault(itinerary_id, []).append(event_id)
+            if event.get("type") == "checkout.session.completed":
+                obj = event["data"]["object"]
+                if obj.get("payment_status") not in (None, "paid", "no_payment_required"):
+                    status = "processing"  # delayed payment method; async_payment_* follows
+            created = event.get("created") or 0
+            previous = latest.get(itinerary_id)
+            if previous is None or (created >= previous[0] and previous[1] != "paid") or status == "paid":
+                latest[itinerary_id] = (created, status)
+
+        try:
+            self.store.load_journal()
+            missing = []
+            spent = []  # checkout failed or expired: the cached session must not be handed out again
+            for itinerary_id, (_, status) in latest.items():
+                current = self.store.get(itinerary_id)
+                if current is None:
+                    missing.append(itinerary_id)
+                elif current.get("payment_status") == "paid" and status != "paid":
+                    continue  # e.g. an older abandoned session expiring after a successful one
+                else:
+                    self.store.update(itinerary_id, payment_status=status)
+                    if status in ("failed", "pending"):
+                        spent.append(itinerary_id)
+        except Exception as e:
+            await asyncio.to_thread(self.queue.release, [event_id for event_id, _ in batch], str(e))
+            raise
+
+        # Not found here (yet): keep them queued - never complete a payment we could not record
+        deferred = [event_id for itinerary_id in missing for event_id in events_for[itinerary_id]]
+        handled = [event_id for event_id, _ in batch if event_id not in ignored and event_id not in deferred]
+        dead = await asyncio.to_thread(self._settle, handled, ignored, deferred, spent)
+        if len(deferred) > len(dead):
+            print(f"[WEBHOOK] No stored itinerary for {missing} - retrying later")
+            metrics.inc("webhook_events_deferred_total", len(deferred) - len(dead))
+        if dead:
+            print(f"[WEBHOOK] Dead-lettered {len(dead)} events after {self.queue.max_attempts} attempts: {dead}")
+            metrics.inc("webhook_events_dead_lettered_total", len(dead))
+        metrics.inc("webhook_events_applied_total", len(handled))
+        return len(batch)
+
+    def _settle(self, handled: List[str], ignored: List[str], deferred: List[str], spent: List[str]) -> List[str]:
+        if spent:
+            from app.services.payment_service import new_checkout_attempt
+            new_checkout_attempt(spent)
+        self.queue.complete(handled)
+        self.queue.complete(ignored, error="ignored")
+        dead = self.queue.retry_later(deferred, "itinerary not found")
+        metrics.set_gauge("webhook_queue_pending", self.queue.pending())
+        return dead
+
+    async def run(self) -> None:
+        """Drain, then wait for a notify or the poll interval; runs until cancelled"""
+        while True:
+            try:
+                while await self.apply_batch() >= self.batch_size:
+                    await asyncio.sleep(0)
+            except Exception as e:
+                print(f"[WEBHOOK] Consumer error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+
+_queue: Optional[WebhookQueue] = None
+_consumer: Optional[WebhookConsumer] = None
+
+
+def get_webhook_queue() -> WebhookQueue:
+    global _queue
+    if _queue is None:
+        _queue = WebhookQueue(
+            settings.WEBHOOK_QUEUE_PATH,
+            retry_base_seconds=settings.WEBHOOK_RETRY_BASE_SECONDS,
+            retry_max_seconds=settings.WEBHOOK_RETRY_MAX_SECONDS,
+            max_attempts=settings.WEBHOOK_MAX_ATTEMPTS
+        )
+    return _queue
+
+
+def get_webhook_consumer() -> WebhookConsumer:
+    global _consumer
+    if _consumer is None:
+        from app.services.itinerary_store import get_itinerary_store
+        _consumer = WebhookConsumer(
+            get_webhook_queue(),
+            get_itinerary_store(),
+            batch_size=settings.WEBHOOK_BATCH_SIZE,
+            poll_seconds=settings.WEBHOOK_POLL_SECONDS
+        )
+    return _consumer
@@ -0,0 +1,3 @@
+"""
+Micro-benchmarks (run from backend/ with python -m benchmarks.<name>)
+"""
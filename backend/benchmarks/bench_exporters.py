@@ -0,0 +1,73 @@
+"""
+Benchmark: streaming GPX/KML/ICS exporters vs the WeasyPrint PDF
+
+Usage (from backend/):
+    python -m benchmarks.bench_exporters [--days 14] [--iterations 200]
+
+The PDF run is skipped if WeasyPrint is not installed.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from app.services.route_exporters import EXPORT_FORMATS, buffered  # noqa: E402
+from benchmarks.sample_data import sample_model_output  # noqa: E402
+
+
+def _itinerary(days: int) -> dict:
+    data = sample_model_output(days)
+    data["itinerary_daily"] = data.pop("days")
+    data["itinerary_id"] = "itin_benchmark"
+    data["start_date"] = "2026-06-01"
+    return data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    itinerary = _itinerary(args.days)
+    print(f"\nExport of a {args.days}-day itinerary, {args.iterations} iterations\n")
+
+    for fmt, (writer, _, _) in EXPORT_FORMATS.items():
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            size = sum(len(chunk) for chunk in buffered(writer(itinerary)))
+        us = (time.perf_counter() - start) / args.iterations * 1e6
+
+        tracemalloc.start()
+        for _ in buffered(writer(itinerary)):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  {fmt:<4} {us:>10,.1f} us/export  {size / 1024:>7.1f} KiB  peak {peak / 1024:>6.1f} KiB")
+
+    try:
+        from weasyprint import HTML
+    except (ImportError, OSError):
+        print("\nweasyprint not installed - skipping PDF")
+        return
+
+    from app.services.ai_service import AIService
+    from app.services.export_service import ExportService
+
+    markdown_text = AIService.render_markdown(AIService.__new__(AIService), itinerary["itinerary_daily"])
+    import markdown
+    html = ExportService._create_html_template(None, markdown.markdown(markdown_text, extensions=["extra", "tables"]))
+    runs = max(1, args.iterations // 50)
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        for i in range(runs):
+            HTML(string=html).write_pdf(os.path.join(tmp, f"{i}.pdf"), stylesheets=[ExportService._get_pdf_styles(None)])
+        us = (time.perf_counter() - start) / runs * 1e6
+    print(f"  pdf  {us:>10,.1f} us/export  ({runs} runs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: cold-start import time of the FastAPI app
+
+Usage (from backend/):
+    python -m benchmarks.bench_import_time [--budget-ms 1000] [--top 15] [--serve]
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter, reports the
+heaviest modules and fails (exit 1) when the total exceeds the budget or when a
+heavy optional dependency is imported at startup. --serve additionally measures
+time from process start to the first 200 on /api/health/.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Tuple
+
+# Only needed on the code path that actually uses them - never at import time
+LAZY_MODULES = ("google.generativeai", "weasyprint", "stripe", "sqlalchemy", "markdown")
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    return env
+
+
+def measure_imports() -> List[Tuple[str, int]]:
+    """(module, cumulative microseconds) for every module imported by `import main`"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True, text=True, env=_env()
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import main failed")
+    timings = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings.append((name.strip(), int(cumulative)))
+    return timings
+
+
+def measure_first_response(port: int, timeout: float = 30.0) -> float:
+    """Seconds from spawning uvicorn to the first 200 on the health endpoint"""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=_env()
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health/", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError(f"No 200 from /api/health/ within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_TIME_BUDGET_MS", 1000)))
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--serve", action="store_true", help="also measure time to first 200")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    timings = measure_imports()
+    total_ms = next((us for name, us in timings if name == "main"), 0) / 1000
+    print(f"\nimport main: {total_ms:,.1f} ms (budget {args.budget_ms:,.0f} ms)\n")
+    print("Heaviest modules (cumulative):")
+    for name, us in sorted(timings, key=lambda t: -t[1])[:args.top]:
+        print(f"  {name:<55} {us / 1000:>9,.1f} ms")
+
+    imported = {name for name, _ in timings}
+    eager = [m for m in LAZY_MODULES if m in imported]
+
+    if args.serve:
+        print(f"\nTime to first 200: {measure_first_response(args.port) * 1000:,.0f} ms")
+
+    failed = False
+    if eager:
+        print(f"\nFAIL: imported at startup: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"\nFAIL: import time {total_ms:,.1f} ms exceeds budget {args.budget_ms:,.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark: memory per cached itinerary, dict tree vs CompactItinerary
+
+Usage (from backend/):
+    python -m benchmarks.bench_itinerary_memory [--days 7 14] [--count 500]
+
+Measured with tracemalloc over `count` distinct itineraries, as the
+itinerary store would hold them.
+"""
+import argparse
+import json
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from app.models.compact import CompactItinerary
+from app.services.image_service import attach_image_urls
+from benchmarks.sample_data import sample_model_output
+
+
+def _itinerary(days: int, n: int) -> Dict[str, Any]:
+    data = sample_model_output(days)
+    data["itinerary_daily"] = data.pop("days")
+    data["budget"] = data.pop("budget_table")
+    attach_image_urls(data["itinerary_daily"])
+    data.update({"itinerary_id": f"itin_{n:012d}", "created_at": "2026-06-01T12:00:00", "payment_status": "pending"})
+    return data
+
+
+def _measure(build: Callable[[str], Any], payloads: List[str]) -> float:
+    """Bytes retained per item built from a JSON payload (parsing garbage excluded)"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(p) for p in payloads]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(kept) == len(payloads)
+    return (after - before) / len(payloads)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 14])
+    parser.add_argument("--count", type=int, default=500)
+    args = parser.parse_args()
+
+    for days in args.days:
+        # Same path as the store: JSON journal line -> in-memory entry
+        payloads = [json.dumps(_itinerary(days, n)) for n in range(args.count)]
+        sample = json.loads(payloads[0])
+        assert CompactItinerary(json.loads(payloads[0])).to_dict() == sample, "compact form does not round-trip"
+
+        as_dict = _measure(json.loads, payloads)
+        compact = _measure(lambda p: CompactItinerary(json.loads(p)), payloads)
+        budget = 100 * 1024 * 1024
+        print(f"\n{days}-day itinerary ({args.count} entries)")
+        print(f"  {'dict tree':<20} {as_dict / 1024:>8.1f} KiB/entry  {budget // as_dict:>8,.0f} entries per 100 MiB")
+        print(f"  {'CompactItinerary':<20} {compact / 1024:>8.1f} KiB/entry  {budget // compact:>8,.0f} entries per 100 MiB")
+        print(f"  ratio {as_dict / compact:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
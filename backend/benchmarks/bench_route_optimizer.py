@@ -0,0 +1,49 @@
+"""
+Benchmark: local waypoint ordering time and distance saved
+
+Usage (from backend/):
+    python -m benchmarks.bench_route_optimizer [--iterations 200] [--seed 1]
+
+Stops are scattered over the Colorado Plateau in random (i.e. backtracking)
+order, as a worst case for model output; each size is planned as a one-way
+trip and as a round trip, with a 7-day split.
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from app.services.route_optimizer import RouteOptimizer  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    optimizer = RouteOptimizer()
+    print(f"\n{'stops':>5}  {'trip':<10} {'mean ms':>8} {'max ms':>8} {'given km':>9} {'ordered km':>10} {'saved':>6}")
+    for count in (6, 12, 25, 50, 100):
+        for round_trip in (False, True):
+            timings, given, ordered = [], 0.0, 0.0
+            for _ in range(args.iterations):
+                points = [(rng.uniform(35.0, 39.5), rng.uniform(-114.5, -108.0)) for _ in range(count + 2)]
+                end = None if round_trip else points[-1]
+                started = time.perf_counter()
+                plan = optimizer.plan(points[0], points[1:-1], end=end, round_trip=round_trip, days=7)
+                timings.append(time.perf_counter() - started)
+                given += plan.original_km
+                ordered += plan.distance_km
+            trip = "round trip" if round_trip else "one-way"
+            print(
+                f"{count:>5}  {trip:<10} {sum(timings) / len(timings) * 1000:>8.2f} {max(timings) * 1000:>8.2f} "
+                f"{given / args.iterations:>9.0f} {ordered / args.iterations:>10.0f} {1 - ordered / given:>6.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
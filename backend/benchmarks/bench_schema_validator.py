@@ -0,0 +1,99 @@
+"""
+Benchmark: precompiled validator vs per-request jsonschema / Pydantic validation
+
+Usage (from backend/):
+    python -m benchmarks.bench_schema_validator [--days 7] [--iterations 500]
+
+jsonschema and Pydantic runs are skipped if the package is not installed.
+"""
+import argparse
+import copy
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from app.services.ai_service import AIService  # noqa: E402
+from app.services.schema_validator import CompiledValidator  # noqa: E402
+from benchmarks.sample_data import sample_model_output  # noqa: E402
+
+
+def _timeit(fn: Callable[[Dict[str, Any]], Any], payloads: List[Dict[str, Any]]) -> float:
+    """Mean microseconds per call (payload copies prepared outside the timer)"""
+    start = time.perf_counter()
+    for payload in payloads:
+        fn(payload)
+    return (time.perf_counter() - start) / len(payloads) * 1e6
+
+
+def _pydantic_model_for(schema: dict, name: str = "Root"):
+    """Build Pydantic models from the JSON schema (what a per-request approach would do)"""
+    from pydantic import create_model
+    from typing import List as TList
+
+    def annotation(sub: dict, sub_name: str):
+        kind = sub.get("type")
+        if kind == "object":
+            return _pydantic_model_for(sub, sub_name)
+        if kind == "array":
+            return TList[annotation(sub.get("items", {}), sub_name + "Item")]
+        return {"string": str, "integer": int, "number": float, "boolean": bool}.get(kind, Any)
+
+    required = set(schema.get("required", []))
+    fields = {}
+    for key, sub in schema.get("properties", {}).items():
+        ann = annotation(sub, f"{name}_{key}")
+        fields[key] = (ann, ...) if key in required else (Optional[ann], None)
+    return create_model(name, **fields)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    schema = AIService.__new__(AIService)._build_schema([])
+    clean = sample_model_output(args.days)
+    messy = sample_model_output(args.days, stringly_typed=True)
+
+    def copies(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [copy.deepcopy(payload) for _ in range(args.iterations)]
+
+    results = {}
+
+    start = time.perf_counter()
+    validator = CompiledValidator(schema)
+    compile_us = (time.perf_counter() - start) * 1e6
+    results["compiled (clean)"] = _timeit(validator.validate, copies(clean))
+    results["compiled (string numbers, coerced)"] = _timeit(validator.validate, copies(messy))
+
+    try:
+        import jsonschema
+
+        results["jsonschema per request (build + validate)"] = _timeit(
+            lambda p: list(jsonschema.Draft7Validator(schema).iter_errors(p)), copies(clean)
+        )
+        cached = jsonschema.Draft7Validator(schema)
+        results["jsonschema cached validator"] = _timeit(lambda p: list(cached.iter_errors(p)), copies(clean))
+    except ImportError:
+        print("jsonschema not installed - skipping")
+
+    try:
+        results["pydantic per request (build models + validate)"] = _timeit(
+            lambda p: _pydantic_model_for(schema).model_validate(p), copies(clean)
+        )
+        model = _pydantic_model_for(schema)
+        results["pydantic cached model"] = _timeit(model.model_validate, copies(clean))
+    except ImportError:
+        print("pydantic not installed - skipping")
+
+    print(f"\nSchema validation, {args.days}-day itinerary, {args.iterations} iterations")
+    print(f"One-time compile: {compile_us:,.0f} us\n")
+    for name, us in results.items():
+        print(f"  {name:<50} {us:>10,.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: itinerary payload size and encode/decode time, JSON vs binary formats
+
+Usage (from backend/):
+    python -m benchmarks.bench_wire_format [--days 3 7 14 30] [--iterations 300]
+
+msgpack / cbor2 / orjson rows are skipped if the package is not installed.
+Also reports keys the response model gained since the current key dictionary.
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from app.core.wire_format import FORMATS, missing_keys  # noqa: E402
+from app.services.image_service import attach_image_urls  # noqa: E402
+from benchmarks.sample_data import sample_model_output  # noqa: E402
+
+
+def _itinerary(days: int) -> Dict[str, Any]:
+    data = sample_model_output(days)
+    data["itinerary_daily"] = data.pop("days")
+    data["budget"] = data.pop("budget_table")
+    attach_image_urls(data["itinerary_daily"])
+    data.update({"itinerary_id": "itin_0123456789ab", "created_at": "2026-06-01T12:00:00", "payment_status": "pending"})
+    return data
+
+
+def _codecs() -> List[Tuple[str, Callable[[Any], bytes], Callable[[bytes], Any]]]:
+    codecs = [("json", lambda v: json.dumps(v).encode("utf-8"), json.loads)]
+    try:
+        import orjson
+        codecs.append(("orjson", orjson.dumps, orjson.loads))
+    except ImportError:
+        print("orjson not installed - skipping")
+    for fmt in FORMATS:
+        if fmt.media_type == "application/x-msgpack":
+            continue
+        if fmt.available:
+            codecs.append((fmt.media_type.replace("application/", ""), fmt.encode, fmt.decode))
+        else:
+            print(f"{fmt.codec} not installed - skipping {fmt.media_type}")
+    return codecs
+
+
+def _time(fn: Callable[[], Any], iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[3, 7, 14, 30])
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args()
+
+    codecs = _codecs()
+    for days in args.days:
+        data = _itinerary(days)
+        print(f"\n{days}-day itinerary")
+        print(f"  {'format':<30} {'bytes':>9} {'gzip':>8} {'encode us':>10} {'decode us':>10}")
+        for name, encode, decode in codecs:
+            payload = encode(data)
+            assert decode(payload) == json.loads(json.dumps(data)), f"{name} does not round-trip"
+            print(
+                f"  {name:<30} {len(payload):>9,} {len(gzip.compress(payload)):>8,} "
+                f"{_time(lambda: encode(data), args.iterations):>10,.1f} "
+                f"{_time(lambda: decode(payload), args.iterations):>10,.1f}"
+            )
+
+    try:
+        missing = missing_keys()
+    except ImportError:
+        print("\npydantic not installed - skipping key dictionary check")
+        return
+    if missing:
+        print(f"\nKeys not in the current key dictionary (consider a new version): {sorted(missing)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Synthetic model output shaped like the V2.0 response schema
+Shared by the benchmarks so every run measures the same payloads
+"""
+from typing import Any, Dict
+
+
+def sample_model_output(days: int = 7, stringly_typed: bool = False) -> Dict[str, Any]:
+    """A realistic raw model response for a trip of the given length"""
+    num = (lambda v: str(v)) if stringly_typed else (lambda v: v)
+    activity = "Hike the rim trail at first light, then descend to the overlook for layered canyon views. " * 4
+    return {
+        "trip_summary": "A loop through high desert canyons with sunrise photography stops.",
+        "season_info": "Summer - Peak season, high temperatures possible",
+        "vehicle_recommendation": {
+            "drivetrain": "AWD",
+            "clearance": "High Clearance 8\"+",
+            "safety_gear": ["Recovery Kit", "Spare Tire", "Water 10L"],
+            "notes": "Gravel spurs to trailheads; air down to 28 psi."
+        },
+        "days": [
+            {
+                "day_number": num(n),
+                "location": f"Canyon Stop {n}",
+                "image_keyword": "grand canyon",
+                "morning": {"start_time": "06:00", "duration_minutes": num(180), "activity": activity, "photo_tip": "f/11, ISO 100, 1/125s"},
+                "afternoon": {"start_time": "13:00", "duration_minutes": num(240), "activity": activity, "logistics": "Fuel in town; 2 hrs paved."},
+                "evening": {"start_time": "18:30", "duration_minutes": num(120), "activity": activity, "dining_tip": "Local diner on Main St"},
+                "daily_driving_time": "3.5 hrs",
+                "vehicle_safety": "Paved, occasional gravel",
+                "daily_budget_per_person": num(145.5),
+                "accommodation_search_query": "Lodge with parking near canyon rim",
+                "viator_activity_query": "Sunrise photo tour"
+            }
+            for n in range(1, days + 1)
+        ],
+        "interest_highlights": [{"category": "photography", "advice": "Shoot the golden hour from east-facing overlooks."}],
+        "logistics": {
+            "total_distance_km": num(1450.0),
+            "estimated_driving_hours": num(18.5),
+            "fuel_stops": [{"day": n, "location": f"Fuel {n}", "coordinates": {"lat": 36.0 + n / 10, "lon": -112.0 - n / 10}} for n in range(1, days + 1)],
+            "accommodation_points": [{"night": n, "name": f"Lodge {n}", "type": "lodge"} for n in range(1, days)],
+            "safety_warnings": ["Carry extra water", "Flash flood risk in slot canyons"]
+        },
+        "budget_table": {
+            "number_of_persons": num(2), "fuel_cost": num(320.0), "toll_fees": num(0), "accommodation": num(1400.0),
+            "meals": num(700.0), "activities": num(350.0), "subtotal": num(2770.0), "buffer_fund": num(277.0), "total": num(3047.0)
+        },
+        "markers": [
+            {"sequence": i, "name": f"Marker {i}", "type": "viewpoint", "coordinates": {"lat": 36.1 + i / 10, "lon": -112.1 - i / 10}}
+            for i in range(1, 9)
+        ],
+        "route_coordinates": [{"lat": 36.0 + i / 20, "lon": -112.0 - i / 20} for i in range(15)],
+        "is_round_trip": True,
+        "risk_warnings": ["Heat", "Wildlife on roads at dusk"],
+        "packing_list": ["Headlamp", "Sun hat", "Tripod"]
+    }
@@ -0,0 +1,53 @@
+"""
+Production launcher configuration
+    gunicorn main:app -c gunicorn.conf.py
+
+- Uvicorn workers sized to the CPU count (override with WEB_CONCURRENCY)
+- App preloaded in the master before forking (imports and settings paid once)
+- Workers share itinerary results, jobs and metrics through the
+  SQLite shared cache (SHARED_CACHE_PATH, defaulted here)
+- SIGTERM drains: workers stop accepting and finish in-flight requests
+  for up to GRACEFUL_TIMEOUT seconds before exiting
+"""
+import multiprocessing
+import os
+
+
+# Must be set before the preloaded app reads settings
+os.environ.setdefault("SHARED_CACHE_PATH", "output/shared_cache.sqlite3")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# Requests are I/O bound (model calls) and each worker is an event loop, so one per core
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+preload_app = True
+
+# Generation can take ~2 minutes per model tier; keep the watchdog above that
+timeout = int(os.getenv("WORKER_TIMEOUT", 300))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 60))
+keepalive = 5
+
+# Recycle workers occasionally to bound memory growth of in-process caches
+max_requests = int(os.getenv("MAX_REQUESTS", 2000))
+max_requests_jitter = 200
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    # Create the shared cache (and switch it to WAL) once, before any worker opens it
+    from app.core.shared_cache import get_shared_cache
+    shared = get_shared_cache()
+    if shared is not None:
+        shared.close()
+    server.log.info(f"Starting {workers} workers, shared cache at {os.environ['SHARED_CACHE_PATH']}")
+
+
+def worker_exit(server, worker):
+    # Drop the exited worker's metrics so cluster totals only cover live workers
+    from app.core.shared_cache import get_shared_cache
+    shared = get_shared_cache()
+    if shared is not None:
+        shared.delete("metrics", str(worker.pid))
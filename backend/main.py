@@ -1,14 +1,15 @@
 """
 AI Roadtrip Genie - FastAPI Backend Entry Point
-V3.0 - Lightweight deployment (no database, no payment)
+V3.0 - Lightweight deployment (no database; payment endpoints answer 503 until Stripe is configured)
 """
 import os
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
-from app.routes import health, itinerary
+from app.routes import export, health, images, itinerary, jobs, payment
 
 
 # CORS origins - add your Vercel deployment URL when deployed
@@ -33,8 +34,63 @@ async def lifespan(app: FastAPI):
     print(f"Gemini API: {'Configured' if settings.GEMINI_API_KEY else 'NOT SET'}")
     print("=" * 60)
 
+    from app.services.warmup import readiness
+    if settings.STRIPE_SECRET_KEY:
+        from app.services.payment_service import get_stripe_client
+        readiness.add_step("stripe_client", get_stripe_client)
+    if settings.WARMUP_ENABLED:
+        # Runs alongside startup; /api/health/ready reports "warming" until it finishes
+        warmup_task = asyncio.create_task(readiness.warmup())
+    else:
+        warmup_task = None
+        readiness.skip()
+
+    from app.core.shared_cache import get_shared_cache
+    shared = get_shared_cache()
+    metrics_task = None
+    if shared is not None:
+        from app.core.metrics import run_publisher
+        metrics_task = asyncio.create_task(run_publisher(shared, settings.METRICS_PUBLISH_SECONDS))
+        print(f"Shared cache: {shared.path} (pid {os.getpid()})")
+
+    webhook_task = None
+    if settings.STRIPE_WEBHOOK_SECRET:
+        from app.services.webhook_queue import get_webhook_consumer
+        webhook_task = asyncio.create_task(get_webhook_consumer().run())
+
+    warming_task = None
+    if settings.CACHE_WARMING_ENABLED:
+        from app.services.cache_warmer import CacheWarmer
+        from app.services.itinerary_service import ItineraryService
+        warming_task = asyncio.create_task(CacheWarmer(ItineraryService()).run_schedule())
+        print(f"Cache warming scheduled daily at {settings.CACHE_WARMING_HOUR_UTC:02d}:00 UTC")
+
     yield
 
+    if warming_task:
+        warming_task.cancel()
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    if metrics_task:
+        metrics_task.cancel()
+    if webhook_task:
+        # Queued events are durable; whatever is left is applied after restart
+        webhook_task.cancel()
+    from app.services import job_manager
+    if job_manager._manager is not None:
+        await job_manager._manager.stop()
+    from app.services import itinerary_store
+    if itinerary_store._store is not None:
+        itinerary_store._store.flush_request_log(background=False)
+    from app.services.token_budget import token_budget
+    token_budget.flush(background=False)
+    if shared is not None:
+        shared.close()
+    from app.services import image_service, payment_service
+    if image_service._image_service is not None:
+        await image_service._image_service.close()
+    if payment_service._client is not None:
+        await payment_service._client.close()
     print("Backend Shutdown Complete")
 
 
@@ -56,9 +112,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Register routes (no payment/database for initial launch)
+# Register routes (no database for initial launch)
+# Payment routes are always mounted and answer 503 until Stripe is configured, so
+# settings are not built at import time (see app.core.config)
 app.include_router(health.router, prefix="/api/health", tags=["Health"])
 app.include_router(itinerary.router, prefix="/api/itinerary", tags=["Itinerary"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
+app.include_router(images.router, prefix="/api/images", tags=["Images"])
+app.include_router(export.router, prefix="/api/export", tags=["Export"])
+app.include_router(payment.router, prefix="/api/payment", tags=["Payment"])
 
 
 @app.get("/")
@@ -81,8 +143,12 @@ async def api_root():
         "version": "3.0.0",
         "endpoints": {
             "health": "/api/health",
+            "ready": "/api/health/ready",
             "generate": "/api/itinerary/generate",
-            "refine": "/api/itinerary/refine"
+            "refine": "/api/itinerary/refine",
+            "batch": "/api/itinerary/batch",
+            "images": "/api/images/{keyword}/{thumb|card|hero}.webp",
+            "export": "/api/export/{gpx|kml|ics}/{itinerary_id}"
         }
     }
 
@@ -0,0 +1,3 @@
+"""
+Tests (run from backend/ with python -m pytest tests)
+"""
@@ -0,0 +1,41 @@
+"""
+Shared fixtures: an in-memory itinerary store and sample itineraries
+No network and no files outside pytest's tmp_path
+"""
+import os
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+import pytest  # noqa: E402
+
+from app.models.itinerary import ItineraryRequest  # noqa: E402
+from app.services.image_service import attach_image_urls  # noqa: E402
+from app.services.itinerary_store import ItineraryStore  # noqa: E402
+from benchmarks.sample_data import sample_model_output  # noqa: E402
+
+
+def make_itinerary(days: int = 3, itinerary_id: str = "itin_000000000001") -> dict:
+    """A stored-shape itinerary (itinerary_daily, budget, identity fields)"""
+    data = sample_model_output(days)
+    data["itinerary_daily"] = data.pop("days")
+    data["budget"] = data.pop("budget_table")
+    attach_image_urls(data["itinerary_daily"])
+    data.update({
+        "itinerary_id": itinerary_id,
+        "created_at": "2026-06-01T12:00:00",
+        "start_date": "2026-07-01",
+        "payment_status": "pending",
+        "itinerary_markdown": "",
+    })
+    return data
+
+
+def make_request(days: int = 3) -> ItineraryRequest:
+    return ItineraryRequest(
+        start_location="Flagstaff, AZ", end_location="Moab, UT", trip_duration=days, start_date="2026-07-01"
+    )
+
+
+@pytest.fixture
+def store() -> ItineraryStore:
+    return ItineraryStore(max_entries=50)
@@ -0,0 +1,57 @@
+import pytest
+
+from app.services.budget_engine import BudgetEngine
+
+
+def _days(*per_person):
+    return [{"day_number": n, "daily_budget_per_person": value} for n, value in enumerate(per_person, start=1)]
+
+
+BUDGET = {
+    "number_of_persons": 2, "fuel_cost": 150, "toll_fees": "$10",
+    "accommodation": 500, "meals": 300, "activities": 200,
+    "subtotal": 1, "buffer_fund": 1, "total": 1,
+}
+
+
+def test_compute_reconciles_variable_lines_with_daily_budgets():
+    budget = BudgetEngine(buffer_percentage=10).compute(_days(100, 100, 100), BUDGET)
+
+    # 3 days x $100 x 2 persons, split like the model's components
+    assert budget == {
+        "number_of_persons": 2, "fuel_cost": 150.0, "toll_fees": 10.0,
+        "accommodation": 300.0, "meals": 180.0, "activities": 120.0,
+        "subtotal": 760.0, "buffer_fund": 76.0, "total": 836.0,
+    }
+
+
+def test_compute_uses_default_split_and_absorbs_rounding_drift():
+    engine = BudgetEngine(buffer_percentage=10)
+
+    default = engine.compute(_days(50, 50), {"number_of_persons": 1})
+    thirds = engine.compute(_days(100), {"number_of_persons": 1, "accommodation": 1, "meals": 1, "activities": 1})
+
+    assert (default["accommodation"], default["meals"], default["activities"]) == (50.0, 30.0, 20.0)
+    assert thirds["accommodation"] + thirds["meals"] + thirds["activities"] == pytest.approx(100.0)
+    assert thirds["subtotal"] == 100.0
+
+
+def test_rescale_keeps_fixed_costs_and_scales_per_person_lines():
+    engine = BudgetEngine(buffer_percentage=10)
+
+    budget = engine.rescale(_days(100, 100, 100), BUDGET, 4)
+
+    assert budget["number_of_persons"] == 4
+    assert (budget["fuel_cost"], budget["toll_fees"]) == (150.0, 10.0)
+    assert budget["accommodation"] + budget["meals"] + budget["activities"] == pytest.approx(1200.0)
+    assert budget["total"] == pytest.approx((160 + 1200) * 1.1)
+
+
+def test_rescale_without_daily_budgets_scales_the_components():
+    engine = BudgetEngine(buffer_percentage=10)
+
+    budget = engine.rescale(_days(0, 0), BUDGET, 3)
+
+    assert (budget["accommodation"], budget["meals"], budget["activities"]) == (750.0, 450.0, 300.0)
+    assert budget["fuel_cost"] == 150.0
+    assert budget["subtotal"] == 1660.0
@@ -0,0 +1,47 @@
+"""
+Cache warming: the store, not the resume checkpoint, decides what is warm
+"""
+import asyncio
+import json
+
+from app.services.cache_warmer import CacheWarmer
+from app.services.itinerary_store import request_key
+from tests.conftest import make_itinerary, make_request
+
+
+class FakeService:
+    """generate() stores a sample itinerary for the request"""
+
+    def __init__(self, store):
+        self.store = store
+        self.generated = []
+
+    async def generate(self, request, track_demand=True):
+        self.generated.append(request_key(request))
+        self.store.put(request, make_itinerary(request.trip_duration, f"itin_{len(self.generated):012d}"))
+
+
+def test_checkpointed_but_evicted_keys_are_warmed_again(store, tmp_path):
+    service = FakeService(store)
+    cached, evicted, new = make_request(3), make_request(4), make_request(5)
+    store.put(cached, make_itinerary(3, "itin_cached000000"))
+    state = tmp_path / "warm.json"
+    state.write_text(json.dumps({"completed": [request_key(cached), request_key(evicted)]}))
+
+    warmer = CacheWarmer(service, concurrency=2, rate_per_minute=6000, state_path=str(state))
+    report = asyncio.run(warmer.warm([cached, evicted, new], resume=True))
+
+    assert sorted(service.generated) == sorted([request_key(evicted), request_key(new)])
+    assert report["resumed"] == 1 and report["already_cached"] == 0 and report["warmed"] == 2
+    assert report["coverage"] == 1.0
+    assert all(store.has_key(request_key(r)) for r in (cached, evicted, new))
+
+
+def test_failed_keys_lower_coverage(store, tmp_path):
+    class Failing(FakeService):
+        async def generate(self, request, track_demand=True):
+            raise RuntimeError("model unavailable")
+
+    warmer = CacheWarmer(Failing(store), concurrency=1, rate_per_minute=6000, state_path=str(tmp_path / "warm.json"))
+    report = asyncio.run(warmer.warm([make_request(3), make_request(4)]))
+    assert report["failed"] == 2 and report["coverage"] == 0.0
@@ -0,0 +1,107 @@
+"""
+Tier fallback and recovery, driven through AIService with a fake backend
+No network: the injected backend stands in for Gemini
+"""
+import asyncio
+import os
+import threading
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+from app.services.ai_service import AIService  # noqa: E402
+from app.services.model_router import AllTiersFailed, ModelRouter, ModelTier  # noqa: E402
+
+
+class FakeBackend:
+    """backend(tier, prompt, model_kwargs): scripted per tier, records every call"""
+
+    def __init__(self):
+        self.behaviour = {}  # tier name -> "ok" | "error" | seconds to hang
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, tier, prompt, model_kwargs):
+        with self._lock:
+            self.calls.append(tier.name)
+        action = self.behaviour.get(tier.name, "ok")
+        if action == "error":
+            raise RuntimeError(f"{tier.name} unavailable")
+        if isinstance(action, (int, float)):
+            time.sleep(action)
+        return f"{tier.name}:{prompt}"
+
+
+def _service(probe_after_seconds: float = 0.0):
+    backend = FakeBackend()
+    router = ModelRouter(
+        [ModelTier("flash", "fake-flash", timeout_seconds=0.2), ModelTier("lite", "fake-lite", timeout_seconds=0.2)],
+        error_threshold=0.5,
+        probe_after_seconds=probe_after_seconds,
+        alpha=1.0,  # one outcome decides health, keeps the scenarios short
+        timeout_grace_seconds=0.0
+    )
+    return AIService(backend=backend, router=router), backend, router
+
+
+def test_falls_back_on_error():
+    service, backend, router = _service(probe_after_seconds=60)
+    backend.behaviour["flash"] = "error"
+
+    assert asyncio.run(service._call_model("p", 1.0)) == "lite:p"
+    assert backend.calls == ["flash", "lite"]
+    assert not router.is_healthy(router.tiers[0])
+
+    # Degraded and not due for a probe: the next call goes straight to lite
+    backend.calls.clear()
+    assert asyncio.run(service._call_model("p", 1.0)) == "lite:p"
+    assert backend.calls == ["lite"]
+
+
+def test_falls_back_on_timeout():
+    service, backend, router = _service(probe_after_seconds=60)
+    backend.behaviour["flash"] = 0.5
+
+    assert asyncio.run(service._call_model("p", 1.0)) == "lite:p"
+    assert router.stats["flash"].error_rate == 1.0
+
+
+def test_all_tiers_failing_raises():
+    service, backend, _ = _service()
+    backend.behaviour.update(flash="error", lite="error")
+    try:
+        asyncio.run(service._call_model("p", 1.0))
+    except AllTiersFailed as e:
+        assert "flash" in str(e) and "lite" in str(e)
+    else:
+        raise AssertionError("expected AllTiersFailed")
+
+
+def test_degraded_tier_recovers_after_probe():
+    service, backend, router = _service(probe_after_seconds=0.0)
+    backend.behaviour["flash"] = "error"
+    asyncio.run(service._call_model("p", 1.0))
+    assert router.is_degraded(router.tiers[0])
+
+    backend.behaviour["flash"] = "ok"
+    backend.calls.clear()
+    assert asyncio.run(service._call_model("p", 1.0)) == "flash:p"
+    assert backend.calls == ["flash"]
+    assert not router.is_degraded(router.tiers[0])
+
+
+def test_probe_is_single_flight():
+    service, backend, router = _service(probe_after_seconds=0.0)
+    backend.behaviour["flash"] = "error"
+    asyncio.run(service._call_model("p", 1.0))
+
+    backend.behaviour["flash"] = 0.1  # slow but successful probe
+    backend.calls.clear()
+
+    async def burst():
+        return await asyncio.gather(*(service._call_model(f"p{i}", 1.0) for i in range(5)))
+
+    results = asyncio.run(burst())
+    assert backend.calls.count("flash") == 1
+    assert sum(result.startswith("flash:") for result in results) == 1
+    assert sum(result.startswith("lite:") for result in results) == 4
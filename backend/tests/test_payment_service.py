@@ -0,0 +1,69 @@
+"""
+Checkout session reuse and its reset by payment webhooks
+Stripe is replaced by a client that counts the sessions it creates
+"""
+import asyncio
+
+import pytest
+
+from app.models.payment import PaymentRequest
+from app.services import payment_service
+from app.services.payment_service import PaymentService
+from app.services.webhook_queue import WebhookConsumer, WebhookQueue
+from tests.conftest import make_itinerary, make_request
+
+
+class FakeStripe:
+    def __init__(self):
+        self.keys = []
+
+    async def post(self, path, params, idempotency=None):
+        self.keys.append(idempotency)
+        return {"id": f"cs_{len(self.keys)}", "url": f"https://checkout.test/{len(self.keys)}"}
+
+
+@pytest.fixture
+def payments(monkeypatch):
+    monkeypatch.setattr(PaymentService, "_sessions", {})
+    monkeypatch.setattr(payment_service, "_attempts", {})
+    stripe = FakeStripe()
+    return PaymentService(client=stripe), stripe
+
+
+def _request(**overrides):
+    fields = dict(
+        itinerary_id="itin_000000000001", customer_email="Traveller@Example.com",
+        success_url="https://app.test/success", cancel_url="https://app.test/cancel"
+    )
+    return PaymentRequest(**{**fields, **overrides})
+
+
+def test_repeat_clicks_reuse_the_session(payments):
+    service, stripe = payments
+    first = asyncio.run(service.create_checkout_session(_request()))
+    second = asyncio.run(service.create_checkout_session(_request(customer_email="traveller@example.com ")))
+    assert first.session_id == second.session_id and len(stripe.keys) == 1
+
+
+def test_other_redirect_urls_use_another_key(payments):
+    service, stripe = payments
+    asyncio.run(service.create_checkout_session(_request()))
+    asyncio.run(service.create_checkout_session(_request(success_url="https://app.test/thanks")))
+    assert len(set(stripe.keys)) == 2
+
+
+def test_failed_payment_starts_a_new_checkout(payments, store, tmp_path):
+    service, stripe = payments
+    store.put(make_request(), make_itinerary())
+    first = asyncio.run(service.create_checkout_session(_request()))
+
+    queue = WebhookQueue(str(tmp_path / "webhooks.db"))
+    queue.enqueue({
+        "id": "evt_1", "type": "payment_intent.payment_failed", "created": 1,
+        "data": {"object": {"metadata": {"itinerary_id": "itin_000000000001"}}}
+    })
+    asyncio.run(WebhookConsumer(queue, store).apply_batch())
+    assert store.get("itin_000000000001")["payment_status"] == "failed"
+
+    retry = asyncio.run(service.create_checkout_session(_request()))
+    assert retry.session_id != first.session_id and len(set(stripe.keys)) == 2
@@ -0,0 +1,89 @@
+"""
+Two-phase generation against refinement sessions
+The model is replaced by coroutines returning sample output
+"""
+import asyncio
+
+import pytest
+
+from app.services import refinement_sessions
+from app.services.itinerary_service import ItineraryService
+from app.services.preview_service import PreviewService
+from app.services.refinement_sessions import RefinementSessions, SessionError
+from benchmarks.sample_data import sample_model_output
+from tests.conftest import make_request
+
+
+@pytest.fixture
+def previews(store, monkeypatch):
+    service = ItineraryService()
+    service.store = store
+    sessions = RefinementSessions(store)
+    monkeypatch.setattr(refinement_sessions, "_sessions", sessions)
+    monkeypatch.setattr(PreviewService, "_pending", {})
+    detail_ready = asyncio.Event()
+
+    async def fake_preview(request):
+        data = sample_model_output(request.trip_duration)
+        data["itinerary_daily"] = data.pop("days")
+        data["budget"] = data.pop("budget_table")
+        data["trip_summary"] = "Preview"
+        return data
+
+    async def fake_detail(request, preview=None):
+        await detail_ready.wait()
+        data = sample_model_output(request.trip_duration)
+        data["itinerary_daily"] = data.pop("days")
+        data["budget"] = data.pop("budget_table")
+        data["trip_summary"] = "Full detail"
+        return data
+
+    async def fake_refine(current_itinerary, refinement_request, summary=None):
+        return {"trip_summary": f"{current_itinerary['trip_summary']} + {refinement_request}"}
+
+    monkeypatch.setattr(service.ai_service, "generate_preview", fake_preview)
+    monkeypatch.setattr(service.ai_service, "generate_itinerary", fake_detail)
+    monkeypatch.setattr(service.ai_service, "refine_itinerary", fake_refine)
+    return PreviewService(service), service, sessions, detail_ready
+
+
+def test_refine_based_on_preview_is_rejected_once_detail_attaches(previews, store):
+    preview_service, service, sessions, detail_ready = previews
+
+    async def scenario():
+        preview = await preview_service.preview(make_request())
+        itinerary_id = preview.itinerary_id
+        assert sessions.get(itinerary_id).latest.version == 1  # GET .../versions seeds from the preview
+
+        detail_ready.set()
+        await PreviewService._pending[itinerary_id].task
+        status, full = preview_service.detail(itinerary_id)
+        assert status == "full" and full["version"] == 2 and full["trip_summary"] == "Full detail"
+
+        with pytest.raises(SessionError) as stale:
+            await sessions.refine(itinerary_id, "slower pace", 1, service.refine)
+        assert stale.value.status_code == 409 and stale.value.current_version == 2
+
+        refined = await sessions.refine(itinerary_id, "slower pace", 2, service.refine)
+        return itinerary_id, refined
+
+    itinerary_id, refined = asyncio.run(scenario())
+    assert refined.version == 3
+    assert store.get(itinerary_id)["trip_summary"] == "Full detail + slower pace"
+
+
+def test_failed_detail_is_reported_after_the_pending_entry_is_gone(previews, monkeypatch):
+    preview_service, service, _, _ = previews
+
+    async def failing_detail(request, preview=None):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(service.ai_service, "generate_itinerary", failing_detail)
+
+    async def scenario():
+        preview = await preview_service.preview(make_request())
+        await PreviewService._pending[preview.itinerary_id].task
+        PreviewService._pending.clear()  # pruned, or another process
+        return preview_service.detail(preview.itinerary_id)
+
+    assert asyncio.run(scenario()) == ("failed", None)
@@ -0,0 +1,78 @@
+import pytest
+
+from app.services.budget_engine import BudgetEngine
+from app.services.refinement_rules import RefinementRuleEngine
+from tests.conftest import make_itinerary
+
+
+@pytest.fixture
+def engine() -> RefinementRuleEngine:
+    return RefinementRuleEngine(season_info=lambda d: f"season of {d.isoformat()}", budget_engine=BudgetEngine(buffer_percentage=10))
+
+
+def test_free_form_requests_go_to_the_model(engine):
+    itinerary = make_itinerary(3)
+
+    assert engine.try_apply(itinerary, "add a hot spring on day 2") is None
+    assert engine.try_apply(itinerary, "drop day 9") is None
+    assert engine.try_apply(make_itinerary(1), "drop day 1") is None
+
+
+def test_set_persons_rescales_budget(engine):
+    itinerary = make_itinerary(3)
+
+    refined = engine.try_apply(itinerary, "Make it four people please")
+
+    assert refined["budget"]["number_of_persons"] == 4
+    # 3 days x $145.50 x 4 persons; fuel and tolls unchanged
+    assert refined["budget"]["accommodation"] + refined["budget"]["meals"] + refined["budget"]["activities"] == pytest.approx(1746.0)
+    assert refined["budget"]["fuel_cost"] == 320.0
+    assert itinerary["budget"]["number_of_persons"] == 2  # input left untouched
+
+
+def test_swap_days_reorders_days_and_logistics(engine):
+    itinerary = make_itinerary(3)
+
+    refined = engine.try_apply(itinerary, "swap day 1 and 3")
+
+    assert [d["location"] for d in refined["itinerary_daily"]] == ["Canyon Stop 3", "Canyon Stop 2", "Canyon Stop 1"]
+    assert [d["day_number"] for d in refined["itinerary_daily"]] == [1, 2, 3]
+    assert [(s["day"], s["location"]) for s in refined["logistics"]["fuel_stops"]] == [(1, "Fuel 3"), (2, "Fuel 2"), (3, "Fuel 1")]
+    assert [p["night"] for p in refined["logistics"]["accommodation_points"]] == [2, 3]
+
+
+def test_drop_day_prorates_fuel_and_tolls_by_driving_share(engine):
+    itinerary = make_itinerary(3)
+    for day, hours in zip(itinerary["itinerary_daily"], ("1 hr", "2h", "3 hrs")):
+        day["daily_driving_time"] = hours
+    itinerary["budget"]["toll_fees"] = 40
+
+    refined = engine.try_apply(itinerary, "drop day 3")
+
+    # Day 3 was half of the driving
+    assert refined["budget"]["fuel_cost"] == 160.0
+    assert refined["budget"]["toll_fees"] == 20.0
+    assert refined["logistics"]["total_distance_km"] == 725.0
+    assert refined["logistics"]["estimated_driving_hours"] == pytest.approx(9.2, abs=0.1)
+    # Remaining per-person budgets: 2 days x $145.50 x 2 persons
+    variable = sum(refined["budget"][k] for k in ("accommodation", "meals", "activities"))
+    assert variable == pytest.approx(582.0)
+    assert refined["budget"]["total"] == pytest.approx((160 + 20 + 582) * 1.1)
+
+
+def test_drop_day_renumbers_and_shifts_later_entries(engine):
+    refined = engine.try_apply(make_itinerary(3), "remove day 2")
+
+    assert [(d["day_number"], d["location"]) for d in refined["itinerary_daily"]] == [(1, "Canyon Stop 1"), (2, "Canyon Stop 3")]
+    assert [(s["day"], s["location"]) for s in refined["logistics"]["fuel_stops"]] == [(1, "Fuel 1"), (2, "Fuel 3")]
+    assert [(p["night"], p["name"]) for p in refined["logistics"]["accommodation_points"]] == [(1, "Lodge 1")]
+
+
+def test_shift_start_moves_date_and_season(engine):
+    later = engine.try_apply(make_itinerary(3), "start a week later")
+    earlier = engine.try_apply(make_itinerary(3), "leave 2 days earlier")
+    on = engine.try_apply(make_itinerary(3), "start on 2026-09-01")
+
+    assert (later["start_date"], later["season_info"]) == ("2026-07-08", "season of 2026-07-08")
+    assert earlier["start_date"] == "2026-06-29"
+    assert on["start_date"] == "2026-09-01"
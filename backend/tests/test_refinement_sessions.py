@@ -0,0 +1,58 @@
+"""
+Refinement sessions: versions, and agreement between the session and the store
+The model is replaced by a coroutine that edits one day, as the real one returns
+only what it was asked about
+"""
+import asyncio
+import copy
+
+import pytest
+
+from app.services.itinerary_service import ItineraryService
+from app.services.refinement_sessions import RefinementSessions, SessionError
+from tests.conftest import make_itinerary, make_request
+
+
+def _service(store, monkeypatch):
+    service = ItineraryService()
+    service.store = store
+
+    async def fake_model(current_itinerary, refinement_request, summary=None):
+        days = copy.deepcopy(current_itinerary["itinerary_daily"])
+        days[1]["location"] = "Refined Camp"
+        return {"itinerary_daily": days, "trip_summary": "Refined"}  # no markdown, route or dates
+
+    monkeypatch.setattr(service.ai_service, "refine_itinerary", fake_model)
+    return service
+
+
+def test_model_refine_keeps_session_store_and_markdown_in_step(store, monkeypatch):
+    service = _service(store, monkeypatch)
+    itinerary = make_itinerary()
+    store.put(make_request(), itinerary)
+    sessions = RefinementSessions(store)
+
+    new = asyncio.run(sessions.refine(itinerary["itinerary_id"], "more hiking in the middle", 1, service.refine))
+    refined = new.itinerary.to_dict()
+    stored = store.get(itinerary["itinerary_id"])
+
+    assert new.version == 2 and stored["version"] == 2
+    assert "Refined Camp" in refined["itinerary_markdown"]
+    assert refined == stored
+    # Fields the model left out come from the previous version
+    assert refined["route_coordinates"] == itinerary["route_coordinates"]
+    assert refined["start_date"] == itinerary["start_date"]
+
+
+def test_rebuilt_session_continues_from_stored_version(store, monkeypatch):
+    service = _service(store, monkeypatch)
+    itinerary = make_itinerary()
+    store.put(make_request(), itinerary)
+    sessions = RefinementSessions(store, max_sessions=1)
+    asyncio.run(sessions.refine(itinerary["itinerary_id"], "more hiking", 1, service.refine))
+
+    sessions._sessions.clear()  # evicted (or a restart without the shared tier)
+    assert sessions.get(itinerary["itinerary_id"]).latest.version == 2
+    with pytest.raises(SessionError) as stale:
+        asyncio.run(sessions.refine(itinerary["itinerary_id"], "more hiking", 1, service.refine))
+    assert stale.value.status_code == 409 and stale.value.current_version == 2
@@ -0,0 +1,104 @@
+from datetime import date
+
+import pytest
+
+from app.services.schedule_checker import ScheduleChecker, _minutes, daylight
+
+
+KM_PER_DEGREE = 111.195  # one degree of latitude on the checker's sphere
+START = (38.0, -110.0)
+
+
+def _checker() -> ScheduleChecker:
+    return ScheduleChecker(road_factor=1.3, speed_kmh=80.0, max_daily_hours=6.0, daylight_margin=30)
+
+
+def _block(start: str, minutes: int) -> dict:
+    return {"start_time": start, "duration_minutes": minutes, "activity": "..."}
+
+
+def _trip(legs_km, stated_hours) -> dict:
+    """Overnight camps due north of START, `legs_km` apart, with the model's driving times"""
+    lat = START[0]
+    days, markers = [], []
+    for n, (km, hours) in enumerate(zip(legs_km, stated_hours), start=1):
+        lat += km / KM_PER_DEGREE
+        name = f"Camp {'ABCDEFG'[n - 1]}"
+        days.append({"day_number": n, "location": name, "daily_driving_time": hours})
+        markers.append({"sequence": n, "name": name, "type": "camp", "coordinates": {"lat": lat, "lon": START[1]}})
+    return {
+        "itinerary_daily": days,
+        "markers": markers,
+        "route_coordinates": [{"lat": START[0], "lon": START[1]}],
+        "logistics": {"estimated_driving_hours": 9.0},
+    }
+
+
+def test_overlapping_blocks_are_shifted_later():
+    data = {"itinerary_daily": [{
+        "day_number": 1, "location": "Nowhere",
+        "morning": _block("08:00", 180), "afternoon": _block("10:00", 120), "evening": _block("12:30", 60),
+    }]}
+
+    warnings = _checker().check(data)
+
+    day = data["itinerary_daily"][0]
+    assert [day[b]["start_time"] for b in ("morning", "afternoon", "evening")] == ["08:00", "11:00", "13:00"]
+    assert warnings == [] and data["schedule_warnings"] == []
+
+
+def test_blocks_are_moved_into_daylight():
+    day = {
+        "day_number": 1, "location": "Nowhere",
+        "morning": _block("04:00", 180), "afternoon": _block("15:00", 240),
+    }
+    data = {"itinerary_daily": [day], "route_coordinates": [{"lat": 38.57, "lon": -109.55}]}
+
+    warnings = _checker().check(data, "2026-12-21")
+
+    sunrise, sunset = daylight(38.57, -109.55, date(2026, 12, 21))
+    morning_start = _minutes(day["morning"]["start_time"])
+    afternoon_end = _minutes(day["afternoon"]["start_time"]) + day["afternoon"]["duration_minutes"]
+    assert sunrise - 60 <= morning_start < sunrise - 30
+    assert afternoon_end <= sunset + 30
+    assert day["afternoon"]["duration_minutes"] == 240
+    assert warnings == []
+
+
+def test_afternoon_that_cannot_fit_before_dark_is_reported():
+    day = {"day_number": 1, "location": "Nowhere", "morning": _block("08:00", 540), "afternoon": _block("17:00", 120)}
+    data = {"itinerary_daily": [day], "route_coordinates": [{"lat": 38.57, "lon": -109.55}]}
+
+    warnings = _checker().check(data, "2026-12-21")
+
+    assert [(w["day"], w["block"], w["code"]) for w in warnings] == [(1, "afternoon", "after_dark")]
+
+
+def test_understated_driving_takes_back_hours_booked_on_the_next_day():
+    # Day 1 covers 480 km (7.8 h) but claims 1 h; day 2 covers 100 km yet claims 8 h
+    data = _trip([480, 100], ["1 hr", "8 hrs"])
+
+    warnings = _checker().check(data)
+
+    assert [d["daily_driving_time"] for d in data["itinerary_daily"]] == ["7.8 hrs", "1.6 hrs"]
+    assert data["logistics"]["estimated_driving_hours"] == pytest.approx(9.0 + 6.8 - 6.4)
+    assert [(w["day"], w["code"]) for w in warnings] == [(1, "driving_over_limit")]
+
+
+def test_understated_driving_takes_back_hours_booked_on_the_previous_day():
+    # The 480 km leg is day 2's, but the model booked its hours on day 1
+    data = _trip([100, 480], ["8 hrs", "1 hr"])
+
+    warnings = _checker().check(data)
+
+    assert [d["daily_driving_time"] for d in data["itinerary_daily"]] == ["1.6 hrs", "7.8 hrs"]
+    # Day 1's over-limit warning went with its hours
+    assert [(w["day"], w["code"]) for w in warnings] == [(2, "driving_over_limit")]
+
+
+def test_plausible_driving_is_left_alone():
+    data = _trip([200, 150], ["3.5 hrs", "2.5 hrs"])
+
+    assert _checker().check(data) == []
+    assert [d["daily_driving_time"] for d in data["itinerary_daily"]] == ["3.5 hrs", "2.5 hrs"]
+    assert data["logistics"]["estimated_driving_hours"] == 9.0
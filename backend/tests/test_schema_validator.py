@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from app.services.schema_validator import CompiledValidator
+
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "day_number": {"type": "integer"},
+        "total_distance_km": {"type": "number"},
+    },
+    "required": ["day_number", "total_distance_km"],
+}
+
+
+@pytest.mark.parametrize("raw", ["NaN", "inf", "-Infinity", "1e999", float("nan"), float("inf")])
+def test_non_finite_numbers_are_reported_not_raised(raw):
+    data, violations = CompiledValidator(SCHEMA).validate({"day_number": raw, "total_distance_km": raw})
+
+    assert data == {"day_number": 0, "total_distance_km": 0}
+    assert [v["path"] for v in violations] == ["day_number", "total_distance_km"]
+    assert all(v["issue"].startswith("expected finite number") for v in violations)
+
+
+def test_non_finite_literals_in_model_json():
+    raw = json.loads('{"day_number": NaN, "total_distance_km": Infinity}')
+
+    data, violations = CompiledValidator(SCHEMA).validate(raw)
+
+    assert data == {"day_number": 0, "total_distance_km": 0}
+    assert len(violations) == 2
+
+
+def test_numbers_still_coerced():
+    data, violations = CompiledValidator(SCHEMA).validate({"day_number": "2.6", "total_distance_km": "$1,200"})
+
+    assert data == {"day_number": 3, "total_distance_km": 1200.0}
+    assert [v["issue"] for v in violations] == ["coerced to number", "coerced to number"]
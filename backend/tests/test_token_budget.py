@@ -0,0 +1,37 @@
+import asyncio
+import json
+
+from app.services import token_budget as token_budget_module
+from app.services.token_budget import TokenBudgetEstimator
+
+
+def test_short_trip_gets_smaller_budget_than_long_trip(tmp_path):
+    estimator = TokenBudgetEstimator(calibration_path=str(tmp_path / "calibration.jsonl"), headroom=1.25)
+
+    short = estimator.max_output_tokens(2, 2, False)
+    long = estimator.max_output_tokens(7, 2, False)
+
+    assert short < long
+    assert short > token_budget_module.MIN_OUTPUT_TOKENS
+
+
+def test_record_buffers_calibration_samples_until_flush(tmp_path, monkeypatch):
+    path = tmp_path / "calibration.jsonl"
+    estimator = TokenBudgetEstimator(calibration_path=str(path), headroom=1.25)
+    monkeypatch.setattr(token_budget_module, "CALIBRATION_FLUSH_LINES", 3)
+
+    async def generate():
+        for days in (2, 3):
+            estimator.record(days, 1, False, 1500 + days * 400)
+        assert not path.exists()
+        estimator.record(4, 1, False, 3100)
+        # The full buffer is appended in a worker thread, not on the loop
+        await asyncio.sleep(0.05)
+
+    asyncio.run(generate())
+    assert [json.loads(line)["trip_duration"] for line in path.read_text().splitlines()] == [2, 3, 4]
+
+    estimator.record(5, 1, False, 3500)
+    estimator.record(6, 1, False, 3900, truncated=True)
+    estimator.flush(background=False)
+    assert [json.loads(line)["trip_duration"] for line in path.read_text().splitlines()] == [2, 3, 4, 5]
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+from app.services.ai_service import AIService
+from app.services.truncation import (
+    continuation_schema,
+    find_missing,
+    merge_continuation,
+    parse_partial_json,
+)
+from benchmarks.sample_data import sample_model_output
+from tests.conftest import make_request
+
+
+def _schema() -> dict:
+    return AIService.__new__(AIService)._build_schema([])
+
+
+def _truncated(days: int, cut_in_day: int) -> str:
+    """Model output cut off partway through day cut_in_day"""
+    text = json.dumps(sample_model_output(days))
+    return text[:text.index(f'"day_number": {cut_in_day}') + 120]
+
+
+def test_parse_partial_json_keeps_every_complete_member():
+    data = parse_partial_json("```json\n" + _truncated(4, 3))
+
+    assert data["trip_summary"].startswith("A loop")
+    assert [d["day_number"] for d in data["days"]][:2] == [1, 2]
+    assert "logistics" not in data
+
+
+def test_find_missing_prunes_the_partial_day():
+    data = parse_partial_json(_truncated(4, 3))
+
+    sections, missing_days = find_missing(data, _schema(), 4)
+
+    assert [d["day_number"] for d in data["days"]] == [1, 2]
+    assert missing_days == [3, 4]
+    assert {"days", "logistics", "budget_table", "packing_list"} <= set(sections)
+    assert "trip_summary" not in sections
+
+    subset = continuation_schema(_schema(), sections, missing_days)
+    assert subset["required"] == sections
+    assert subset["properties"]["days"]["description"] == "ONLY days 3, 4"
+
+
+def test_merge_continuation_renumbers_restarted_days():
+    data = parse_partial_json(_truncated(4, 3))
+    sections, missing_days = find_missing(data, _schema(), 4)
+    extra = sample_model_output(2)  # numbered 1..2 again
+    extra["days"][0]["location"] = "Arches"
+
+    merged = merge_continuation(data, extra, missing_days)
+
+    assert [d["day_number"] for d in merged["days"]] == [1, 2, 3, 4]
+    assert merged["days"][2]["location"] == "Arches"
+    assert find_missing(merged, _schema(), 4) == ([], [])
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def test_complete_truncated_generates_only_what_is_missing(monkeypatch):
+    service = AIService.__new__(AIService)
+    prompts = []
+
+    async def fake_call(prompt, complexity, **model_kwargs):
+        prompts.append((prompt, model_kwargs["response_schema"]["required"]))
+        extra = sample_model_output(4)
+        extra["days"] = extra["days"][2:]
+        extra.pop("trip_summary")
+        return _Response(json.dumps(extra))
+
+    monkeypatch.setattr(service, "_call_model", fake_call)
+
+    data = asyncio.run(service._complete_truncated(make_request(4), _truncated(4, 3), []))
+
+    assert len(prompts) == 1
+    assert "Generate ONLY days 3, 4" in prompts[0][0]
+    assert "trip_summary" not in prompts[0][1]
+    assert [d["day_number"] for d in data["days"]] == [1, 2, 3, 4]
+    assert data["logistics"]["total_distance_km"] == 1450.0
@@ -0,0 +1,46 @@
+"""
+Wire-format key dictionaries stay complete and append-only
+"""
+import os
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+from app.core.wire_format import CURRENT_VERSION, FORMATS, KEY_DICTIONARIES, missing_keys, negotiate  # noqa: E402
+
+
+def test_current_dictionary_covers_the_response_model():
+    # A new response field needs a new dictionary version (see the module docstring)
+    assert missing_keys(CURRENT_VERSION) == set()
+
+
+def test_versions_only_append():
+    versions = sorted(KEY_DICTIONARIES)
+    for older, newer in zip(versions, versions[1:]):
+        keys = KEY_DICTIONARIES[older]
+        assert KEY_DICTIONARIES[newer][:len(keys)] == keys
+    for keys in KEY_DICTIONARIES.values():
+        assert len(set(keys)) == len(keys)
+
+
+def test_interned_round_trip():
+    document = {
+        "itinerary_id": "itin_1",
+        "detail_level": "full",
+        "schedule_warnings": [{"day": 1, "block": "evening", "code": "past_midnight", "message": "late"}],
+        "custom_field": {"lat": 1.5},
+    }
+    for fmt in FORMATS:
+        if fmt.available:
+            assert fmt.decode(fmt.encode(document)) == document
+
+
+def test_negotiate_prefers_the_earlier_entry_on_ties():
+    binary = "application/vnd.roadtrip.v1+msgpack"
+
+    assert negotiate(f"{binary}, application/json").media_type == binary
+    assert negotiate(f"application/json, {binary}") is None
+    assert negotiate(f"*/*, {binary}") is None
+    assert negotiate(f"application/json;q=0.5, {binary}").media_type == binary
+    assert negotiate(f"{binary};q=0.5, application/json") is None
+    assert negotiate(f"{binary};q=0") is None
+    assert negotiate(None) is None
@@ -31,6 +31,7 @@ interface DailyItinerary {
   day_number: number
   location: string
   image_keyword: string
+  image_url?: string
   morning?: TimeBlock
   afternoon?: TimeBlock
   evening?: TimeBlock
@@ -346,7 +347,9 @@ export default function ResultPage() {
                       {!failedImages.has(`day-${day.day_number}`) ? (
                         <div className="relative w-full h-64">
                           <Image
-                            src={`https://loremflickr.com/1200/600/${encodeURIComponent(day.image_keyword || 'landscape')}`}
+                            src={day.image_url
+                              ? `${process.env.NEXT_PUBLIC_API_URL || 'http://127.0.0.1:8000'}${day.image_url}`
+                              : `https://loremflickr.com/1200/600/${encodeURIComponent(day.image_keyword || 'landscape')}`}
                             alt={`Day ${day.day_number}: ${day.location}`}
                             fill
                             className="object-cover"